@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+
+import grpc
+
+import glossary_pb2
+import glossary_pb2_grpc
+
+SERVICE_NAME = "glossary.GlossaryService"
+
+# Чтения можно безопасно повторить. Запись не повторяется: если ответ
+# потерялся после записи, повтор CreateTerm вернул бы ALREADY_EXISTS, а
+# DeleteTerm - NOT_FOUND вместо выполненного действия
+READ_METHODS = ("ListTerms", "GetTerm", "ListCategories", "SuggestTerms")
+WRITE_METHODS = ("CreateTerm", "UpdateTerm", "UpsertTerm", "DeleteTerm")
+
+# Сервер одновременно принимает не больше max_workers + GRPC_QUEUE_SIZE вызовов
+# (по умолчанию 10 + 10, server/admission.py), остальным отвечает
+# RESOURCE_EXHAUSTED. Клиент по умолчанию держит меньше вызовов, чем этот предел
+DEFAULT_MAX_IN_FLIGHT = 16
+
+# Чтение, получившее RESOURCE_EXHAUSTED, повторяется с экспоненциальной
+# задержкой и случайным разбросом, чтобы отклоненные вызовы не вернулись разом
+OVERLOAD_RETRIES = 6
+OVERLOAD_BACKOFF = 0.05
+OVERLOAD_MAX_BACKOFF = 2.0
+
+# Таймауты и повторы при UNAVAILABLE задаются через service config канала
+SERVICE_CONFIG = {
+    "methodConfig": [
+        {
+            "name": [{"service": SERVICE_NAME, "method": method} for method in READ_METHODS],
+            "timeout": "5s",
+            "retryPolicy": {
+                "maxAttempts": 4,
+                "initialBackoff": "0.05s",
+                "maxBackoff": "1s",
+                "backoffMultiplier": 2,
+                "retryableStatusCodes": ["UNAVAILABLE"]
+            }
+        },
+        {
+            "name": [{"service": SERVICE_NAME, "method": method} for method in WRITE_METHODS],
+            "timeout": "5s"
+        }
+    ]
+}
+
+CHANNEL_OPTIONS = [
+    ("grpc.enable_retries", 1),
+    ("grpc.service_config", json.dumps(SERVICE_CONFIG)),
+    # keepalive держит простаивающее соединение открытым и быстро находит
+    # разорванное; сервер разрешает такие ping (SERVER_OPTIONS в server/main.py)
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    # Отдельное соединение на каждый канал, иначе каналы с одинаковыми
+    # настройками делят одно HTTP/2 соединение
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+
+class AsyncGlossaryClient:
+    """grpc.aio client that keeps many calls in flight over a small channel pool"""
+
+    def __init__(self, host='localhost', port=50051, max_in_flight=DEFAULT_MAX_IN_FLIGHT, channels=4,
+                 timeout=5.0, compression=grpc.Compression.Gzip):
+        self.timeout = timeout
+        # Несколько HTTP/2 соединений: больше одновременных потоков, а при
+        # запуске через launcher.py соединения попадают в разные процессы
+        self.channels = [
+            grpc.aio.insecure_channel(f'{host}:{port}', options=CHANNEL_OPTIONS, compression=compression)
+            for _ in range(channels)
+        ]
+        self.stubs = [glossary_pb2_grpc.GlossaryServiceStub(channel) for channel in self.channels]
+        self._next_stub = itertools.cycle(self.stubs)
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        logging.info(f"Async client for gRPC server at {host}:{port} ({channels} channels)")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close all channels"""
+        await asyncio.gather(*(channel.close() for channel in self.channels))
+
+    async def _call(self, method, request, timeout=None):
+        async with self._semaphore:
+            for attempt in itertools.count():
+                stub = next(self._next_stub)
+                try:
+                    return await getattr(stub, method)(request, timeout=timeout or self.timeout)
+                except grpc.RpcError as e:
+                    if (e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED and method in READ_METHODS
+                            and attempt < OVERLOAD_RETRIES):
+                        # Слот semaphore остается занятым: пока сервер перегружен, клиент шлет меньше
+                        backoff = min(OVERLOAD_BACKOFF * 2 ** attempt, OVERLOAD_MAX_BACKOFF)
+                        await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                        continue
+                    logging.error(f"gRPC error: {e.code()} - {e.details()}")
+                    return None
+
+    async def list_terms(self, skip=0, limit=100, fields=None, category=None, timeout=None):
+        """Get all terms, fields limits the returned term fields"""
+        request = glossary_pb2.ListTermsRequest(skip=skip, limit=limit, category=category or '')
+        if fields:
+            request.fields.paths.extend(fields)
+        return await self._call('ListTerms', request, timeout)
+
+    async def get_term(self, keyword, timeout=None):
+        """Get term by keyword"""
+        return await self._call('GetTerm', glossary_pb2.GetTermRequest(keyword=keyword), timeout)
+
+    async def create_term(self, keyword, description, category="general", timeout=None):
+        """Create a new term"""
+        request = glossary_pb2.CreateTermRequest(keyword=keyword, description=description, category=category)
+        return await self._call('CreateTerm', request, timeout)
+
+    async def update_term(self, keyword, description=None, category=None, timeout=None):
+        """Update a term"""
+        request = glossary_pb2.UpdateTermRequest(keyword=keyword)
+        if description:
+            request.description = description
+        if category:
+            request.category = category
+        return await self._call('UpdateTerm', request, timeout)
+
+    async def upsert_term(self, keyword, description, category=None, timeout=None):
+        """Create a term or update it if it exists"""
+        request = glossary_pb2.UpsertTermRequest(keyword=keyword, description=description)
+        if category:
+            request.category = category
+        return await self._call('UpsertTerm', request, timeout)
+
+    async def delete_term(self, keyword, timeout=None):
+        """Delete a term"""
+        return await self._call('DeleteTerm', glossary_pb2.DeleteTermRequest(keyword=keyword), timeout)
+
+    async def list_categories(self, timeout=None):
+        """Get categories with their term counts"""
+        return await self._call('ListCategories', glossary_pb2.ListCategoriesRequest(), timeout)
+
+    async def suggest_terms(self, prefix, limit=10, timeout=None):
+        """Get keywords starting with prefix"""
+        request = glossary_pb2.SuggestTermsRequest(prefix=prefix, limit=limit)
+        response = await self._call('SuggestTerms', request, timeout)
+        return list(response.keywords) if response is not None else None
+
+    async def get_terms(self, keywords, timeout=None):
+        """Look up many terms concurrently, results keep the order of keywords"""
+        return await asyncio.gather(*(self.get_term(keyword, timeout) for keyword in keywords))
+
+
+async def demo_fan_out(host, port, lookups, max_in_flight, channels):
+    """Параллельный запрос большого числа терминов"""
+    async with AsyncGlossaryClient(host, port, max_in_flight=max_in_flight, channels=channels) as client:
+        response = await client.list_terms(limit=1000, fields=["keyword"])
+        keywords = [term.keyword for term in response.terms] if response else []
+        if not keywords:
+            print("Glossary is empty")
+            return
+
+        targets = [keywords[i % len(keywords)] for i in range(lookups)]
+        start = time.perf_counter()
+        results = await client.get_terms(targets)
+        elapsed = time.perf_counter() - start
+
+        found = sum(1 for term in results if term is not None and term.keyword)
+        print(f"{lookups} get_term lookups in {elapsed:.2f} sec "
+              f"({lookups / elapsed:.0f} req/s), found {found}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Async glossary client fan-out demo")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--channels", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(demo_fan_out(args.host, args.port, args.lookups, args.concurrency, args.channels))
\ No newline at end of file
@@ -1,20 +1,119 @@
 import grpc
 import logging
+import threading
 
 import glossary_pb2
 import glossary_pb2_grpc
 
+# Настройки локального кэша (режим cache=True)
+SNAPSHOT_PAGE_SIZE = 1000
+SNAPSHOT_ATTEMPTS = 3
+CACHE_START_TIMEOUT = 5.0
+CACHE_RETRY_DELAY = 1.0
+
 
 class GlossaryClient:
-    def __init__(self, host='localhost', port=50051):
+    def __init__(self, host='localhost', port=50051, cache=False):
         self.channel = grpc.insecure_channel(f'{host}:{port}')
         self.stub = glossary_pb2_grpc.GlossaryServiceStub(self.channel)
         logging.info(f"Connected to gRPC server at {host}:{port}")
 
-    def list_terms(self, skip=0, limit=100):
-        """Get all terms"""
+        # In cache mode get_term and list_terms are answered from a local copy
+        # kept up to date by WatchTerms; while the feed is down they use RPC
+        self._cache = {}
+        self._cache_revision = None
+        self._cache_lock = threading.Lock()
+        self._cache_ready = threading.Event()
+        self._closed = threading.Event()
+        self._watch_call = None
+        if cache:
+            threading.Thread(target=self._watch_loop, daemon=True).start()
+            self._cache_ready.wait(CACHE_START_TIMEOUT)
+
+    def _load_snapshot(self):
+        """Load all terms page by page, retrying while writes happen during the load"""
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            terms = {}
+            revisions = set()
+            skip = 0
+            while True:
+                request = glossary_pb2.ListTermsRequest(skip=skip, limit=SNAPSHOT_PAGE_SIZE)
+                response = self.stub.ListTerms(request)
+                revisions.add(response.revision)
+                for term in response.terms:
+                    terms[term.keyword] = term
+                skip += len(response.terms)
+                if not response.terms or skip >= response.total_count:
+                    break
+
+            if len(revisions) == 1:
+                return terms, revisions.pop()
+
+        # Изменения после самой ранней ревизии придут из WatchTerms повторно
+        logging.warning("Glossary kept changing while loading the cache snapshot")
+        return terms, min(revisions)
+
+    def _apply_event(self, event):
+        with self._cache_lock:
+            if event.type == glossary_pb2.TermEvent.DELETED:
+                self._cache.pop(event.term.keyword, None)
+            else:
+                self._cache[event.term.keyword] = event.term
+            self._cache_revision = event.revision
+
+    def _watch_loop(self):
+        """Keep the local cache in sync with the WatchTerms feed"""
+        while not self._closed.is_set():
+            try:
+                if self._cache_revision is None:
+                    terms, revision = self._load_snapshot()
+                    with self._cache_lock:
+                        self._cache = terms
+                        self._cache_revision = revision
+
+                request = glossary_pb2.WatchTermsRequest(from_revision=self._cache_revision)
+                self._watch_call = self.stub.WatchTerms(request)
+                # Кэш считается актуальным только когда поток уже открыт
+                self._watch_call.initial_metadata()
+                self._cache_ready.set()
+                for event in self._watch_call:
+                    self._apply_event(event)
+                self._cache_ready.clear()
+            except grpc.RpcError as e:
+                self._cache_ready.clear()
+                if self._closed.is_set():
+                    break
+                if e.code() == grpc.StatusCode.OUT_OF_RANGE:
+                    # Сервер уже не хранит нужные изменения, загружаем кэш заново
+                    self._cache_revision = None
+                logging.warning(f"Term feed interrupted: {e.code()} - {e.details()}")
+                self._closed.wait(CACHE_RETRY_DELAY)
+
+    def close(self):
+        """Stop the term feed and close the channel"""
+        self._closed.set()
+        if self._watch_call is not None:
+            self._watch_call.cancel()
+        self.channel.close()
+
+    def list_terms(self, skip=0, limit=100, fields=None, category=None):
+        """Get all terms, fields limits the returned term fields (the local cache returns all of them)"""
+        if self._cache_ready.is_set():
+            with self._cache_lock:
+                keywords = sorted(
+                    keyword for keyword, term in self._cache.items()
+                    if not category or term.category == category
+                )
+                return glossary_pb2.ListTermsResponse(
+                    terms=[self._cache[keyword] for keyword in keywords[skip:skip + limit]],
+                    total_count=len(keywords),
+                    revision=self._cache_revision
+                )
+
         try:
-            request = glossary_pb2.ListTermsRequest(skip=skip, limit=limit)
+            request = glossary_pb2.ListTermsRequest(skip=skip, limit=limit, category=category or '')
+            if fields:
+                request.fields.paths.extend(fields)
             response = self.stub.ListTerms(request)
             return response
         except grpc.RpcError as e:
@@ -23,6 +122,10 @@ class GlossaryClient:
 
     def get_term(self, keyword):
         """Get term by keyword"""
+        if self._cache_ready.is_set():
+            with self._cache_lock:
+                return self._cache.get(keyword)
+
         try:
             request = glossary_pb2.GetTermRequest(keyword=keyword)
             response = self.stub.GetTerm(request)
@@ -60,6 +163,22 @@ class GlossaryClient:
             logging.error(f"gRPC error: {e.code()} - {e.details()}")
             return None
 
+    def upsert_term(self, keyword, description, category=None):
+        """Create a term or update it if it exists"""
+        try:
+            request = glossary_pb2.UpsertTermRequest(
+                keyword=keyword,
+                description=description
+            )
+            if category:
+                request.category = category
+
+            response = self.stub.UpsertTerm(request)
+            return response
+        except grpc.RpcError as e:
+            logging.error(f"gRPC error: {e.code()} - {e.details()}")
+            return None
+
     def delete_term(self, keyword):
         """Delete a term"""
         try:
@@ -70,6 +189,26 @@ class GlossaryClient:
             logging.error(f"gRPC error: {e.code()} - {e.details()}")
             return None
 
+    def suggest_terms(self, prefix, limit=10):
+        """Get keywords starting with prefix"""
+        try:
+            request = glossary_pb2.SuggestTermsRequest(prefix=prefix, limit=limit)
+            response = self.stub.SuggestTerms(request)
+            return list(response.keywords)
+        except grpc.RpcError as e:
+            logging.error(f"gRPC error: {e.code()} - {e.details()}")
+            return None
+
+    def list_categories(self):
+        """Get categories with their term counts"""
+        try:
+            request = glossary_pb2.ListCategoriesRequest()
+            response = self.stub.ListCategories(request)
+            return response
+        except grpc.RpcError as e:
+            logging.error(f"gRPC error: {e.code()} - {e.details()}")
+            return None
+
 
 def demo_client():
     """Demo client usage"""
@@ -22,31 +22,50 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0eglossary.proto\x12\x08glossary\"/\n\x10ListTermsRequest\x12\x0c\n\x04skip\x18\x01 \x01(\x05\x12\r\n\x05limit\x18\x02 \x01(\x05\"O\n\x11ListTermsResponse\x12%\n\x05terms\x18\x01 \x03(\x0b\x32\x16.glossary.TermResponse\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\"!\n\x0eGetTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\"]\n\x11\x43reateTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\x12\x10\n\x08\x65xamples\x18\x04 \x01(\t\"]\n\x11UpdateTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\x12\x10\n\x08\x65xamples\x18\x04 \x01(\t\"$\n\x11\x44\x65leteTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\"\x80\x01\n\x0cTermResponse\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\x12\x10\n\x08\x65xamples\x18\x04 \x01(\t\x12\x12\n\ncreated_at\x18\x05 \x01(\t\x12\x12\n\nupdated_at\x18\x06 \x01(\t\"2\n\x0e\x44\x65leteResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t2\xdf\x02\n\x0fGlossaryService\x12\x44\n\tListTerms\x12\x1a.glossary.ListTermsRequest\x1a\x1b.glossary.ListTermsResponse\x12;\n\x07GetTerm\x12\x18.glossary.GetTermRequest\x1a\x16.glossary.TermResponse\x12\x41\n\nCreateTerm\x12\x1b.glossary.CreateTermRequest\x1a\x16.glossary.TermResponse\x12\x41\n\nUpdateTerm\x12\x1b.glossary.UpdateTermRequest\x1a\x16.glossary.TermResponse\x12\x43\n\nDeleteTerm\x12\x1b.glossary.DeleteTermRequest\x1a\x18.glossary.DeleteResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0eglossary.proto\x12\x08glossary\x1a google/protobuf/field_mask.proto\"\x9b\x01\n\x10ListTermsRequest\x12\x0c\n\x04skip\x18\x01 \x01(\x05\x12\r\n\x05limit\x18\x02 \x01(\x05\x12*\n\x06\x66ields\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x10\n\x08\x63\x61tegory\x18\x04 \x01(\t\x12\x14\n\x0c\x63reated_from\x18\x05 \x01(\t\x12\x16\n\x0e\x63reated_before\x18\x06 \x01(\t\"a\n\x11ListTermsResponse\x12%\n\x05terms\x18\x01 \x03(\x0b\x32\x16.glossary.TermResponse\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x12\x10\n\x08revision\x18\x03 \x01(\x03\"!\n\x0eGetTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\"]\n\x11\x43reateTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\x12\x10\n\x08\x65xamples\x18\x04 \x01(\t\"]\n\x11UpdateTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\x12\x10\n\x08\x65xamples\x18\x04 \x01(\t\"K\n\x11UpsertTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\"$\n\x11\x44\x65leteTermRequest\x12\x0f\n\x07keyword\x18\x01 \x01(\t\"\x92\x01\n\x0cTermResponse\x12\x0f\n\x07keyword\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\t\x12\x10\n\x08\x65xamples\x18\x04 \x01(\t\x12\x12\n\ncreated_at\x18\x05 \x01(\t\x12\x12\n\nupdated_at\x18\x06 \x01(\t\x12\x10\n\x08revision\x18\x07 \x01(\x03\"A\n\x11WatchTermsRequest\x12\x1a\n\rfrom_revision\x18\x01 \x01(\x03H\x00\x88\x01\x01\x42\x10\n\x0e_from_revision\"\xb0\x01\n\tTermEvent\x12&\n\x04type\x18\x01 \x01(\x0e\x32\x18.glossary.TermEvent.Type\x12\x10\n\x08revision\x18\x02 \x01(\x03\x12$\n\x04term\x18\x03 \x01(\x0b\x32\x16.glossary.TermResponse\"C\n\x04Type\x12\x14\n\x10TYPE_UNSPECIFIED\x10\x00\x12\x0b\n\x07\x43REATED\x10\x01\x12\x0b\n\x07UPDATED\x10\x02\x12\x0b\n\x07\x44\x45LETED\x10\x03\"\x17\n\x15ListCategoriesRequest\"5\n\rCategoryCount\x12\x10\n\x08\x63\x61tegory\x18\x01 \x01(\t\x12\x12\n\nterm_count\x18\x02 \x01(\x05\"l\n\x16ListCategoriesResponse\x12+\n\ncategories\x18\x01 \x03(\x0b\x32\x17.glossary.CategoryCount\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x12\x10\n\x08revision\x18\x03 \x01(\x03\"4\n\x13SuggestTermsRequest\x12\x0e\n\x06prefix\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\x05\"(\n\x14SuggestTermsResponse\x12\x10\n\x08keywords\x18\x01 \x03(\t\"2\n\x0e\x44\x65leteResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t2\x88\x05\n\x0fGlossaryService\x12\x44\n\tListTerms\x12\x1a.glossary.ListTermsRequest\x1a\x1b.glossary.ListTermsResponse\x12;\n\x07GetTerm\x12\x18.glossary.GetTermRequest\x1a\x16.glossary.TermResponse\x12\x41\n\nCreateTerm\x12\x1b.glossary.CreateTermRequest\x1a\x16.glossary.TermResponse\x12\x41\n\nUpdateTerm\x12\x1b.glossary.UpdateTermRequest\x1a\x16.glossary.TermResponse\x12\x43\n\nDeleteTerm\x12\x1b.glossary.DeleteTermRequest\x1a\x18.glossary.DeleteResponse\x12\x41\n\nUpsertTerm\x12\x1b.glossary.UpsertTermRequest\x1a\x16.glossary.TermResponse\x12@\n\nWatchTerms\x12\x1b.glossary.WatchTermsRequest\x1a\x13.glossary.TermEvent0\x01\x12S\n\x0eListCategories\x12\x1f.glossary.ListCategoriesRequest\x1a .glossary.ListCategoriesResponse\x12M\n\x0cSuggestTerms\x12\x1d.glossary.SuggestTermsRequest\x1a\x1e.glossary.SuggestTermsResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'glossary_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_LISTTERMSREQUEST']._serialized_start=28
-  _globals['_LISTTERMSREQUEST']._serialized_end=75
-  _globals['_LISTTERMSRESPONSE']._serialized_start=77
-  _globals['_LISTTERMSRESPONSE']._serialized_end=156
-  _globals['_GETTERMREQUEST']._serialized_start=158
-  _globals['_GETTERMREQUEST']._serialized_end=191
-  _globals['_CREATETERMREQUEST']._serialized_start=193
-  _globals['_CREATETERMREQUEST']._serialized_end=286
-  _globals['_UPDATETERMREQUEST']._serialized_start=288
-  _globals['_UPDATETERMREQUEST']._serialized_end=381
-  _globals['_DELETETERMREQUEST']._serialized_start=383
-  _globals['_DELETETERMREQUEST']._serialized_end=419
-  _globals['_TERMRESPONSE']._serialized_start=422
-  _globals['_TERMRESPONSE']._serialized_end=550
-  _globals['_DELETERESPONSE']._serialized_start=552
-  _globals['_DELETERESPONSE']._serialized_end=602
-  _globals['_GLOSSARYSERVICE']._serialized_start=605
-  _globals['_GLOSSARYSERVICE']._serialized_end=956
+  _globals['_LISTTERMSREQUEST']._serialized_start=63
+  _globals['_LISTTERMSREQUEST']._serialized_end=218
+  _globals['_LISTTERMSRESPONSE']._serialized_start=220
+  _globals['_LISTTERMSRESPONSE']._serialized_end=317
+  _globals['_GETTERMREQUEST']._serialized_start=319
+  _globals['_GETTERMREQUEST']._serialized_end=352
+  _globals['_CREATETERMREQUEST']._serialized_start=354
+  _globals['_CREATETERMREQUEST']._serialized_end=447
+  _globals['_UPDATETERMREQUEST']._serialized_start=449
+  _globals['_UPDATETERMREQUEST']._serialized_end=542
+  _globals['_UPSERTTERMREQUEST']._serialized_start=544
+  _globals['_UPSERTTERMREQUEST']._serialized_end=619
+  _globals['_DELETETERMREQUEST']._serialized_start=621
+  _globals['_DELETETERMREQUEST']._serialized_end=657
+  _globals['_TERMRESPONSE']._serialized_start=660
+  _globals['_TERMRESPONSE']._serialized_end=806
+  _globals['_WATCHTERMSREQUEST']._serialized_start=808
+  _globals['_WATCHTERMSREQUEST']._serialized_end=873
+  _globals['_TERMEVENT']._serialized_start=876
+  _globals['_TERMEVENT']._serialized_end=1052
+  _globals['_TERMEVENT_TYPE']._serialized_start=985
+  _globals['_TERMEVENT_TYPE']._serialized_end=1052
+  _globals['_LISTCATEGORIESREQUEST']._serialized_start=1054
+  _globals['_LISTCATEGORIESREQUEST']._serialized_end=1077
+  _globals['_CATEGORYCOUNT']._serialized_start=1079
+  _globals['_CATEGORYCOUNT']._serialized_end=1132
+  _globals['_LISTCATEGORIESRESPONSE']._serialized_start=1134
+  _globals['_LISTCATEGORIESRESPONSE']._serialized_end=1242
+  _globals['_SUGGESTTERMSREQUEST']._serialized_start=1244
+  _globals['_SUGGESTTERMSREQUEST']._serialized_end=1296
+  _globals['_SUGGESTTERMSRESPONSE']._serialized_start=1298
+  _globals['_SUGGESTTERMSRESPONSE']._serialized_end=1338
+  _globals['_DELETERESPONSE']._serialized_start=1340
+  _globals['_DELETERESPONSE']._serialized_end=1390
+  _globals['_GLOSSARYSERVICE']._serialized_start=1393
+  _globals['_GLOSSARYSERVICE']._serialized_end=2041
 # @@protoc_insertion_point(module_scope)
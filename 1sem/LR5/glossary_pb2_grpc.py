@@ -58,6 +58,26 @@ class GlossaryServiceStub(object):
                 request_serializer=glossary__pb2.DeleteTermRequest.SerializeToString,
                 response_deserializer=glossary__pb2.DeleteResponse.FromString,
                 _registered_method=True)
+        self.UpsertTerm = channel.unary_unary(
+                '/glossary.GlossaryService/UpsertTerm',
+                request_serializer=glossary__pb2.UpsertTermRequest.SerializeToString,
+                response_deserializer=glossary__pb2.TermResponse.FromString,
+                _registered_method=True)
+        self.WatchTerms = channel.unary_stream(
+                '/glossary.GlossaryService/WatchTerms',
+                request_serializer=glossary__pb2.WatchTermsRequest.SerializeToString,
+                response_deserializer=glossary__pb2.TermEvent.FromString,
+                _registered_method=True)
+        self.ListCategories = channel.unary_unary(
+                '/glossary.GlossaryService/ListCategories',
+                request_serializer=glossary__pb2.ListCategoriesRequest.SerializeToString,
+                response_deserializer=glossary__pb2.ListCategoriesResponse.FromString,
+                _registered_method=True)
+        self.SuggestTerms = channel.unary_unary(
+                '/glossary.GlossaryService/SuggestTerms',
+                request_serializer=glossary__pb2.SuggestTermsRequest.SerializeToString,
+                response_deserializer=glossary__pb2.SuggestTermsResponse.FromString,
+                _registered_method=True)
 
 
 class GlossaryServiceServicer(object):
@@ -98,6 +118,34 @@ class GlossaryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def UpsertTerm(self, request, context):
+        """Создание нового термина или обновление существующего
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchTerms(self, request, context):
+        """Поток изменений глоссария начиная с заданной ревизии
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListCategories(self, request, context):
+        """Список категорий с количеством терминов в каждой
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SuggestTerms(self, request, context):
+        """Подсказки ключевых слов по префиксу (без учета регистра)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_GlossaryServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -126,6 +174,26 @@ def add_GlossaryServiceServicer_to_server(servicer, server):
                     request_deserializer=glossary__pb2.DeleteTermRequest.FromString,
                     response_serializer=glossary__pb2.DeleteResponse.SerializeToString,
             ),
+            'UpsertTerm': grpc.unary_unary_rpc_method_handler(
+                    servicer.UpsertTerm,
+                    request_deserializer=glossary__pb2.UpsertTermRequest.FromString,
+                    response_serializer=glossary__pb2.TermResponse.SerializeToString,
+            ),
+            'WatchTerms': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchTerms,
+                    request_deserializer=glossary__pb2.WatchTermsRequest.FromString,
+                    response_serializer=glossary__pb2.TermEvent.SerializeToString,
+            ),
+            'ListCategories': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListCategories,
+                    request_deserializer=glossary__pb2.ListCategoriesRequest.FromString,
+                    response_serializer=glossary__pb2.ListCategoriesResponse.SerializeToString,
+            ),
+            'SuggestTerms': grpc.unary_unary_rpc_method_handler(
+                    servicer.SuggestTerms,
+                    request_deserializer=glossary__pb2.SuggestTermsRequest.FromString,
+                    response_serializer=glossary__pb2.SuggestTermsResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'glossary.GlossaryService', rpc_method_handlers)
@@ -271,3 +339,111 @@ class GlossaryService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def UpsertTerm(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/glossary.GlossaryService/UpsertTerm',
+            glossary__pb2.UpsertTermRequest.SerializeToString,
+            glossary__pb2.TermResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchTerms(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/glossary.GlossaryService/WatchTerms',
+            glossary__pb2.WatchTermsRequest.SerializeToString,
+            glossary__pb2.TermEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListCategories(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/glossary.GlossaryService/ListCategories',
+            glossary__pb2.ListCategoriesRequest.SerializeToString,
+            glossary__pb2.ListCategoriesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SuggestTerms(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/glossary.GlossaryService/SuggestTerms',
+            glossary__pb2.SuggestTermsRequest.SerializeToString,
+            glossary__pb2.SuggestTermsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,354 @@
+import argparse
+import http.client
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import grpc
+
+import glossary_pb2
+import glossary_pb2_grpc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+
+from sharding import open_database
+
+# Доли операций в смешанной нагрузке по умолчанию
+DEFAULT_MIX = "get=80,list=15,write=5"
+
+LIST_PAGE_SIZE = 50
+CATEGORIES = ["web", "python", "db", "network", "general"]
+PERCENTILES = (50, 90, 95, 99)
+
+
+def run_server(db_path, grpc_port, http_port, max_workers, gateway_mode, shards, queue_size):
+    """Сервер глоссария в отдельном процессе, чтобы не делить GIL с генератором нагрузки"""
+    import main
+    from admission import max_concurrent_rpcs
+    from gateway import GrpcBackend, LocalBackend
+
+    # Без журнала каждого запроса werkzeug; баннер Flask не должен попасть в JSON отчет в stdout
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    sys.stdout = sys.stderr
+
+    service = main.create_service(db_path, max_workers, shards)
+    # Сервер останавливается, когда объект удаляется сборщиком мусора
+    grpc_server = main.start_grpc_server(
+        port=str(grpc_port),
+        max_workers=max_workers,
+        service=service,
+        max_rpcs=max_concurrent_rpcs(max_workers, queue_size)
+    )
+    if gateway_mode == "grpc":
+        backend = GrpcBackend(f"localhost:{grpc_port}")
+    else:
+        backend = LocalBackend(service)
+    main.start_flask_app(backend, port=http_port)
+    grpc_server.stop(None)
+
+
+def wait_for_port(port, timeout=30.0):
+    """Ожидание, пока сервер начнет принимать соединения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("localhost", port), timeout=1.0):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server on port {port} did not start in {timeout} sec")
+
+
+def seed_database(db_path, count, shards=1):
+    """Заполнение временной базы терминами term00000..."""
+    db = open_database(db_path, shards)
+    keywords = [f"term{i:05d}" for i in range(count)]
+    db.import_terms(
+        (keyword, f"Description of {keyword}. " * 8, CATEGORIES[i % len(CATEGORIES)])
+        for i, keyword in enumerate(keywords)
+    )
+    return keywords
+
+
+def parse_mix(value):
+    """Разбор строки вида get=80,list=15,write=5"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("get", "list", "write"):
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}'")
+        mix[name] = float(weight)
+    return mix
+
+
+class GrpcDriver:
+    """Executes workload operations over gRPC"""
+
+    def __init__(self, port, timeout=None):
+        self.timeout = timeout
+        self.channel = grpc.insecure_channel(f"localhost:{port}")
+        self.stub = glossary_pb2_grpc.GlossaryServiceStub(self.channel)
+
+    def get(self, keyword):
+        self.stub.GetTerm(glossary_pb2.GetTermRequest(keyword=keyword), timeout=self.timeout)
+
+    def list(self, skip):
+        self.stub.ListTerms(glossary_pb2.ListTermsRequest(skip=skip, limit=LIST_PAGE_SIZE), timeout=self.timeout)
+
+    def write(self, keyword, description):
+        request = glossary_pb2.UpsertTermRequest(keyword=keyword, description=description)
+        self.stub.UpsertTerm(request, timeout=self.timeout)
+
+    def close(self):
+        self.channel.close()
+
+
+class RestDriver:
+    """Executes workload operations over the Web API"""
+
+    def __init__(self, port, timeout=None):
+        self.port = port
+        self.timeout = timeout or 10
+
+    def _request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("localhost", self.port, timeout=self.timeout)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                raise RuntimeError(f"{method} {path}: HTTP {response.status}")
+        finally:
+            conn.close()
+
+    def get(self, keyword):
+        self._request("GET", f"/terms/{keyword}")
+
+    def list(self, skip):
+        # В Web API нет постраничного вывода, список различается категорией
+        self._request("GET", f"/terms?category={CATEGORIES[skip % len(CATEGORIES)]}")
+
+    def write(self, keyword, description):
+        self._request("PUT", f"/terms/{keyword}", {"description": description})
+
+    def close(self):
+        pass
+
+
+class Recorder:
+    """Collects per-operation latencies of all worker threads"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, operation, latencies, errors):
+        with self._lock:
+            self.latencies.setdefault(operation, []).extend(latencies)
+            self.errors[operation] = self.errors.get(operation, 0) + errors
+
+
+def percentile(values, p):
+    """Процентиль по ближайшему рангу для отсортированного списка"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(latencies, errors, duration):
+    """Пропускная способность и задержки в миллисекундах"""
+    values = sorted(latencies)
+    summary = {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / duration, 1),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None,
+    }
+    for p in PERCENTILES:
+        value = percentile(values, p)
+        summary[f"p{p}_ms"] = round(value * 1000, 3) if value is not None else None
+    return summary
+
+
+def worker(driver, keywords, mix, deadline, warmup_until, recorder, seed):
+    """Поток нагрузки: выполняет случайные операции до deadline"""
+    rng = random.Random(seed)
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+    latencies = {name: [] for name in operations}
+    errors = {name: 0 for name in operations}
+    pages = max(1, len(keywords) // LIST_PAGE_SIZE)
+
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        operation = rng.choices(operations, weights)[0]
+        try:
+            if operation == "get":
+                driver.get(rng.choice(keywords))
+            elif operation == "list":
+                driver.list(rng.randrange(pages) * LIST_PAGE_SIZE)
+            else:
+                driver.write(rng.choice(keywords), f"Updated description {rng.random()}")
+            failed = False
+        except Exception:
+            failed = True
+        finished = time.perf_counter()
+        if now < warmup_until:
+            continue
+        if failed:
+            errors[operation] += 1
+        else:
+            latencies[operation].append(finished - now)
+
+    for name in operations:
+        recorder.add(name, latencies[name], errors[name])
+
+
+def run_load(protocol, port, keywords, mix, concurrency, duration, warmup, seed, timeout=None):
+    """Нагрузка по одному протоколу, возвращает сводку по операциям"""
+    recorder = Recorder()
+    driver_class = GrpcDriver if protocol == "grpc" else RestDriver
+    drivers = [driver_class(port, timeout) for _ in range(concurrency)]
+    start = time.perf_counter()
+    warmup_until = start + warmup
+    deadline = warmup_until + duration
+
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(drivers[i], keywords, mix, deadline, warmup_until, recorder, seed + i)
+        )
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for driver in drivers:
+        driver.close()
+
+    operations = {
+        name: summarize(recorder.latencies.get(name, []), recorder.errors.get(name, 0), duration)
+        for name in mix
+    }
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    operations["total"] = summarize(all_latencies, sum(recorder.errors.values()), duration)
+    return operations
+
+
+def compare(results, baseline):
+    """Отношение к базовому прогону: >1 по rps - быстрее, >1 по p99 - медленнее"""
+    comparison = {}
+    for protocol, operations in results.items():
+        for name, summary in operations.items():
+            base = baseline.get("results", {}).get(protocol, {}).get(name)
+            if not base or not base.get("throughput_rps") or not base.get("p99_ms"):
+                continue
+            comparison[f"{protocol}.{name}"] = {
+                "throughput_ratio": round(summary["throughput_rps"] / base["throughput_rps"], 3),
+                "p99_ratio": round(summary["p99_ms"] / base["p99_ms"], 3) if summary["p99_ms"] else None,
+            }
+    return comparison
+
+
+def main():
+    """Нагрузочное тестирование gRPC и Web API глоссария"""
+    parser = argparse.ArgumentParser(description="Load generator for the glossary gRPC and REST APIs")
+    parser.add_argument("--protocols", default="grpc,rest", help="comma separated: grpc, rest")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights, default {DEFAULT_MIX}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured per protocol")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds not measured before each run")
+    parser.add_argument("--terms", type=int, default=5000, help="terms in the temporary database")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-workers", type=int, default=10)
+    parser.add_argument("--gateway", choices=["local", "grpc"], default="local")
+    parser.add_argument("--shards", type=int, default=1, help="SQLite files of the temporary glossary")
+    parser.add_argument("--queue-size", type=int, default=10,
+                        help="RPCs the server queues before answering RESOURCE_EXHAUSTED")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="per-request deadline in seconds, failed requests count as errors")
+    parser.add_argument("--grpc-port", type=int, default=50071)
+    parser.add_argument("--http-port", type=int, default=8071)
+    parser.add_argument("--output", default="-", help="JSON report path, '-' for stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare with")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    protocols = [name.strip() for name in args.protocols.split(",") if name.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="glossary-load-") as tmp:
+        db_path = os.path.join(tmp, "glossary.db")
+        keywords = seed_database(db_path, args.terms, args.shards)
+
+        server = multiprocessing.get_context("spawn").Process(
+            target=run_server,
+            args=(db_path, args.grpc_port, args.http_port, args.server_workers, args.gateway, args.shards,
+                  args.queue_size),
+            daemon=True
+        )
+        server.start()
+        try:
+            wait_for_port(args.grpc_port)
+            wait_for_port(args.http_port)
+
+            results = {}
+            for protocol in protocols:
+                port = args.grpc_port if protocol == "grpc" else args.http_port
+                print(f"Running {protocol} load for {args.duration} sec...", file=sys.stderr)
+                results[protocol] = run_load(
+                    protocol, port, keywords, args.mix, args.concurrency,
+                    args.duration, args.warmup, args.seed, args.timeout
+                )
+        finally:
+            server.terminate()
+            server.join()
+
+    report = {
+        "config": {
+            "protocols": protocols,
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "terms": args.terms,
+            "seed": args.seed,
+            "server_workers": args.server_workers,
+            "gateway": args.gateway,
+            "shards": args.shards,
+            "queue_size": args.queue_size,
+            "timeout": args.timeout,
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["baseline"] = compare(results, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
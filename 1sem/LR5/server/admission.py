@@ -0,0 +1,99 @@
+import os
+import time
+
+import grpc
+
+from metrics import REGISTRY, Counter
+
+# Сколько RPC может ждать свободный поток сверх max_workers; остальные
+# сразу получают RESOURCE_EXHAUSTED вместо ожидания в неограниченной очереди
+GRPC_QUEUE_SIZE = int(os.environ.get("GRPC_QUEUE_SIZE", "10"))
+
+# Запрос, у которого до дедлайна осталось меньше, не выполняется:
+# клиент не дождется ответа, а работа с базой займет поток
+MIN_TIME_REMAINING = float(os.environ.get("GRPC_MIN_TIME_REMAINING", "0.005"))
+
+# Вес последнего замера в скользящем среднем времени обработки метода
+HANDLING_TIME_WEIGHT = 0.1
+
+GRPC_SHED = REGISTRY.register(Counter(
+    "grpc_server_shed_total", "RPCs dropped before handling because they could not finish before their deadline",
+    ("grpc_method",)))
+
+
+def max_concurrent_rpcs(max_workers, queue_size=GRPC_QUEUE_SIZE):
+    """Предел одновременных RPC сервера: потоки пула плюс очередь"""
+    return max_workers + queue_size
+
+
+class DeadlineInterceptor(grpc.ServerInterceptor):
+    """Rejects RPCs that cannot finish before their deadline
+
+    gRPC itself skips calls that expired while waiting for a thread; this
+    also drops calls whose remaining time is shorter than the average
+    handling time of the method, so that the thread serves a request the
+    client will still wait for.
+    """
+
+    def __init__(self, min_time_remaining=MIN_TIME_REMAINING):
+        self.min_time_remaining = min_time_remaining
+        # Скользящее среднее времени обработки unary методов в секундах
+        self._handling_time = {}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                self._wrap_unary(handler.unary_unary, method),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer
+            )
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                self._wrap_stream(handler.unary_stream, method),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer
+            )
+        return handler
+
+    def _check(self, method, context):
+        # Без дедлайна time_remaining() возвращает очень большое число (None в старых версиях)
+        remaining = context.time_remaining()
+        if remaining is None:
+            return
+        if remaining < max(self.min_time_remaining, self._handling_time.get(method, 0.0)):
+            GRPC_SHED.inc(method)
+            # Иначе завышенное среднее отбрасывало бы метод навсегда: отброшенные
+            # запросы не выполняются и не обновляют его
+            self._observe(method, remaining)
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Not enough time left to handle the request")
+
+    def _observe(self, method, duration):
+        average = self._handling_time.get(method)
+        if average is None:
+            self._handling_time[method] = duration
+        else:
+            self._handling_time[method] = average + HANDLING_TIME_WEIGHT * (duration - average)
+
+    def _wrap_unary(self, behavior, method):
+        def wrapper(request, context):
+            self._check(method, context)
+            start = time.perf_counter()
+            try:
+                return behavior(request, context)
+            finally:
+                self._observe(method, time.perf_counter() - start)
+
+        return wrapper
+
+    def _wrap_stream(self, behavior, method):
+        def wrapper(request, context):
+            self._check(method, context)
+            yield from behavior(request, context)
+
+        return wrapper
\ No newline at end of file
@@ -0,0 +1,140 @@
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+
+sys.path.append('/app')
+
+from sharding import GLOSSARY_SHARDS, open_database
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ["keyword", "description", "category", "created_at", "updated_at", "revision"]
+
+# Поля CSV могут быть длиннее стандартного ограничения модуля csv (128 КБ)
+csv.field_size_limit(sys.maxsize)
+
+
+def detect_format(path, explicit=None):
+    """Формат файла по ключу --format или по расширению"""
+    if explicit:
+        return explicit
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Cannot detect format of '{path}', use --format")
+
+
+def read_terms(stream, fmt):
+    """Построчное чтение терминов: в памяти не держится весь файл"""
+    if fmt == "csv":
+        records = csv.DictReader(stream)
+    else:
+        records = (json.loads(line) for line in stream if line.strip())
+
+    for number, record in enumerate(records, start=1):
+        keyword = record.get("keyword")
+        description = record.get("description")
+        if not keyword or not description:
+            logger.warning(f"Record {number} skipped: keyword and description are required")
+            continue
+        yield keyword, description, record.get("category") or "general"
+
+
+def write_terms(stream, fmt, terms):
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for count, term in enumerate(terms, start=1):
+            writer.writerow(term)
+            yield count
+    else:
+        for count, term in enumerate(terms, start=1):
+            stream.write(json.dumps(term, ensure_ascii=False))
+            stream.write("\n")
+            yield count
+
+
+class ProgressReporter:
+    """Logs processed rows and throughput at most once per interval"""
+
+    def __init__(self, action, interval=2.0):
+        self.action = action
+        self.interval = interval
+        self.start = time.perf_counter()
+        self._last_report = self.start
+        self.count = 0
+
+    def __call__(self, count):
+        self.count = count
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self._log(now)
+
+    def _log(self, now):
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed else 0
+        logger.info(f"{self.action} {self.count} terms in {elapsed:.1f} sec ({rate:.0f} terms/s)")
+
+    def finish(self):
+        self._log(time.perf_counter())
+
+
+def import_file(db, path, fmt, batch_size, replace):
+    """Импорт терминов из JSONL/CSV файла ('-' - stdin)"""
+    progress = ProgressReporter("Imported")
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    try:
+        db.import_terms(read_terms(stream, fmt), batch_size=batch_size, replace=replace, progress=progress)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    progress.finish()
+
+
+def export_file(db, path, fmt, batch_size):
+    """Экспорт терминов в JSONL/CSV файл ('-' - stdout)"""
+    progress = ProgressReporter("Exported")
+    stream = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        for count in write_terms(stream, fmt, db.export_terms(batch_size=batch_size)):
+            progress(count)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    progress.finish()
+
+
+def main():
+    """Массовый импорт и экспорт терминов глоссария"""
+    parser = argparse.ArgumentParser(description="Bulk import/export of glossary terms")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="JSONL or CSV file, '-' for stdin/stdout")
+    parser.add_argument("--db-path", default="glossary.db")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None)
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="rows per executemany call and per transaction")
+    parser.add_argument("--replace", action="store_true",
+                        help="overwrite existing terms instead of skipping them")
+    parser.add_argument("--shards", type=int, default=GLOSSARY_SHARDS,
+                        help="number of SQLite files of the glossary (see sharding.py)")
+    args = parser.parse_args()
+
+    # Журнал пишется в stderr, чтобы не смешиваться с экспортом в stdout
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    fmt = detect_format(args.path, args.format) if args.path != "-" else (args.format or "jsonl")
+    db = open_database(args.db_path, args.shards)
+
+    if args.command == "import":
+        import_file(db, args.path, fmt, args.batch_size, args.replace)
+    else:
+        export_file(db, args.path, fmt, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
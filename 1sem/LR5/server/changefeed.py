@@ -0,0 +1,32 @@
+import threading
+
+# Как часто поток WatchTerms перечитывает журнал изменений без уведомления:
+# записи из других процессов (launcher.py) видны не позже этого интервала
+WATCH_POLL_INTERVAL = 1.0
+
+# Сколько изменений отдается из журнала за один запрос к базе
+WATCH_BATCH_SIZE = 500
+
+
+class ChangeNotifier:
+    """Wakes WatchTerms streams up when this process writes to the glossary"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = 0
+
+    @property
+    def sequence(self):
+        """Read before querying the change log and pass to wait()"""
+        return self._sequence
+
+    def notify(self):
+        """Signal that a write was committed"""
+        with self._condition:
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def wait(self, sequence, timeout=WATCH_POLL_INTERVAL):
+        """Block until a write newer than sequence or the timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._sequence != sequence, timeout)
\ No newline at end of file
@@ -2,13 +2,46 @@ import sqlite3
 import logging
 from datetime import datetime
 from contextlib import contextmanager
+from itertools import islice
+
+from metrics import track_query
 
 logger = logging.getLogger(__name__)
 
+# Columns a TermResponse field is read from; list_terms selects only the
+# requested ones so that long descriptions are not read when not needed
+TERM_FIELDS = {
+    "keyword": "keyword",
+    "description": "description",
+    "category": "category",
+    "created_at": "created_at",
+    # updated_at is NULL for rows inserted into databases migrated by _migrate_terms,
+    # ALTER TABLE cannot give the new column a CURRENT_TIMESTAMP default
+    "updated_at": "COALESCE(updated_at, created_at) AS updated_at",
+    "revision": "revision",
+}
+TERM_COLUMNS = ", ".join(TERM_FIELDS.values())
+
+# Every write stamps the row with the next glossary revision; the triggers
+# created in init_database move the global counter forward
+NEXT_REVISION = "(SELECT value + 1 FROM glossary_meta WHERE key = 'revision')"
+
+# How many of the latest changes term_changes keeps for WatchTerms resumption
+CHANGE_LOG_SIZE = 10000
+
+# Terms every new glossary starts with
+INITIAL_TERMS = [
+    ('REST', '«передача репрезентативного состояния» или «передача „самоописываемого“ состояния») — архитектурный стиль взаимодействия компонентов распределённого приложения в сети.', 'web'),
+    ('RPC', 'Удалённый вызов процедур (Remote Procedure Call, RPC) — это механизм, который позволяет одной программе вызывать процедуры или функции другой программы, расположенной на другом компьютере в сети.', 'web')
+]
+
 
 class GlossaryDatabase:
-    def __init__(self, db_path="glossary.db"):
+    def __init__(self, db_path="glossary.db", seed=True):
         self.db_path = db_path
+        # Shards of ShardedGlossaryDatabase are not seeded, the initial terms
+        # are routed to their shards instead
+        self.seed = seed
         self.init_database()
 
     def init_database(self):
@@ -20,14 +53,154 @@ class GlossaryDatabase:
                     keyword TEXT UNIQUE NOT NULL,
                     description TEXT NOT NULL,
                     category TEXT DEFAULT 'general',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    revision INTEGER NOT NULL DEFAULT 0
                 )
             ''')
+            self._migrate_terms(conn)
+
+            # Secondary indexes for the category and created_at filters of list_terms;
+            # (category, keyword) also returns a category already ordered by keyword
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_terms_category ON terms (category, keyword)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_terms_created_at ON terms (created_at)')
+
+            self._init_revisions(conn)
+            self._init_category_counts(conn)
+
+            # WAL allows readers in several server processes to work
+            # concurrently with a single writer
+            conn.execute('PRAGMA journal_mode=WAL')
 
             # Insert initial data
-            self._seed_initial_data(conn)
+            if self.seed:
+                self._seed_initial_data(conn)
             logger.info("Database initialized successfully")
 
+    def _migrate_terms(self, conn):
+        """Add columns missing in databases created by older versions"""
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(terms)')}
+        if 'updated_at' not in columns:
+            conn.execute('ALTER TABLE terms ADD COLUMN updated_at TIMESTAMP')
+            conn.execute('UPDATE terms SET updated_at = created_at')
+        if 'revision' not in columns:
+            conn.execute('ALTER TABLE terms ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+
+    def _init_revisions(self, conn):
+        """Create the global revision counter, the change log and the triggers maintaining them"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS glossary_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('''
+            INSERT OR IGNORE INTO glossary_meta (key, value)
+            SELECT 'revision', COALESCE(MAX(revision), 0) FROM terms
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS term_changes (
+                revision INTEGER PRIMARY KEY,
+                operation TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                description TEXT,
+                category TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Triggers are recreated on every start so that databases created
+        # by older versions get the current trigger bodies
+        conn.executescript(f'''
+            BEGIN;
+
+            DROP TRIGGER IF EXISTS terms_revision_insert;
+            CREATE TRIGGER terms_revision_insert AFTER INSERT ON terms
+            BEGIN
+                UPDATE glossary_meta SET value = MAX(value, NEW.revision) WHERE key = 'revision';
+                INSERT INTO term_changes (revision, operation, keyword, description, category, created_at, updated_at)
+                VALUES (NEW.revision, 'create', NEW.keyword, NEW.description, NEW.category,
+                        NEW.created_at, COALESCE(NEW.updated_at, NEW.created_at));
+                DELETE FROM term_changes WHERE revision <= NEW.revision - {CHANGE_LOG_SIZE};
+            END;
+
+            DROP TRIGGER IF EXISTS terms_revision_update;
+            CREATE TRIGGER terms_revision_update AFTER UPDATE ON terms
+            WHEN NEW.revision <> OLD.revision
+            BEGIN
+                UPDATE glossary_meta SET value = MAX(value, NEW.revision) WHERE key = 'revision';
+                INSERT INTO term_changes (revision, operation, keyword, description, category, created_at, updated_at)
+                VALUES (NEW.revision, 'update', NEW.keyword, NEW.description, NEW.category,
+                        NEW.created_at, COALESCE(NEW.updated_at, NEW.created_at));
+                DELETE FROM term_changes WHERE revision <= NEW.revision - {CHANGE_LOG_SIZE};
+            END;
+
+            DROP TRIGGER IF EXISTS terms_revision_delete;
+            CREATE TRIGGER terms_revision_delete AFTER DELETE ON terms
+            BEGIN
+                UPDATE glossary_meta SET value = value + 1 WHERE key = 'revision';
+                INSERT INTO term_changes (revision, operation, keyword)
+                SELECT value, 'delete', OLD.keyword FROM glossary_meta WHERE key = 'revision';
+                DELETE FROM term_changes
+                WHERE revision <= (SELECT value FROM glossary_meta WHERE key = 'revision') - {CHANGE_LOG_SIZE};
+            END;
+
+            COMMIT;
+        ''')
+
+    def _init_category_counts(self, conn):
+        """Create the per-category term counters and the triggers keeping them up to date"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS category_counts (
+                category TEXT PRIMARY KEY,
+                term_count INTEGER NOT NULL
+            )
+        ''')
+        # The counters are filled from terms only once, when the table is new;
+        # afterwards every write adjusts them in the same transaction
+        conn.executescript('''
+            BEGIN;
+
+            INSERT INTO category_counts (category, term_count)
+            SELECT COALESCE(category, ''), COUNT(*) FROM terms
+            WHERE NOT EXISTS (SELECT 1 FROM category_counts)
+            GROUP BY COALESCE(category, '');
+
+            DROP TRIGGER IF EXISTS terms_category_insert;
+            CREATE TRIGGER terms_category_insert AFTER INSERT ON terms
+            BEGIN
+                INSERT OR IGNORE INTO category_counts (category, term_count)
+                VALUES (COALESCE(NEW.category, ''), 0);
+                UPDATE category_counts SET term_count = term_count + 1
+                WHERE category = COALESCE(NEW.category, '');
+            END;
+
+            DROP TRIGGER IF EXISTS terms_category_update;
+            CREATE TRIGGER terms_category_update AFTER UPDATE OF category ON terms
+            WHEN COALESCE(NEW.category, '') <> COALESCE(OLD.category, '')
+            BEGIN
+                INSERT OR IGNORE INTO category_counts (category, term_count)
+                VALUES (COALESCE(NEW.category, ''), 0);
+                UPDATE category_counts SET term_count = term_count + 1
+                WHERE category = COALESCE(NEW.category, '');
+                UPDATE category_counts SET term_count = term_count - 1
+                WHERE category = COALESCE(OLD.category, '');
+                DELETE FROM category_counts
+                WHERE category = COALESCE(OLD.category, '') AND term_count <= 0;
+            END;
+
+            DROP TRIGGER IF EXISTS terms_category_delete;
+            CREATE TRIGGER terms_category_delete AFTER DELETE ON terms
+            BEGIN
+                UPDATE category_counts SET term_count = term_count - 1
+                WHERE category = COALESCE(OLD.category, '');
+                DELETE FROM category_counts
+                WHERE category = COALESCE(OLD.category, '') AND term_count <= 0;
+            END;
+
+            COMMIT;
+        ''')
+
     @contextmanager
     def get_connection(self):
         """Context manager for database connections"""
@@ -44,59 +217,151 @@ class GlossaryDatabase:
 
     def _seed_initial_data(self, conn):
         """Seed database with initial Python terms"""
-        initial_terms = [
-            ('REST', '«передача репрезентативного состояния» или «передача „самоописываемого“ состояния») — архитектурный стиль взаимодействия компонентов распределённого приложения в сети.', 'web'),
-            ('RPC', 'Удалённый вызов процедур (Remote Procedure Call, RPC) — это механизм, который позволяет одной программе вызывать процедуры или функции другой программы, расположенной на другом компьютере в сети.', 'web')
-        ]
-
-        for keyword, description, category in initial_terms:
+        for keyword, description, category in INITIAL_TERMS:
             try:
-                conn.execute('''
-                    INSERT OR IGNORE INTO terms (keyword, description, category)
-                    VALUES (?, ?, ?)
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO terms (keyword, description, category, revision)
+                    VALUES (?, ?, ?, {NEXT_REVISION})
                 ''', (keyword, description, category))
             except sqlite3.IntegrityError:
                 pass
 
-    def list_terms(self, skip=0, limit=100):
-        """Get all terms with pagination"""
+    @track_query
+    def list_terms(self, skip=0, limit=100, fields=None, category=None, created_from=None, created_before=None):
+        """Get terms with pagination, the total count and the glossary revision
+
+        fields limits the selected columns (keys of TERM_FIELDS), keyword is always included.
+        category and the created_at range [created_from, created_before) filter the terms.
+        """
+        columns = TERM_COLUMNS
+        if fields:
+            unknown = set(fields) - TERM_FIELDS.keys()
+            if unknown:
+                raise ValueError(f"Unknown term fields: {', '.join(sorted(unknown))}")
+            columns = ", ".join(
+                column for name, column in TERM_FIELDS.items() if name == "keyword" or name in fields
+            )
+
+        conditions = []
+        params = []
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if created_from:
+            conditions.append('created_at >= ?')
+            params.append(created_from)
+        if created_before:
+            conditions.append('created_at < ?')
+            params.append(created_before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT keyword, description, category, created_at 
-                FROM terms 
+            cursor = conn.execute(f'''
+                SELECT {columns}
+                FROM terms {where}
                 ORDER BY keyword 
                 LIMIT ? OFFSET ?
-            ''', (limit, skip))
+            ''', (*params, limit, skip))
 
             terms = [dict(row) for row in cursor.fetchall()]
 
-            count_cursor = conn.execute('SELECT COUNT(*) FROM terms')
-            total_count = count_cursor.fetchone()[0]
+            if created_from or created_before:
+                count_cursor = conn.execute(f'SELECT COUNT(*) FROM terms {where}', params)
+                total_count = count_cursor.fetchone()[0]
+            else:
+                # Without a time range the count comes from the category counters
+                total_count = self._count_terms(conn, category)
+
+            return terms, total_count, self._get_revision(conn)
+
+    def _count_terms(self, conn, category=None):
+        if category:
+            row = conn.execute('SELECT term_count FROM category_counts WHERE category = ?', (category,)).fetchone()
+            return row[0] if row else 0
+        return conn.execute('SELECT COALESCE(SUM(term_count), 0) FROM category_counts').fetchone()[0]
+
+    @track_query
+    def list_categories(self):
+        """Get categories ordered by name with their term counts and the glossary revision"""
+        with self.get_connection() as conn:
+            cursor = conn.execute('''
+                SELECT category, term_count
+                FROM category_counts
+                ORDER BY category
+            ''')
+            return [dict(row) for row in cursor.fetchall()], self._get_revision(conn)
+
+    @track_query
+    def list_keywords(self):
+        """Get all keywords and the revision they are at least as new as"""
+        with self.get_connection() as conn:
+            # The revision is read first: changes made between the two queries
+            # are replayed from the change log after it, which is idempotent
+            revision = self._get_revision(conn)
+            keywords = [row[0] for row in conn.execute('SELECT keyword FROM terms')]
+            return keywords, revision
+
+    def _get_revision(self, conn):
+        return conn.execute("SELECT value FROM glossary_meta WHERE key = 'revision'").fetchone()[0]
+
+    @track_query
+    def get_revision(self):
+        """Get the current glossary revision, it grows on every write"""
+        with self.get_connection() as conn:
+            return self._get_revision(conn)
+
+    @track_query
+    def changes_since(self, revision, limit=500):
+        """Get changes made after revision in order, None if the log no longer covers them"""
+        with self.get_connection() as conn:
+            if revision >= self._get_revision(conn):
+                return []
+
+            first = conn.execute('SELECT MIN(revision) FROM term_changes').fetchone()[0]
+            if first is None or first > revision + 1:
+                return None
 
-            return terms, total_count
+            cursor = conn.execute('''
+                SELECT revision, operation, keyword, description, category, created_at, updated_at
+                FROM term_changes
+                WHERE revision > ?
+                ORDER BY revision
+                LIMIT ?
+            ''', (revision, limit))
+            return [dict(row) for row in cursor.fetchall()]
 
+    @track_query
     def get_term(self, keyword):
         """Get term by keyword"""
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT keyword, description, category, created_at 
+            cursor = conn.execute(f'''
+                SELECT {TERM_COLUMNS}
                 FROM terms WHERE keyword = ?
             ''', (keyword,))
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    @track_query
+    def get_term_revision(self, keyword):
+        """Get the revision of a term row without reading it, None if there is no such term"""
+        with self.get_connection() as conn:
+            row = conn.execute('SELECT revision FROM terms WHERE keyword = ?', (keyword,)).fetchone()
+            return row[0] if row else None
+
+    @track_query
     def create_term(self, keyword, description, category="general"):
         """Create a new term"""
         with self.get_connection() as conn:
             try:
-                conn.execute('''
-                    INSERT INTO terms (keyword, description, category)
-                    VALUES (?, ?, ?)
+                conn.execute(f'''
+                    INSERT INTO terms (keyword, description, category, revision)
+                    VALUES (?, ?, ?, {NEXT_REVISION})
                 ''', (keyword, description, category))
                 return True
             except sqlite3.IntegrityError:
                 return False
 
+    @track_query
     def update_term(self, keyword, description=None, category=None):
         """Update an existing term"""
         with self.get_connection() as conn:
@@ -113,12 +378,148 @@ class GlossaryDatabase:
             if not update_fields:
                 return False
 
+            update_fields.append(f"revision = {NEXT_REVISION}")
+            update_fields.append("updated_at = CURRENT_TIMESTAMP")
             params.append(keyword)
             query = f"UPDATE terms SET {', '.join(update_fields)} WHERE keyword = ?"
 
             cursor = conn.execute(query, params)
             return cursor.rowcount > 0
 
+    @track_query
+    def create_term_returning(self, keyword, description, category="general"):
+        """Create a new term and read it back in one statement, None if it already exists"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'''
+                INSERT INTO terms (keyword, description, category, revision)
+                VALUES (?, ?, ?, {NEXT_REVISION})
+                ON CONFLICT(keyword) DO NOTHING
+                RETURNING {TERM_COLUMNS}
+            ''', (keyword, description, category))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    @track_query
+    def update_term_returning(self, keyword, description=None, category=None):
+        """Update an existing term and read it back in one statement, None if it does not exist"""
+        with self.get_connection() as conn:
+            update_fields = []
+            params = []
+
+            if description is not None:
+                update_fields.append("description = ?")
+                params.append(description)
+            if category is not None:
+                update_fields.append("category = ?")
+                params.append(category)
+
+            if update_fields:
+                update_fields.append(f"revision = {NEXT_REVISION}")
+                update_fields.append("updated_at = CURRENT_TIMESTAMP")
+            else:
+                # Without fields the statement still acts as an existence check
+                update_fields.append("keyword = keyword")
+
+            params.append(keyword)
+            query = f'''
+                UPDATE terms SET {', '.join(update_fields)}
+                WHERE keyword = ?
+                RETURNING {TERM_COLUMNS}
+            '''
+
+            row = conn.execute(query, params).fetchone()
+            return dict(row) if row else None
+
+    @track_query
+    def upsert_term(self, keyword, description, category=None):
+        """Create a term or replace its description, keeping the category if none is given"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'''
+                INSERT INTO terms (keyword, description, category, revision)
+                VALUES (:keyword, :description, COALESCE(:category, 'general'), {NEXT_REVISION})
+                ON CONFLICT(keyword) DO UPDATE SET
+                    description = excluded.description,
+                    category = COALESCE(:category, terms.category),
+                    revision = excluded.revision,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING {TERM_COLUMNS}
+            ''', {'keyword': keyword, 'description': description, 'category': category})
+            return dict(cursor.fetchone())
+
+    def _drop_secondary_indexes(self, conn):
+        """Drop indexes of terms except the keyword one, return their SQL to recreate them"""
+        rows = conn.execute('''
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = 'terms' AND sql IS NOT NULL
+        ''').fetchall()
+        for row in rows:
+            conn.execute(f'DROP INDEX "{row["name"]}"')
+        return [row['sql'] for row in rows]
+
+    def import_terms(self, rows, batch_size=5000, replace=False, progress=None, with_timestamps=False):
+        """Insert (keyword, description, category) rows with executemany, one transaction per batch
+
+        with_timestamps: rows also carry created_at and updated_at, used to copy terms between databases.
+        """
+        columns = "keyword, description, category"
+        timestamps = "updated_at = CURRENT_TIMESTAMP"
+        if with_timestamps:
+            columns += ", created_at, updated_at"
+            timestamps = "created_at = excluded.created_at, updated_at = excluded.updated_at"
+        placeholders = ", ".join("?" * len(columns.split(", ")))
+
+        if replace:
+            on_conflict = f'''DO UPDATE SET
+                description = excluded.description,
+                category = excluded.category,
+                revision = excluded.revision,
+                {timestamps}'''
+        else:
+            on_conflict = 'DO NOTHING'
+        query = f'''
+            INSERT INTO terms ({columns}, revision)
+            VALUES ({placeholders}, {NEXT_REVISION})
+            ON CONFLICT(keyword) {on_conflict}
+        '''
+
+        total = 0
+        rows = iter(rows)
+        with self.get_connection() as conn:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            # Secondary indexes are rebuilt once at the end instead of on every row;
+            # the keyword index stays because ON CONFLICT needs it
+            indexes = self._drop_secondary_indexes(conn)
+            try:
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    conn.executemany(query, batch)
+                    conn.commit()
+                    total += len(batch)
+                    if progress:
+                        progress(total)
+            finally:
+                # The failed batch is rolled back first: indexes recreated inside its
+                # transaction would be rolled back with it
+                conn.rollback()
+                for sql in indexes:
+                    conn.execute(sql)
+                conn.commit()
+        return total
+
+    def export_terms(self, batch_size=5000):
+        """Yield all terms ordered by keyword, holding at most batch_size rows in memory"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'SELECT {TERM_COLUMNS} FROM terms ORDER BY keyword')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+
+    @track_query
     def delete_term(self, keyword):
         """Delete a term"""
         with self.get_connection() as conn:
@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import grpc
+
+sys.path.append('/app')
+
+import glossary_pb2
+import glossary_pb2_grpc
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Режим Web API: local - вызовы GlossaryService в том же процессе,
+# grpc - через gRPC сервер по адресу GATEWAY_GRPC_TARGET (раздельное развертывание)
+GATEWAY_MODE = os.environ.get("GATEWAY_MODE", "local")
+GATEWAY_GRPC_TARGET = os.environ.get("GATEWAY_GRPC_TARGET", "localhost:50051")
+# Дедлайн вызовов gRPC сервера из Web API в секундах
+GATEWAY_TIMEOUT = float(os.environ.get("GATEWAY_TIMEOUT", "5"))
+
+# HTTP статус для кодов gRPC, которые возвращает GlossaryService
+HTTP_STATUS = {
+    grpc.StatusCode.INVALID_ARGUMENT: 400,
+    grpc.StatusCode.NOT_FOUND: 404,
+    grpc.StatusCode.ALREADY_EXISTS: 409,
+    grpc.StatusCode.RESOURCE_EXHAUSTED: 503,
+    grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+}
+
+# Сколько терминов отдает GET /terms, как ListTerms без limit
+LIST_LIMIT = 100
+
+
+def dumps(obj):
+    """Сериализация ответа в JSON: orjson если установлен, иначе модуль json"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+class GatewayError(Exception):
+    """Backend failure with the HTTP status it maps to"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+    @classmethod
+    def from_code(cls, code, details):
+        return cls(HTTP_STATUS.get(code, 500), details or code.name)
+
+
+class _LocalContext:
+    """Minimal servicer context for calling GlossaryService methods in process"""
+
+    def __init__(self):
+        self.code = grpc.StatusCode.OK
+        self.details = ""
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+
+class LocalBackend:
+    """Reads straight from GlossaryDatabase, writes through GlossaryService methods
+
+    Writes go through the servicer so that validation, the keyword index and
+    WatchTerms notifications stay in one place.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.db = service.db
+
+    def _call(self, method, request):
+        context = _LocalContext()
+        response = getattr(self.service, method)(request, context)
+        if context.code != grpc.StatusCode.OK:
+            raise GatewayError.from_code(context.code, context.details)
+        return response
+
+    def list_terms(self, fields, category="", created_from="", created_before=""):
+        """Get terms with the given fields and the glossary revision"""
+        try:
+            terms, _, revision = self.db.list_terms(
+                limit=LIST_LIMIT,
+                fields=fields,
+                category=category or None,
+                created_from=self.service.normalize_time_filter(created_from),
+                created_before=self.service.normalize_time_filter(created_before)
+            )
+        except ValueError as e:
+            raise GatewayError(400, str(e))
+        return [{name: term[name] for name in fields} for term in terms], revision
+
+    def revision(self):
+        """Get the glossary revision without reading terms"""
+        return self.db.get_revision()
+
+    def term_revision(self, keyword):
+        """Get the revision of a term without reading it, None if there is no such term"""
+        return self.db.get_term_revision(keyword)
+
+    def list_categories(self):
+        """Get categories with term counts and the glossary revision"""
+        return self.db.list_categories()
+
+    def suggest(self, prefix, limit):
+        """Get keywords starting with prefix"""
+        response = self._call('SuggestTerms', glossary_pb2.SuggestTermsRequest(prefix=prefix, limit=limit))
+        return list(response.keywords)
+
+    def get_term(self, keyword):
+        """Get a term row"""
+        term = self.db.get_term(keyword)
+        if term is None:
+            raise GatewayError(404, f"Term '{keyword}' not found")
+        return term
+
+    def create_term(self, keyword, description, category):
+        """Create a term"""
+        request = glossary_pb2.CreateTermRequest(keyword=keyword, description=description, category=category)
+        return self._call('CreateTerm', request)
+
+    def update_term(self, keyword, description, category):
+        """Update a term"""
+        request = glossary_pb2.UpdateTermRequest(keyword=keyword, description=description, category=category)
+        return self._call('UpdateTerm', request)
+
+    def delete_term(self, keyword):
+        """Delete a term"""
+        return self._call('DeleteTerm', glossary_pb2.DeleteTermRequest(keyword=keyword))
+
+
+class GrpcBackend:
+    """Calls a remote gRPC server, used when the Web API runs separately"""
+
+    def __init__(self, target=GATEWAY_GRPC_TARGET, timeout=GATEWAY_TIMEOUT):
+        self.timeout = timeout
+        self.channel = grpc.insecure_channel(target)
+        self.stub = glossary_pb2_grpc.GlossaryServiceStub(self.channel)
+
+    def _call(self, method, request):
+        try:
+            return getattr(self.stub, method)(request, timeout=self.timeout)
+        except grpc.RpcError as e:
+            raise GatewayError.from_code(e.code(), e.details())
+
+    def list_terms(self, fields, category="", created_from="", created_before=""):
+        """Get terms with the given fields and the glossary revision"""
+        request = glossary_pb2.ListTermsRequest(
+            category=category,
+            created_from=created_from,
+            created_before=created_before
+        )
+        request.fields.paths.extend(fields)
+        response = self._call('ListTerms', request)
+        return [{name: getattr(term, name) for name in fields} for term in response.terms], response.revision
+
+    def revision(self):
+        """Get the glossary revision: ListTerms of a single keyword returns it"""
+        request = glossary_pb2.ListTermsRequest(limit=1)
+        request.fields.paths.append("keyword")
+        return self._call('ListTerms', request).revision
+
+    def term_revision(self, keyword):
+        """There is no cheaper RPC than GetTerm, the caller reads the term"""
+        return None
+
+    def list_categories(self):
+        """Get categories with term counts and the glossary revision"""
+        response = self._call('ListCategories', glossary_pb2.ListCategoriesRequest())
+        categories = [{
+            "category": category.category,
+            "term_count": category.term_count
+        } for category in response.categories]
+        return categories, response.revision
+
+    def suggest(self, prefix, limit):
+        """Get keywords starting with prefix"""
+        response = self._call('SuggestTerms', glossary_pb2.SuggestTermsRequest(prefix=prefix, limit=limit))
+        return list(response.keywords)
+
+    def get_term(self, keyword):
+        """Get a term"""
+        response = self._call('GetTerm', glossary_pb2.GetTermRequest(keyword=keyword))
+        return {
+            "keyword": response.keyword,
+            "description": response.description,
+            "category": response.category,
+            "updated_at": response.updated_at,
+            "revision": response.revision
+        }
+
+    def create_term(self, keyword, description, category):
+        """Create a term"""
+        request = glossary_pb2.CreateTermRequest(keyword=keyword, description=description, category=category)
+        return self._call('CreateTerm', request)
+
+    def update_term(self, keyword, description, category):
+        """Update a term"""
+        request = glossary_pb2.UpdateTermRequest(keyword=keyword, description=description, category=category)
+        return self._call('UpdateTerm', request)
+
+    def delete_term(self, keyword):
+        """Delete a term"""
+        return self._call('DeleteTerm', glossary_pb2.DeleteTermRequest(keyword=keyword))
+
+
+def main():
+    """Запуск только Web API, обращающегося к отдельному gRPC серверу"""
+    parser = argparse.ArgumentParser(description="Glossary Web API in front of a remote gRPC server")
+    parser.add_argument("--grpc-target", default=GATEWAY_GRPC_TARGET)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Web API for gRPC server at {args.grpc_target}")
+
+    from main import start_flask_app
+
+    start_flask_app(GrpcBackend(args.grpc_target))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+# Время жизни ответа в кэше Web API, секунды. Изменения через Web API
+# сбрасывают кэш сразу, изменения напрямую через gRPC видны не позже TTL
+GATEWAY_CACHE_TTL = 5.0
+
+
+def parse_db_timestamp(value):
+    """Перевод CURRENT_TIMESTAMP из SQLite (UTC) в datetime для Last-Modified"""
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+class CachedResponse:
+    """Serialized response body with its validators"""
+
+    __slots__ = ("body", "etag", "last_modified", "expires_at")
+
+    def __init__(self, body, etag, last_modified, expires_at):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Short-lived cache of gateway responses, cleared on every write"""
+
+    def __init__(self, ttl=GATEWAY_CACHE_TTL, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        """Counter of invalidations, read it before fetching data for put()"""
+        return self._generation
+
+    def get(self, key):
+        """Get a fresh entry or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, key, body, etag, last_modified=None, generation=None):
+        """Store a response; it is returned but not cached if a write happened since generation"""
+        entry = CachedResponse(body, etag, last_modified, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return entry
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        """Drop all entries after a write"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
\ No newline at end of file
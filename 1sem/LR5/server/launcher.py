@@ -0,0 +1,224 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+sys.path.append('/app')
+
+from sharding import GLOSSARY_SHARDS, open_database
+
+logger = logging.getLogger(__name__)
+
+# Рабочий процесс, упавший быстрее этого срока, перезапускается с задержкой,
+# чтобы не уйти в бесконечный цикл перезапусков
+MIN_WORKER_UPTIME = 1.0
+RESTART_BACKOFF = 2.0
+# Сколько ждать, пока новый процесс при плавном перезапуске начнет принимать соединения
+WORKER_READY_TIMEOUT = 30.0
+
+
+def run_worker(worker_id, port, max_workers, db_path, grace, metrics_port=None, shards=1, queue_size=None,
+               ready=None):
+    """Точка входа рабочего процесса: отдельный gRPC сервер на общем порту"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"[worker {worker_id}] %(levelname)s:%(name)s:%(message)s"
+    )
+
+    # Модули сервера нужны только рабочему процессу; процесс запускается через spawn,
+    # поэтому состояние gRPC родителя (потоки, соединения) ему не передается
+    from admission import GRPC_QUEUE_SIZE, max_concurrent_rpcs
+    from main import start_grpc_server
+    from metrics import start_metrics_server
+
+    server = start_grpc_server(
+        port=port,
+        max_workers=max_workers,
+        db_path=db_path,
+        options=[("grpc.so_reuseport", 1)],
+        shards=shards,
+        max_rpcs=max_concurrent_rpcs(max_workers, GRPC_QUEUE_SIZE if queue_size is None else queue_size)
+    )
+
+    # server.start() уже занял порт: супервизор может останавливать старый процесс
+    if ready is not None:
+        ready.set()
+
+    # Метрики у каждого процесса свои, поэтому каждый слушает свой порт. Без них
+    # процесс продолжает обслуживать gRPC, поэтому ошибка порта только пишется в лог
+    if metrics_port:
+        try:
+            start_metrics_server(metrics_port + worker_id)
+            logger.info(f"Metrics available on port {metrics_port + worker_id}")
+        except OSError as e:
+            logger.error(f"Metrics server on port {metrics_port + worker_id} failed to start: {e}")
+
+    def handle_stop(signum, frame):
+        logger.info(f"Stopping worker (grace {grace} sec)")
+        server.stop(grace)
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    # Ctrl+C обрабатывает главный процесс, он сам остановит рабочие процессы
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    server.wait_for_termination()
+    logger.info("Worker stopped")
+
+
+class WorkerPool:
+    """Supervisor for gRPC worker processes sharing one port via SO_REUSEPORT"""
+
+    def __init__(self, workers, port="50051", max_workers=10, db_path="glossary.db", grace=5.0,
+                 metrics_port=None, shards=1, queue_size=None):
+        self.workers = workers
+        self.port = port
+        self.max_workers = max_workers
+        self.db_path = db_path
+        self.grace = grace
+        self.metrics_port = metrics_port
+        self.shards = shards
+        self.queue_size = queue_size
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = {}
+        self._started_at = {}
+        self._ready = {}
+        self._stopping = False
+        self._restart_requested = False
+
+    def start(self):
+        """Create the schema once and start all workers"""
+        open_database(self.db_path, self.shards)
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        logger.info(f"✅ Started {self.workers} gRPC workers on port {self.port}")
+
+    def _spawn(self, worker_id):
+        """Start a worker process with the given id"""
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=run_worker,
+            args=(worker_id, self.port, self.max_workers, self.db_path, self.grace, self.metrics_port,
+                  self.shards, self.queue_size, ready),
+            name=f"glossary-worker-{worker_id}"
+        )
+        process.start()
+        self._processes[worker_id] = process
+        self._started_at[worker_id] = time.monotonic()
+        self._ready[worker_id] = ready
+        logger.info(f"Worker {worker_id} started (pid {process.pid})")
+        return process
+
+    def _wait_ready(self, worker_id, timeout=WORKER_READY_TIMEOUT):
+        """Wait until a worker serves the port, False if it exited or timed out"""
+        process = self._processes[worker_id]
+        deadline = time.monotonic() + timeout
+        while not self._ready[worker_id].wait(0.1):
+            if not process.is_alive() or time.monotonic() > deadline:
+                return False
+        return True
+
+    def _terminate(self, process):
+        """Ask a worker to stop gracefully, kill it if it does not"""
+        if process.is_alive():
+            process.terminate()
+        process.join(self.grace + 1)
+        if process.is_alive():
+            logger.warning(f"Worker pid {process.pid} did not stop in time, killing")
+            process.kill()
+            process.join()
+
+    def supervise(self):
+        """Restart dead workers until stop is requested"""
+        while not self._stopping:
+            if self._restart_requested:
+                self._restart_requested = False
+                self.rolling_restart()
+
+            for worker_id, process in list(self._processes.items()):
+                if process.is_alive():
+                    continue
+
+                uptime = time.monotonic() - self._started_at[worker_id]
+                logger.warning(
+                    f"Worker {worker_id} (pid {process.pid}) exited with code {process.exitcode}, restarting"
+                )
+                if uptime < MIN_WORKER_UPTIME:
+                    time.sleep(RESTART_BACKOFF)
+                if not self._stopping:
+                    self._spawn(worker_id)
+
+            time.sleep(0.5)
+
+    def rolling_restart(self):
+        """Replace workers one by one so the port is never left unserved"""
+        logger.info("Rolling restart of workers")
+        for worker_id, old_process in list(self._processes.items()):
+            old_state = self._started_at[worker_id], self._ready[worker_id]
+            new_process = self._spawn(worker_id)
+            # Старый процесс останавливается только после того, как новый занял порт
+            if not self._wait_ready(worker_id):
+                logger.error(f"Worker {worker_id} (pid {new_process.pid}) did not become ready, "
+                             f"keeping the old one and stopping the rolling restart")
+                self._terminate(new_process)
+                self._processes[worker_id] = old_process
+                self._started_at[worker_id], self._ready[worker_id] = old_state
+                return
+            self._terminate(old_process)
+
+    def stop(self):
+        """Gracefully stop all workers"""
+        self._stopping = True
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            self._terminate(process)
+        logger.info("All workers stopped")
+
+    def request_stop(self, signum=None, frame=None):
+        self._stopping = True
+
+    def request_restart(self, signum=None, frame=None):
+        self._restart_requested = True
+
+
+def main():
+    """Запуск нескольких процессов gRPC сервера на одном порту"""
+    parser = argparse.ArgumentParser(description="Multi-process glossary gRPC server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--port", default="50051")
+    parser.add_argument("--threads", type=int, default=10,
+                        help="gRPC thread pool size of each worker")
+    parser.add_argument("--db-path", default="glossary.db")
+    parser.add_argument("--grace", type=float, default=5.0,
+                        help="seconds given to in-flight RPCs on shutdown")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve /metrics of worker N on this port + N")
+    parser.add_argument("--shards", type=int, default=GLOSSARY_SHARDS,
+                        help="number of SQLite files terms are spread over")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="RPCs waiting for a thread before RESOURCE_EXHAUSTED (default: GRPC_QUEUE_SIZE or 10)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    pool = WorkerPool(args.workers, args.port, args.threads, args.db_path, args.grace, args.metrics_port,
+                      args.shards, args.queue_size)
+    signal.signal(signal.SIGTERM, pool.request_stop)
+    signal.signal(signal.SIGINT, pool.request_stop)
+    # SIGHUP - плавный перезапуск всех рабочих процессов
+    signal.signal(signal.SIGHUP, pool.request_restart)
+
+    pool.start()
+    try:
+        pool.supervise()
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
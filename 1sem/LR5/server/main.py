@@ -2,41 +2,124 @@ import grpc
 from concurrent import futures
 import logging
 import sys
-from flask import Flask, jsonify, request
+import threading
+from datetime import datetime, timezone
+from flask import Flask, Response, jsonify, request
 
 sys.path.append('/app')
 
-from database import GlossaryDatabase
+from admission import DeadlineInterceptor, max_concurrent_rpcs
+from changefeed import WATCH_BATCH_SIZE, ChangeNotifier
+from database import TERM_FIELDS, GlossaryDatabase
+from gateway import GATEWAY_GRPC_TARGET, GATEWAY_MODE, HTTP_STATUS, GatewayError, GrpcBackend, LocalBackend, dumps
+from http_cache import ResponseCache, parse_db_timestamp
+from metrics import CONTENT_TYPE, REGISTRY, MetricsInterceptor, instrument_flask_app
+from sharding import GLOSSARY_SHARDS, open_database
+from suggest import SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT, KeywordIndex
 import glossary_pb2
 import glossary_pb2_grpc
 
 logger = logging.getLogger(__name__)
 
+# Клиенты (aio_client.py) шлют keepalive ping раз в 30 секунд, в том числе
+# без активных вызовов; без этих настроек сервер разрывает такие соединения
+SERVER_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_recv_ping_interval_without_data_ms", 10000),
+]
+
+# Поля термина в ответах Web API, если ?fields= не указан
+REST_TERM_FIELDS = ["keyword", "description", "category"]
+
 
 class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
-    def __init__(self):
-        self.db = GlossaryDatabase()
+    # Тип события WatchTerms по операции из журнала term_changes
+    EVENT_TYPES = {
+        'create': glossary_pb2.TermEvent.CREATED,
+        'update': glossary_pb2.TermEvent.UPDATED,
+        'delete': glossary_pb2.TermEvent.DELETED,
+    }
+
+    def __init__(self, db=None, max_watchers=4):
+        self.db = db or GlossaryDatabase()
+        self.changes = ChangeNotifier()
+        # Each WatchTerms stream holds a server thread for its whole life
+        self._watch_slots = threading.BoundedSemaphore(max_watchers)
+        # SuggestTerms is answered from memory, the index follows the change log
+        self.keywords = KeywordIndex()
+        self.keywords.start(self.db, self.changes)
         logger.info("GlossaryService initialized")
 
+    @staticmethod
+    def _term_response(term):
+        """Build a TermResponse from a database row, columns missing from the row stay unset"""
+        return glossary_pb2.TermResponse(**{
+            field: value for field, value in term.items() if value is not None
+        })
+
+    def _term_event(self, change):
+        """Build a TermEvent from a change log row"""
+        return glossary_pb2.TermEvent(
+            type=self.EVENT_TYPES[change['operation']],
+            revision=change['revision'],
+            term=glossary_pb2.TermResponse(
+                keyword=change['keyword'],
+                description=change['description'] or '',
+                category=change['category'] or '',
+                created_at=change['created_at'] or '',
+                updated_at=change['updated_at'] or '',
+                revision=change['revision']
+            )
+        )
+
+    @staticmethod
+    def normalize_time_filter(value):
+        """Convert an ISO date/time to the UTC format created_at is stored in"""
+        if not value:
+            return None
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
     def ListTerms(self, request, context):
         """Get list of all terms"""
         try:
             skip = request.skip if request.skip else 0
             limit = request.limit if request.limit else 100
 
-            terms, total_count = self.db.list_terms(skip=skip, limit=limit)
+            fields = None
+            if request.HasField('fields'):
+                fields = set(request.fields.paths)
+                unknown = fields - TERM_FIELDS.keys()
+                if unknown:
+                    context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                    context.set_details(f"Unknown fields: {', '.join(sorted(unknown))}")
+                    return glossary_pb2.ListTermsResponse()
+
+            try:
+                created_from = self.normalize_time_filter(request.created_from)
+                created_before = self.normalize_time_filter(request.created_before)
+            except ValueError:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details("created_from and created_before must be ISO dates")
+                return glossary_pb2.ListTermsResponse()
+
+            terms, total_count, revision = self.db.list_terms(
+                skip=skip,
+                limit=limit,
+                fields=fields,
+                category=request.category or None,
+                created_from=created_from,
+                created_before=created_before
+            )
 
-            term_responses = []
-            for term in terms:
-                term_responses.append(glossary_pb2.TermResponse(
-                    keyword=term['keyword'],
-                    description=term['description'],
-                    category=term['category']
-                ))
+            term_responses = [self._term_response(term) for term in terms]
 
             return glossary_pb2.ListTermsResponse(
                 terms=term_responses,
-                total_count=total_count
+                total_count=total_count,
+                revision=revision
             )
 
         except Exception as e:
@@ -60,11 +143,7 @@ class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
                 context.set_details(f"Term '{request.keyword}' not found")
                 return glossary_pb2.TermResponse()
 
-            return glossary_pb2.TermResponse(
-                keyword=term['keyword'],
-                description=term['description'],
-                category=term['category']
-            )
+            return self._term_response(term)
 
         except Exception as e:
             logger.error(f"Error in GetTerm: {str(e)}")
@@ -80,23 +159,20 @@ class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
                 context.set_details("Keyword and description are required")
                 return glossary_pb2.TermResponse()
 
-            success = self.db.create_term(
+            term = self.db.create_term_returning(
                 keyword=request.keyword,
                 description=request.description,
                 category=request.category or "general"
             )
 
-            if not success:
+            if not term:
                 context.set_code(grpc.StatusCode.ALREADY_EXISTS)
                 context.set_details(f"Term '{request.keyword}' already exists")
                 return glossary_pb2.TermResponse()
 
-            term = self.db.get_term(request.keyword)
-            return glossary_pb2.TermResponse(
-                keyword=term['keyword'],
-                description=term['description'],
-                category=term['category']
-            )
+            self.keywords.add(term['keyword'])
+            self.changes.notify()
+            return self._term_response(term)
 
         except Exception as e:
             logger.error(f"Error in CreateTerm: {str(e)}")
@@ -112,29 +188,19 @@ class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
                 context.set_details("Keyword is required")
                 return glossary_pb2.TermResponse()
 
-            existing_term = self.db.get_term(request.keyword)
-            if not existing_term:
-                context.set_code(grpc.StatusCode.NOT_FOUND)
-                context.set_details(f"Term '{request.keyword}' not found")
-                return glossary_pb2.TermResponse()
-
-            success = self.db.update_term(
+            term = self.db.update_term_returning(
                 keyword=request.keyword,
                 description=request.description if request.description else None,
                 category=request.category if request.category else None
             )
 
-            if not success:
-                context.set_code(grpc.StatusCode.INTERNAL)
-                context.set_details("Failed to update term")
+            if not term:
+                context.set_code(grpc.StatusCode.NOT_FOUND)
+                context.set_details(f"Term '{request.keyword}' not found")
                 return glossary_pb2.TermResponse()
 
-            term = self.db.get_term(request.keyword)
-            return glossary_pb2.TermResponse(
-                keyword=term['keyword'],
-                description=term['description'],
-                category=term['category']
-            )
+            self.changes.notify()
+            return self._term_response(term)
 
         except Exception as e:
             logger.error(f"Error in UpdateTerm: {str(e)}")
@@ -142,6 +208,30 @@ class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
             context.set_details("Internal server error")
             return glossary_pb2.TermResponse()
 
+    def UpsertTerm(self, request, context):
+        """Create a term or update it if it already exists"""
+        try:
+            if not request.keyword or not request.description:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details("Keyword and description are required")
+                return glossary_pb2.TermResponse()
+
+            term = self.db.upsert_term(
+                keyword=request.keyword,
+                description=request.description,
+                category=request.category if request.category else None
+            )
+
+            self.keywords.add(term['keyword'])
+            self.changes.notify()
+            return self._term_response(term)
+
+        except Exception as e:
+            logger.error(f"Error in UpsertTerm: {str(e)}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details("Internal server error")
+            return glossary_pb2.TermResponse()
+
     def DeleteTerm(self, request, context):
         """Delete a term"""
         try:
@@ -151,6 +241,9 @@ class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
                 return glossary_pb2.DeleteResponse(success=False, message="Keyword required")
 
             success = self.db.delete_term(request.keyword)
+            if success:
+                self.keywords.remove(request.keyword)
+                self.changes.notify()
 
             if not success:
                 return glossary_pb2.DeleteResponse(
@@ -169,13 +262,89 @@ class GlossaryService(glossary_pb2_grpc.GlossaryServiceServicer):
             context.set_details("Internal server error")
             return glossary_pb2.DeleteResponse(success=False, message=str(e))
 
+    def WatchTerms(self, request, context):
+        """Stream term changes made after the requested revision"""
+        if not self._watch_slots.acquire(blocking=False):
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many WatchTerms streams")
+
+        try:
+            if request.HasField('from_revision'):
+                revision = request.from_revision
+            else:
+                revision = self.db.get_revision()
+
+            # Lets the client know the stream is established before any event
+            context.send_initial_metadata(())
+
+            while context.is_active():
+                sequence = self.changes.sequence
+                changes = self.db.changes_since(revision, limit=WATCH_BATCH_SIZE)
+
+                if changes is None:
+                    context.abort(
+                        grpc.StatusCode.OUT_OF_RANGE,
+                        f"Revision {revision} is no longer in the change log, reload the terms"
+                    )
+
+                for change in changes:
+                    yield self._term_event(change)
+                    revision = change['revision']
+
+                if len(changes) < WATCH_BATCH_SIZE:
+                    self.changes.wait(sequence)
+        finally:
+            self._watch_slots.release()
+
+    def ListCategories(self, request, context):
+        """Get categories with their term counts"""
+        try:
+            categories, revision = self.db.list_categories()
+
+            return glossary_pb2.ListCategoriesResponse(
+                categories=[glossary_pb2.CategoryCount(**category) for category in categories],
+                total_count=sum(category['term_count'] for category in categories),
+                revision=revision
+            )
+
+        except Exception as e:
+            logger.error(f"Error in ListCategories: {str(e)}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details("Internal server error")
+            return glossary_pb2.ListCategoriesResponse()
 
-def start_grpc_server():
-    """Запуск gRPC сервера в отдельном потоке"""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    glossary_pb2_grpc.add_GlossaryServiceServicer_to_server(GlossaryService(), server)
+    def SuggestTerms(self, request, context):
+        """Get keywords starting with a prefix"""
+        limit = min(request.limit or SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT)
+        if limit < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("Limit must be positive")
+            return glossary_pb2.SuggestTermsResponse()
+
+        return glossary_pb2.SuggestTermsResponse(keywords=self.keywords.suggest(request.prefix, limit))
+
+
+def create_service(db_path="glossary.db", max_workers=10, shards=GLOSSARY_SHARDS):
+    """Создание GlossaryService для сервера с max_workers потоками"""
+    return GlossaryService(open_database(db_path, shards), max_watchers=max(1, max_workers // 2))
+
+
+def start_grpc_server(port="50051", max_workers=10, db_path="glossary.db", options=None, service=None,
+                      shards=GLOSSARY_SHARDS, max_rpcs=None):
+    """Запуск gRPC сервера в отдельном потоке
+
+    max_rpcs - предел одновременных RPC (выполняемых и ждущих поток),
+    сверх него сервер сразу отвечает RESOURCE_EXHAUSTED
+    """
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=max_workers),
+        interceptors=[MetricsInterceptor(), DeadlineInterceptor()],
+        options=SERVER_OPTIONS + list(options or []),
+        maximum_concurrent_rpcs=max_rpcs or max_concurrent_rpcs(max_workers)
+    )
+    if service is None:
+        service = create_service(db_path, max_workers, shards)
+    glossary_pb2_grpc.add_GlossaryServiceServicer_to_server(service, server)
 
-    port = "50051"
     server.add_insecure_port(f"[::]:{port}")
     server.start()
 
@@ -183,13 +352,41 @@ def start_grpc_server():
     return server
 
 
-def start_flask_app():
-    """Запуск Flask Web API"""
-    app = Flask(__name__)
+def start_flask_app(backend=None, port=8080):
+    """Запуск Flask Web API
 
-    # Создаем gRPC клиент для Web API
-    channel = grpc.insecure_channel('localhost:50051')
-    stub = glossary_pb2_grpc.GlossaryServiceStub(channel)
+    backend - LocalBackend (GlossaryService в этом процессе) или GrpcBackend;
+    по умолчанию gRPC сервер на localhost:50051
+    """
+    app = Flask(__name__)
+    instrument_flask_app(app)
+
+    if backend is None:
+        backend = GrpcBackend('localhost:50051')
+
+    # Короткоживущий кэш сериализованных ответов GET, сбрасывается при записи
+    cache = ResponseCache()
+
+    def conditional_json(entry):
+        """Ответ из кэша с ETag/Last-Modified, 304 если клиент уже его имеет"""
+        response = app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        if entry.last_modified:
+            response.last_modified = entry.last_modified
+        return response.make_conditional(request)
+
+    def not_modified(etag):
+        """304 без чтения данных, если If-None-Match клиента совпадает с etag; иначе None"""
+        if etag is None or not request.if_none_match.contains_weak(etag):
+            return None
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    def error_response(error):
+        """Ответ на GatewayError со статусом HTTP кода gRPC (HTTP_STATUS), иначе 500"""
+        status = error.status if error.status in HTTP_STATUS.values() else 500
+        return jsonify({"error": error.message}), status
 
     @app.route('/')
     def home():
@@ -216,11 +413,14 @@ def start_flask_app():
 
             <h2>REST API Endpoints</h2>
             <div class="term">
-                <strong>GET /terms</strong> - Get all terms<br>
+                <strong>GET /terms</strong> - Get all terms (?category=, ?created_from=, ?created_before=, ?fields=)<br>
+                <strong>GET /categories</strong> - Get categories with term counts<br>
+                <strong>GET /suggest?prefix=</strong> - Keyword autocomplete<br>
                 <strong>GET /terms/&lt;keyword&gt;</strong> - Get specific term<br>
                 <strong>POST /terms</strong> - Create new term (use JSON)<br>
                 <strong>PUT /terms/&lt;keyword&gt;</strong> - Update term (use JSON)<br>
-                <strong>DELETE /terms/&lt;keyword&gt;</strong> - Delete term
+                <strong>DELETE /terms/&lt;keyword&gt;</strong> - Delete term<br>
+                <strong>GET /metrics</strong> - Prometheus metrics
             </div>
 
             <h2>gRPC Service</h2>
@@ -229,30 +429,110 @@ def start_flask_app():
         </html>
         '''
 
+    @app.route('/metrics')
+    def metrics():
+        """Метрики gRPC, HTTP и базы данных в формате Prometheus"""
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
     @app.route('/terms', methods=['GET'])
     def get_all_terms():
         """Получение списка всех терминов"""
         try:
-            response = stub.ListTerms(glossary_pb2.ListTermsRequest())
-            terms = [{
-                "keyword": term.keyword,
-                "description": term.description,
-                "category": term.category
-            } for term in response.terms]
-            return jsonify(terms)
+            entry = cache.get(request.full_path)
+            if entry is None and request.if_none_match:
+                # Ревизия глоссария сверяется до чтения терминов
+                response = not_modified(f"terms-{backend.revision()}")
+                if response is not None:
+                    return response
+            if entry is None:
+                generation = cache.generation
+                # ?fields=keyword,category - вернуть только перечисленные поля
+                fields = REST_TERM_FIELDS
+                if request.args.get('fields'):
+                    fields = ["keyword"] + [
+                        name for name in request.args['fields'].split(',') if name and name != "keyword"
+                    ]
+                terms, revision = backend.list_terms(
+                    fields,
+                    category=request.args.get('category', ''),
+                    created_from=request.args.get('created_from', ''),
+                    created_before=request.args.get('created_before', '')
+                )
+                entry = cache.put(
+                    request.full_path,
+                    dumps(terms),
+                    etag=f"terms-{revision}",
+                    generation=generation
+                )
+            return conditional_json(entry)
+        except GatewayError as e:
+            return error_response(e)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/categories', methods=['GET'])
+    def get_categories():
+        """Получение списка категорий с количеством терминов"""
+        try:
+            entry = cache.get(request.full_path)
+            if entry is None and request.if_none_match:
+                response = not_modified(f"categories-{backend.revision()}")
+                if response is not None:
+                    return response
+            if entry is None:
+                generation = cache.generation
+                categories, revision = backend.list_categories()
+                entry = cache.put(
+                    request.full_path,
+                    dumps(categories),
+                    etag=f"categories-{revision}",
+                    generation=generation
+                )
+            return conditional_json(entry)
+        except GatewayError as e:
+            return error_response(e)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/suggest', methods=['GET'])
+    def suggest():
+        """Подсказки ключевых слов по префиксу"""
+        try:
+            keywords = backend.suggest(request.args.get('prefix', ''), request.args.get('limit', 0, type=int))
+            return app.response_class(dumps(keywords), mimetype='application/json')
+        except GatewayError as e:
+            return error_response(e)
+
     @app.route('/terms/<keyword>', methods=['GET'])
     def get_term(keyword):
         """Получение информации о конкретном термине"""
         try:
-            response = stub.GetTerm(glossary_pb2.GetTermRequest(keyword=keyword))
-            return jsonify({
-                "keyword": response.keyword,
-                "description": response.description,
-                "category": response.category
-            })
+            entry = cache.get(request.full_path)
+            if entry is None and request.if_none_match:
+                # Ревизия строки термина читается без описания
+                revision = backend.term_revision(keyword)
+                response = not_modified(f"term-{revision}" if revision is not None else None)
+                if response is not None:
+                    return response
+            if entry is None:
+                generation = cache.generation
+                term = backend.get_term(keyword)
+                entry = cache.put(
+                    request.full_path,
+                    dumps({
+                        "keyword": term["keyword"],
+                        "description": term["description"],
+                        "category": term["category"]
+                    }),
+                    etag=f"term-{term['revision']}",
+                    last_modified=parse_db_timestamp(term["updated_at"]),
+                    generation=generation
+                )
+            return conditional_json(entry)
+        except GatewayError as e:
+            if e.status == 404:
+                return jsonify({"error": "Term not found"}), 404
+            return error_response(e)
         except Exception as e:
             return jsonify({"error": "Term not found"}), 404
 
@@ -264,16 +544,19 @@ def start_flask_app():
             return jsonify({"error": "Keyword and description are required"}), 400
 
         try:
-            response = stub.CreateTerm(glossary_pb2.CreateTermRequest(
+            response = backend.create_term(
                 keyword=data['keyword'],
                 description=data['description'],
                 category=data.get('category', 'general')
-            ))
+            )
+            cache.invalidate()
             return jsonify({
                 "keyword": response.keyword,
                 "description": response.description,
                 "category": response.category
             }), 201
+        except GatewayError as e:
+            return error_response(e)
         except Exception as e:
             return jsonify({"error": str(e)}), 400
 
@@ -285,16 +568,19 @@ def start_flask_app():
             return jsonify({"error": "No data provided"}), 400
 
         try:
-            response = stub.UpdateTerm(glossary_pb2.UpdateTermRequest(
+            response = backend.update_term(
                 keyword=keyword,
                 description=data.get('description', ''),
                 category=data.get('category', '')
-            ))
+            )
+            cache.invalidate()
             return jsonify({
                 "keyword": response.keyword,
                 "description": response.description,
                 "category": response.category
             })
+        except GatewayError as e:
+            return error_response(e)
         except Exception as e:
             return jsonify({"error": "Term not found"}), 404
 
@@ -302,16 +588,19 @@ def start_flask_app():
     def delete_term(keyword):
         """Удаление термина из глоссария"""
         try:
-            response = stub.DeleteTerm(glossary_pb2.DeleteTermRequest(keyword=keyword))
+            response = backend.delete_term(keyword)
+            cache.invalidate()
             return jsonify({
                 "success": response.success,
                 "message": response.message
             })
+        except GatewayError as e:
+            return error_response(e)
         except Exception as e:
             return jsonify({"error": "Term not found"}), 404
 
-    logger.info("✅ Flask Web API started on port 8080")
-    app.run(host='0.0.0.0', port=8080, debug=False)
+    logger.info(f"✅ Flask Web API started on port {port}")
+    app.run(host='0.0.0.0', port=port, debug=False)
 
 
 def serve():
@@ -320,10 +609,18 @@ def serve():
     logger.info("Starting Python Glossary Service...")
 
     # Запускаем gRPC сервер в отдельном потоке
-    grpc_server = start_grpc_server()
+    service = create_service()
+    grpc_server = start_grpc_server(service=service)
+
+    # Web API вызывает тот же GlossaryService напрямую, без gRPC через localhost
+    if GATEWAY_MODE == "grpc":
+        backend = GrpcBackend(GATEWAY_GRPC_TARGET)
+    else:
+        backend = LocalBackend(service)
+    logger.info(f"Web API backend: {type(backend).__name__}")
 
     # Запускаем Flask Web API в основном потоке
-    start_flask_app()
+    start_flask_app(backend)
 
     grpc_server.wait_for_termination()
 
@@ -0,0 +1,297 @@
+import functools
+import socket
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+# Границы корзин гистограмм задержек в секундах
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Base class for a labelled metric rendered in Prometheus text format"""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(value) for value in labelvalues)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def inc(self, *labelvalues, amount=1):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value, *labelvalues):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        key = self._key(labelvalues)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                # [счетчики по корзинам + корзина +Inf, сумма, количество]
+                sample = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = sample
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def _render_sample(self, labelvalues, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labelnames, labelvalues, ("le", le))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics exposed on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+GRPC_HANDLED = REGISTRY.register(Counter(
+    "grpc_server_handled_total", "Completed RPCs by method and status code", ("grpc_method", "grpc_code")))
+GRPC_LATENCY = REGISTRY.register(Histogram(
+    "grpc_server_handling_seconds", "RPC handling latency", ("grpc_method",)))
+GRPC_IN_FLIGHT = REGISTRY.register(Gauge(
+    "grpc_server_in_flight", "RPCs currently being handled", ("grpc_method",)))
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "Completed HTTP requests by route and status", ("method", "endpoint", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "endpoint")))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled"))
+
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    "glossary_db_query_seconds", "GlossaryDatabase operation latency", ("operation",)))
+DB_QUERY_ERRORS = REGISTRY.register(Counter(
+    "glossary_db_query_errors_total", "Failed GlossaryDatabase operations", ("operation",)))
+
+
+def track_query(func):
+    """Декоратор: замер времени операции GlossaryDatabase"""
+    operation = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            DB_QUERY_ERRORS.inc(operation)
+            raise
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - start, operation)
+
+    return wrapper
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records latency, status codes and in-flight count of every RPC"""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                self._wrap_unary(handler.unary_unary, method),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer
+            )
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                self._wrap_stream(handler.unary_stream, method),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer
+            )
+        return handler
+
+    @staticmethod
+    def _finish(method, context, start, failed):
+        code = context.code()
+        if code is None:
+            code = grpc.StatusCode.UNKNOWN if failed else grpc.StatusCode.OK
+        GRPC_HANDLED.inc(method, code.name)
+        GRPC_LATENCY.observe(time.perf_counter() - start, method)
+        GRPC_IN_FLIGHT.dec(method)
+
+    def _wrap_unary(self, behavior, method):
+        def wrapper(request, context):
+            GRPC_IN_FLIGHT.inc(method)
+            start = time.perf_counter()
+            failed = True
+            try:
+                response = behavior(request, context)
+                failed = False
+                return response
+            finally:
+                self._finish(method, context, start, failed)
+
+        return wrapper
+
+    def _wrap_stream(self, behavior, method):
+        def wrapper(request, context):
+            GRPC_IN_FLIGHT.inc(method)
+            start = time.perf_counter()
+            failed = True
+            try:
+                yield from behavior(request, context)
+                failed = False
+            finally:
+                self._finish(method, context, start, failed)
+
+        return wrapper
+
+
+def instrument_flask_app(app):
+    """Подключение сбора метрик HTTP запросов к Flask приложению"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request(exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        status = g.pop('metrics_status', 500)
+        HTTP_REQUESTS.inc(request.method, endpoint, status)
+        HTTP_LATENCY.observe(time.perf_counter() - start, request.method, endpoint)
+        HTTP_IN_FLIGHT.dec()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ReusePortHTTPServer(ThreadingHTTPServer):
+    """HTTP сервер с SO_REUSEPORT: при плавном перезапуске новый процесс занимает
+    порт метрик, пока его еще держит старый"""
+
+    def server_bind(self):
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def start_metrics_server(port):
+    """Отдельный HTTP сервер с /metrics для процессов без Flask (launcher)"""
+    server = _ReusePortHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
\ No newline at end of file
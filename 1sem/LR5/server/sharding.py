@@ -0,0 +1,292 @@
+import argparse
+import heapq
+import logging
+import os
+import queue
+import sys
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
+
+sys.path.append('/app')
+
+from database import INITIAL_TERMS, GlossaryDatabase
+
+logger = logging.getLogger(__name__)
+
+# Число шардов по умолчанию; 1 - вся база в одном файле glossary.db
+GLOSSARY_SHARDS = int(os.environ.get("GLOSSARY_SHARDS", "1"))
+
+# Сколько сводных ревизий помнит процесс, чтобы продолжать с них WatchTerms
+REVISION_VECTORS_SIZE = 100000
+
+
+def shard_paths(db_path, shards):
+    """Файлы шардов: glossary.db -> glossary.0-of-4.db, glossary.1-of-4.db, ..."""
+    stem, ext = os.path.splitext(db_path)
+    return [f"{stem}.{index}-of-{shards}{ext or '.db'}" for index in range(shards)]
+
+
+def shard_index(keyword, shards):
+    """Номер шарда термина; crc32 в отличие от hash() не зависит от PYTHONHASHSEED"""
+    return zlib.crc32(keyword.encode("utf-8")) % shards
+
+
+def open_database(db_path="glossary.db", shards=GLOSSARY_SHARDS):
+    """GlossaryDatabase в одном файле или ShardedGlossaryDatabase на shards файлах"""
+    if shards > 1:
+        return ShardedGlossaryDatabase(db_path, shards)
+    return GlossaryDatabase(db_path)
+
+
+class RevisionVectors:
+    """Maps glossary revisions reported by this process to per-shard revisions
+
+    The revision of a sharded glossary is the sum of shard revisions: it grows
+    on every write, but WatchTerms can only resume from it if the shard
+    revisions it was made of are known.
+    """
+
+    def __init__(self, size=REVISION_VECTORS_SIZE):
+        self.size = size
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, vector):
+        """Store a vector of shard revisions, return the glossary revision for it"""
+        revision = sum(vector)
+        vector = tuple(vector)
+        with self._lock:
+            known = self._vectors.pop(revision, None)
+            if known is not None and known != vector:
+                # Reads of different shards interleave with writes, so two vectors
+                # may give the same sum; resuming from the smaller one repeats
+                # some events but never skips any
+                vector = tuple(map(min, known, vector))
+            self._vectors[revision] = vector
+            if len(self._vectors) > self.size:
+                self._vectors.popitem(last=False)
+        return revision
+
+    def get(self, revision):
+        """Get the vector for a revision or None if it is unknown to this process"""
+        with self._lock:
+            return self._vectors.get(revision)
+
+
+class ShardedGlossaryDatabase:
+    """GlossaryDatabase interface over several SQLite files, terms are routed by keyword hash
+
+    Every shard has its own write lock, so writes to different shards do not
+    wait for each other. Point operations touch one shard, lists merge the
+    ordered results of all shards.
+    """
+
+    def __init__(self, db_path="glossary.db", shards=4):
+        self.db_path = db_path
+        self.shards = [GlossaryDatabase(path, seed=False) for path in shard_paths(db_path, shards)]
+        self.revisions = RevisionVectors()
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="shard")
+
+        for keyword, description, category in INITIAL_TERMS:
+            self.shard(keyword).create_term_returning(keyword, description, category)
+        logger.info(f"Sharded database initialized: {shards} shards")
+
+    def shard(self, keyword):
+        """Shard a term belongs to"""
+        return self.shards[shard_index(keyword, len(self.shards))]
+
+    def _map(self, func):
+        """Run func(shard) on all shards in parallel, results in shard order"""
+        return list(self._executor.map(func, self.shards))
+
+    def list_terms(self, skip=0, limit=100, fields=None, category=None, created_from=None, created_before=None):
+        """Get terms with pagination, the total count and the glossary revision"""
+        results = self._map(lambda shard: shard.list_terms(
+            skip=0,
+            limit=skip + limit,
+            fields=fields,
+            category=category,
+            created_from=created_from,
+            created_before=created_before
+        ))
+        merged = heapq.merge(*(terms for terms, _, _ in results), key=itemgetter('keyword'))
+        terms = list(islice(merged, skip, skip + limit))
+        total_count = sum(total for _, total, _ in results)
+        return terms, total_count, self.revisions.remember([revision for _, _, revision in results])
+
+    def list_categories(self):
+        """Get categories ordered by name with their term counts and the glossary revision"""
+        results = self._map(lambda shard: shard.list_categories())
+        counts = Counter()
+        for categories, _ in results:
+            for category in categories:
+                counts[category['category']] += category['term_count']
+        categories = [{'category': name, 'term_count': counts[name]} for name in sorted(counts)]
+        return categories, self.revisions.remember([revision for _, revision in results])
+
+    def list_keywords(self):
+        """Get all keywords and the revision they are at least as new as"""
+        results = self._map(lambda shard: shard.list_keywords())
+        keywords = [keyword for shard_keywords, _ in results for keyword in shard_keywords]
+        return keywords, self.revisions.remember([revision for _, revision in results])
+
+    def get_revision(self):
+        """Get the current glossary revision, the sum of shard revisions"""
+        return self.revisions.remember(self._map(lambda shard: shard.get_revision()))
+
+    def changes_since(self, revision, limit=500):
+        """Get changes made after revision in order, None if the revision cannot be resumed from"""
+        vector = self.revisions.get(revision)
+        if vector is None:
+            return None
+
+        logs = [shard.changes_since(shard_revision, limit) for shard, shard_revision in zip(self.shards, vector)]
+        if any(log is None for log in logs):
+            return None
+
+        # Shard logs are interleaved by time; heapq.merge keeps the order within
+        # each shard, and every event moves one shard revision forward
+        events = heapq.merge(
+            *([(change['updated_at'] or '', index, change) for change in log] for index, log in enumerate(logs)),
+            key=itemgetter(0, 1)
+        )
+        vector = list(vector)
+        changes = []
+        for _, index, change in islice(events, limit):
+            vector[index] = change['revision']
+            changes.append(dict(change, revision=self.revisions.remember(vector)))
+        return changes
+
+    def get_term(self, keyword):
+        """Get term by keyword"""
+        return self.shard(keyword).get_term(keyword)
+
+    def get_term_revision(self, keyword):
+        """Get the revision of a term row, None if there is no such term"""
+        return self.shard(keyword).get_term_revision(keyword)
+
+    def create_term(self, keyword, description, category="general"):
+        """Create a new term"""
+        return self.shard(keyword).create_term(keyword, description, category)
+
+    def update_term(self, keyword, description=None, category=None):
+        """Update an existing term"""
+        return self.shard(keyword).update_term(keyword, description, category)
+
+    def create_term_returning(self, keyword, description, category="general"):
+        """Create a term and return the stored row, None if the keyword exists"""
+        return self.shard(keyword).create_term_returning(keyword, description, category)
+
+    def update_term_returning(self, keyword, description=None, category=None):
+        """Update a term and return the stored row, None if it does not exist"""
+        return self.shard(keyword).update_term_returning(keyword, description, category)
+
+    def upsert_term(self, keyword, description, category=None):
+        """Create or update a term and return the stored row"""
+        return self.shard(keyword).upsert_term(keyword, description, category)
+
+    def delete_term(self, keyword):
+        """Delete a term"""
+        return self.shard(keyword).delete_term(keyword)
+
+    def import_terms(self, rows, batch_size=5000, replace=False, progress=None, with_timestamps=False):
+        """Route rows to the shards, every shard imports its part in its own thread"""
+        done = object()
+        queues = [queue.Queue(maxsize=batch_size) for _ in self.shards]
+
+        def put(index, item, future):
+            """Put an item into the shard queue, False if the shard import has already stopped"""
+            while not future.done():
+                try:
+                    queues[index].put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        with ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard-import") as executor:
+            futures = [
+                executor.submit(shard.import_terms, iter(shard_queue.get, done), batch_size, replace,
+                                None, with_timestamps)
+                for shard, shard_queue in zip(self.shards, queues)
+            ]
+            count = 0
+            try:
+                for row in rows:
+                    index = shard_index(row[0], len(self.shards))
+                    if not put(index, row, futures[index]):
+                        # The shard import failed, stop reading rows
+                        break
+                    count += 1
+                    if progress and count % batch_size == 0:
+                        progress(count)
+            finally:
+                # Every live shard must get done, otherwise the executor waits for it forever
+                for index, future in enumerate(futures):
+                    put(index, done, future)
+            total = sum(future.result() for future in futures)
+
+        if progress:
+            progress(total)
+        return total
+
+    def export_terms(self, batch_size=5000):
+        """Yield all terms ordered by keyword, merged from all shards"""
+        return heapq.merge(*(shard.export_terms(batch_size) for shard in self.shards), key=itemgetter('keyword'))
+
+
+def rebalance(db_path, source_shards, target_shards, batch_size=5000, remove_source=False):
+    """Перенос всех терминов при изменении числа шардов с сохранением времени создания и изменения"""
+    from bulk import ProgressReporter
+
+    target_paths = shard_paths(db_path, target_shards) if target_shards > 1 else [db_path]
+    existing = [path for path in target_paths if os.path.exists(path)]
+    if existing:
+        raise FileExistsError(f"Target files already exist: {', '.join(existing)}")
+
+    source = open_database(db_path, source_shards)
+    target = open_database(db_path, target_shards)
+
+    rows = (
+        (term['keyword'], term['description'], term['category'], term['created_at'], term['updated_at'])
+        for term in source.export_terms(batch_size)
+    )
+    progress = ProgressReporter("Moved")
+    total = target.import_terms(rows, batch_size=batch_size, replace=True, progress=progress, with_timestamps=True)
+    progress.finish()
+
+    if remove_source:
+        source_paths = shard_paths(db_path, source_shards) if source_shards > 1 else [db_path]
+        for path in source_paths:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        logger.info(f"Removed {len(source_paths)} source files")
+    return total
+
+
+def main():
+    """Перераспределение терминов между шардами"""
+    parser = argparse.ArgumentParser(description="Move glossary terms to a different number of shards")
+    parser.add_argument("command", choices=["rebalance"])
+    parser.add_argument("--db-path", default="glossary.db")
+    parser.add_argument("--from", dest="source", type=int, required=True,
+                        help="current number of shards, 1 for a single database file")
+    parser.add_argument("--to", dest="target", type=int, required=True)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--remove-source", action="store_true",
+                        help="delete the old files after a successful move")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    total = rebalance(args.db_path, args.source, args.target, args.batch_size, args.remove_source)
+    logger.info(f"{total} terms moved to {args.target} shards, start the server with GLOSSARY_SHARDS={args.target}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,110 @@
+import logging
+import threading
+from bisect import bisect_left
+
+from changefeed import WATCH_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Сколько подсказок отдается по умолчанию и максимум за один запрос
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 100
+
+
+class KeywordIndex:
+    """Sorted in-memory array of keywords for case-insensitive prefix lookups"""
+
+    def __init__(self):
+        # Пары (keyword.casefold(), keyword), отсортированные по возрастанию
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, keywords):
+        """Replace the whole index"""
+        entries = sorted((keyword.casefold(), keyword) for keyword in keywords)
+        with self._lock:
+            self._entries = entries
+
+    def add(self, keyword):
+        """Insert a keyword, does nothing if it is already there"""
+        entry = (keyword.casefold(), keyword)
+        with self._lock:
+            index = bisect_left(self._entries, entry)
+            if index == len(self._entries) or self._entries[index] != entry:
+                self._entries.insert(index, entry)
+
+    def remove(self, keyword):
+        """Delete a keyword, does nothing if it is missing"""
+        entry = (keyword.casefold(), keyword)
+        with self._lock:
+            index = bisect_left(self._entries, entry)
+            if index < len(self._entries) and self._entries[index] == entry:
+                del self._entries[index]
+
+    def suggest(self, prefix, limit=SUGGEST_DEFAULT_LIMIT):
+        """Get up to limit keywords starting with prefix in alphabetical order"""
+        folded = prefix.casefold()
+        with self._lock:
+            index = bisect_left(self._entries, (folded,))
+            candidates = self._entries[index:index + limit]
+
+        keywords = []
+        for key, keyword in candidates:
+            if not key.startswith(folded):
+                break
+            keywords.append(keyword)
+        return keywords
+
+    def reload(self, db):
+        """Load all keywords from the database, return the revision they correspond to"""
+        keywords, revision = db.list_keywords()
+        self.load(keywords)
+        logger.info(f"Keyword index loaded: {len(keywords)} keywords at revision {revision}")
+        return revision
+
+    def apply(self, change):
+        """Apply a term_changes row"""
+        if change['operation'] == 'delete':
+            self.remove(change['keyword'])
+        else:
+            self.add(change['keyword'])
+
+    def follow(self, db, notifier, revision):
+        """Apply the change log after revision forever, run in a daemon thread
+
+        Picks up writes of other processes too (launcher.py, bulk.py); writes of
+        this process wake the loop up through notifier right away.
+        """
+        while True:
+            sequence = notifier.sequence
+            try:
+                changes = db.changes_since(revision, limit=WATCH_BATCH_SIZE)
+                if changes is None:
+                    revision = self.reload(db)
+                    continue
+            except Exception as e:
+                logger.error(f"Keyword index update failed: {str(e)}")
+                notifier.wait(sequence)
+                continue
+
+            for change in changes:
+                self.apply(change)
+                revision = change['revision']
+
+            if len(changes) < WATCH_BATCH_SIZE:
+                notifier.wait(sequence)
+
+    def start(self, db, notifier):
+        """Build the index and keep it up to date in a background thread"""
+        revision = self.reload(db)
+        thread = threading.Thread(
+            target=self.follow,
+            args=(db, notifier, revision),
+            name="keyword-index",
+            daemon=True
+        )
+        thread.start()
+        return thread
\ No newline at end of file
@@ -0,0 +1,123 @@
+import sqlite3
+
+import database
+import pytest
+from database import INITIAL_TERMS, GlossaryDatabase
+
+
+def make_db(tmp_path):
+    return GlossaryDatabase(str(tmp_path / "glossary.db"))
+
+
+def test_initial_terms(tmp_path):
+    db = make_db(tmp_path)
+    terms, total, revision = db.list_terms()
+    assert [term["keyword"] for term in terms] == sorted(keyword for keyword, _, _ in INITIAL_TERMS)
+    assert total == len(INITIAL_TERMS)
+    assert revision == db.get_revision() == len(INITIAL_TERMS), "Каждый начальный термин получает свою ревизию"
+
+
+def test_revision_grows_on_every_write(tmp_path):
+    db = make_db(tmp_path)
+    revision = db.get_revision()
+
+    created = db.create_term_returning("gRPC", "Фреймворк удаленного вызова процедур", "web")
+    assert created["revision"] == revision + 1, "Запись получает следующую ревизию"
+    assert db.create_term_returning("gRPC", "Повтор") is None, "Повторное создание не меняет термин"
+    assert db.get_revision() == revision + 1
+
+    updated = db.update_term_returning("gRPC", description="Фреймворк RPC от Google")
+    assert updated["revision"] == revision + 2
+    assert db.get_term_revision("gRPC") == revision + 2
+    assert db.update_term_returning("missing", description="Нет такого") is None
+
+    assert db.delete_term("gRPC")
+    assert db.get_revision() == revision + 3, "Удаление тоже сдвигает ревизию"
+    assert db.get_term_revision("gRPC") is None
+
+
+def test_upsert_keeps_category(tmp_path):
+    """upsert создает термин, а при обновлении без категории оставляет прежнюю"""
+    db = make_db(tmp_path)
+    created = db.upsert_term("WAL", "Журнал упреждающей записи")
+    assert created["category"] == "general"
+
+    db.update_term("WAL", category="db")
+    updated = db.upsert_term("WAL", "Write-Ahead Log")
+    assert updated["description"] == "Write-Ahead Log"
+    assert updated["category"] == "db", "Категория не сбрасывается, если ее не передали"
+    assert updated["revision"] == db.get_revision()
+
+
+def test_category_counts(tmp_path):
+    db = make_db(tmp_path)
+    db.create_term("SQLite", "Встраиваемая СУБД", "db")
+    db.create_term("WAL", "Журнал упреждающей записи", "db")
+    db.update_term("REST", category="db")
+    db.delete_term("SQLite")
+
+    categories, _ = db.list_categories()
+    assert categories == [{"category": "db", "term_count": 2}, {"category": "web", "term_count": 1}]
+    _, total, _ = db.list_terms(category="db")
+    assert total == 2, "Число терминов категории берется из счетчиков"
+
+
+def test_changes_since(tmp_path):
+    db = make_db(tmp_path)
+    revision = db.get_revision()
+    db.create_term("SQLite", "Встраиваемая СУБД", "db")
+    db.update_term("SQLite", description="Встраиваемая реляционная СУБД")
+    db.delete_term("SQLite")
+
+    changes = db.changes_since(revision)
+    assert [(change["operation"], change["keyword"]) for change in changes] == \
+        [("create", "SQLite"), ("update", "SQLite"), ("delete", "SQLite")]
+    assert [change["revision"] for change in changes] == [revision + 1, revision + 2, revision + 3]
+    assert changes[1]["description"] == "Встраиваемая реляционная СУБД"
+    assert db.changes_since(revision, limit=1) == changes[:1]
+    assert db.changes_since(db.get_revision()) == [], "С текущей ревизии изменений нет"
+
+
+def test_changes_since_trimmed_log(tmp_path, monkeypatch):
+    """Ревизию старше журнала продолжить нельзя, нужна полная загрузка"""
+    monkeypatch.setattr(database, "CHANGE_LOG_SIZE", 5)
+    db = make_db(tmp_path)
+    revision = db.get_revision()
+    for n in range(10):
+        db.create_term(f"term-{n}", f"Описание {n}")
+
+    assert db.changes_since(revision) is None
+    recent = db.changes_since(db.get_revision() - 3)
+    assert [change["keyword"] for change in recent] == ["term-7", "term-8", "term-9"]
+
+
+def test_import_terms(tmp_path):
+    db = make_db(tmp_path)
+    rows = [(f"term-{n}", f"Описание {n}", "test") for n in range(25)]
+    assert db.import_terms(rows, batch_size=10) == 25
+    db.import_terms([("term-0", "Новое описание", "test")])
+    assert db.get_term("term-0")["description"] == "Описание 0", "Без replace существующие термины не меняются"
+
+    db.import_terms([("term-0", "Новое описание", "test")], replace=True)
+    assert db.get_term("term-0")["description"] == "Новое описание"
+    _, total, _ = db.list_terms(category="test")
+    assert total == 25
+
+def test_failed_import_keeps_indexes(tmp_path):
+    """Ошибка в пакете импорта не оставляет таблицу без вторичных индексов"""
+    db = make_db(tmp_path)
+
+    def index_names():
+        with db.get_connection() as conn:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'terms'")
+            return sorted(row["name"] for row in rows)
+
+    before = index_names()
+    assert "idx_terms_category" in before and "idx_terms_created_at" in before
+
+    rows = [("term-0", "Описание 0", "test"), ("term-1", None, "test")]
+    with pytest.raises(sqlite3.IntegrityError):
+        db.import_terms(rows, batch_size=1)
+    assert index_names() == before, "Индексы пересоздаются и после ошибки импорта"
+    assert db.get_term("term-0") is not None, "Уже записанные пакеты остаются"
+    assert db.get_term("term-1") is None
\ No newline at end of file
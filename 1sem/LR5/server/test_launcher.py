@@ -0,0 +1,53 @@
+import os
+import socket
+import sys
+import time
+import urllib.request
+
+import pytest
+
+pytest.importorskip("grpc")
+
+# glossary_pb2 лежит в каталоге LR5; рабочие процессы (spawn) получают тот же sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from launcher import WorkerPool  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def metrics_available(port, timeout=10.0):
+    """Порт метрик отвечает на /metrics в течение timeout секунд"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                return response.status == 200
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def test_rolling_restart_with_metrics_port(tmp_path):
+    """Новый процесс занимает порт метрик, пока его держит старый, и заменяет старый"""
+    metrics_port = free_port()
+    pool = WorkerPool(1, str(free_port()), max_workers=2, db_path=str(tmp_path / "glossary.db"), grace=0.5,
+                      metrics_port=metrics_port)
+    pool.start()
+    try:
+        assert pool._wait_ready(0), "Рабочий процесс не запустился"
+        assert metrics_available(metrics_port)
+        old_process = pool._processes[0]
+
+        pool.rolling_restart()
+        new_process = pool._processes[0]
+        assert new_process is not old_process, "Плавный перезапуск не должен прерываться из-за порта метрик"
+        assert new_process.is_alive()
+        assert not old_process.is_alive(), "Старый процесс остановлен после готовности нового"
+        assert metrics_available(metrics_port), "Метрики доступны после перезапуска"
+    finally:
+        pool.stop()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+from sharding import ShardedGlossaryDatabase, open_database, rebalance, shard_index, shard_paths
+
+
+def keywords_of_shard(index, shards, count):
+    """Первые count ключевых слов вида term-N, попадающих в шард index"""
+    keywords = []
+    number = 0
+    while len(keywords) < count:
+        keyword = f"term-{number}"
+        if shard_index(keyword, shards) == index:
+            keywords.append(keyword)
+        number += 1
+    return keywords
+
+
+def test_shard_paths():
+    assert shard_paths("glossary.db", 3) == ["glossary.0-of-3.db", "glossary.1-of-3.db", "glossary.2-of-3.db"]
+
+
+def test_shard_index_stable():
+    """Номер шарда не зависит от PYTHONHASHSEED и лежит в диапазоне"""
+    assert shard_index("REST", 4) == shard_index("REST", 4)
+    assert all(0 <= shard_index(f"term-{n}", 4) < 4 for n in range(100))
+
+
+def test_term_routed_to_one_shard(tmp_path):
+    db = ShardedGlossaryDatabase(str(tmp_path / "glossary.db"), shards=3)
+    db.create_term("sharding", "Разбиение данных по нескольким базам", "db")
+    stored = [shard.get_term("sharding") is not None for shard in db.shards]
+    assert stored.count(True) == 1, "Термин хранится ровно в одном шарде"
+    assert stored[shard_index("sharding", 3)], "Термин лежит в шарде из shard_index"
+    assert db.get_term("sharding")["description"] == "Разбиение данных по нескольким базам"
+
+
+def test_list_terms_merged(tmp_path):
+    """Списки шардов сливаются в общий порядок по keyword с общей пагинацией"""
+    db = ShardedGlossaryDatabase(str(tmp_path / "glossary.db"), shards=3)
+    for n in range(20):
+        db.create_term(f"term-{n:02d}", f"Описание {n}")
+    terms, total, _ = db.list_terms(skip=0, limit=1000)
+    keywords = [term["keyword"] for term in terms]
+    assert keywords == sorted(keywords), "Термины всех шардов упорядочены по keyword"
+    assert total == len(keywords)
+
+    page, _, _ = db.list_terms(skip=5, limit=5)
+    assert [term["keyword"] for term in page] == keywords[5:10], "skip и limit считаются по общему списку"
+
+
+def test_changes_since_across_shards(tmp_path):
+    db = ShardedGlossaryDatabase(str(tmp_path / "glossary.db"), shards=3)
+    revision = db.get_revision()
+    for n in range(6):
+        db.create_term(f"term-{n}", f"Описание {n}")
+    db.delete_term("term-0")
+
+    changes = db.changes_since(revision)
+    created = [change["keyword"] for change in changes if change["operation"] != "delete"]
+    assert sorted(created) == [f"term-{n}" for n in range(6)], "Видны изменения всех шардов"
+    for index in range(3):
+        in_shard = [keyword for keyword in created if shard_index(keyword, 3) == index]
+        assert in_shard == sorted(in_shard), "Внутри шарда изменения идут в порядке записи"
+    revisions = [change["revision"] for change in changes]
+    assert revisions == sorted(set(revisions)), "Сводные ревизии растут с каждым изменением"
+    assert [change["keyword"] for change in changes if change["operation"] == "delete"] == ["term-0"]
+    assert revisions[-1] == db.get_revision(), "Последнее изменение соответствует текущей ревизии"
+    assert db.changes_since(10 ** 9) is None, "С неизвестной ревизии продолжить нельзя"
+
+
+def test_rebalance_keeps_terms(tmp_path):
+    """Перенос с одного файла на три шарда сохраняет термины и их время"""
+    db_path = str(tmp_path / "glossary.db")
+    source = open_database(db_path, 1)
+    for n in range(50):
+        source.create_term(f"term-{n}", f"Описание {n}", "test")
+    before = list(source.export_terms())
+
+    assert rebalance(db_path, 1, 3, batch_size=7) == len(before)
+    target = open_database(db_path, 3)
+    moved = [dict(term, revision=None) for term in target.export_terms()]
+    assert moved == [dict(term, revision=None) for term in before], "После переноса те же термины с тем же временем"
+    for shard in target.shards:
+        for term in shard.export_terms():
+            assert shard_index(term["keyword"], 3) == target.shards.index(shard)
+
+    with pytest.raises(FileExistsError):
+        rebalance(db_path, 1, 3)
+
+
+def test_import_failed_shard_does_not_hang(tmp_path):
+    """Ошибка импорта в одном шарде поднимается, остальные шарды получают конец потока"""
+    db = ShardedGlossaryDatabase(str(tmp_path / "glossary.db"), shards=2)
+
+    def failing_import(rows, *args):
+        # Шард падает, не прочитав свою заполненную очередь
+        time.sleep(0.2)
+        raise RuntimeError("shard failed")
+
+    db.shards[0].import_terms = failing_import
+    rows = [(keyword, "Описание", "test") for keyword in keywords_of_shard(0, 2, 2) + keywords_of_shard(1, 2, 5)]
+
+    errors = []
+
+    def run():
+        try:
+            db.import_terms(rows, batch_size=2)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "import_terms не должен зависать при ошибке шарда"
+    assert [str(e) for e in errors] == ["shard failed"], "Ошибка шарда поднимается из import_terms"
\ No newline at end of file
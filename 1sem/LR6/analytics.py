@@ -0,0 +1,324 @@
+import logging
+import math
+import os
+import time
+from array import array
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+# Длины скользящих окон статистики в выборках; выборка - ответ API с новым документом курсов
+ANALYTICS_WINDOWS = tuple(int(size) for size in os.environ.get("ANALYTICS_WINDOWS", "20,100").split(",") if size)
+# Вес нового значения в экспоненциальном среднем (EWMA)
+ANALYTICS_EWMA_ALPHA = float(os.environ.get("ANALYTICS_EWMA_ALPHA", "0.1"))
+# Z-оценка считается, когда в окне не меньше стольких значений
+ANALYTICS_MIN_SAMPLES = int(os.environ.get("ANALYTICS_MIN_SAMPLES", "5"))
+# Наибольшее число условий оповещения у одного клиента
+ALERT_RULES_LIMIT = int(os.environ.get("ALERT_RULES_LIMIT", "50"))
+
+
+class RollingWindow:
+    """Скользящее окно последних size значений каждой валюты: среднее, дисперсия, min и max
+
+    Значения лежат в кольцевом буфере size x n (строка - выборка, столбец -
+    валюта), все величины обновляются векторно по всем валютам. Среднее и
+    сумма квадратов отклонений обновляются по Уэлфорду: учитывается новое
+    значение и вычитается вытесненное. Min и max окна - минимум из префикса
+    текущего блока в size выборок и суффикса прошлого блока (van Herk,
+    Gil-Werman). Суффиксы пересчитываются раз в size выборок, тогда же среднее
+    и сумма квадратов пересчитываются по буферу заново, чтобы ошибка
+    округления не накапливалась. На валюту в среднем O(1) за выборку при любой
+    длине окна.
+    """
+
+    def __init__(self, size: int, width: int):
+        if size < 2:
+            raise ValueError("Window size must be at least 2")
+        self.size = size
+        # Сколько выборок окно видело всего; в буфере - последние min(count, size)
+        self.count = 0
+        self._ring = numpy.zeros((size, width))
+        self.mean = numpy.zeros(width)
+        self._m2 = numpy.zeros(width)
+        self._prefix_min = numpy.full(width, numpy.inf)
+        self._prefix_max = numpy.full(width, -numpy.inf)
+        self._suffix_min = numpy.full((size, width), numpy.inf)
+        self._suffix_max = numpy.full((size, width), -numpy.inf)
+
+    @property
+    def samples(self) -> int:
+        return min(self.count, self.size)
+
+    @property
+    def variance(self):
+        """Выборочная дисперсия значений окна"""
+        if self.samples < 2:
+            return numpy.zeros_like(self.mean)
+        return self._m2 / (self.samples - 1)
+
+    @property
+    def minimum(self):
+        position = (self.count - 1) % self.size
+        if position == self.size - 1:
+            return self._prefix_min
+        return numpy.minimum(self._prefix_min, self._suffix_min[position + 1])
+
+    @property
+    def maximum(self):
+        position = (self.count - 1) % self.size
+        if position == self.size - 1:
+            return self._prefix_max
+        return numpy.maximum(self._prefix_max, self._suffix_max[position + 1])
+
+    def push(self, values) -> None:
+        """Добавить выборку: по значению на валюту"""
+        position = self.count % self.size
+        if self.count < self.size:
+            delta = values - self.mean
+            self.mean += delta / (self.count + 1)
+            self._m2 += delta * (values - self.mean)
+        else:
+            dropped = self._ring[position]
+            mean = self.mean + (values - dropped) / self.size
+            self._m2 += (values - dropped) * (values - mean + dropped - self.mean)
+            numpy.maximum(self._m2, 0.0, out=self._m2)
+            self.mean = mean
+        self._ring[position] = values
+
+        if position == 0:
+            self._prefix_min = values.copy()
+            self._prefix_max = values.copy()
+        else:
+            numpy.minimum(self._prefix_min, values, out=self._prefix_min)
+            numpy.maximum(self._prefix_max, values, out=self._prefix_max)
+        self.count += 1
+
+        if position == self.size - 1:
+            # Блок заполнен: его суффиксы понадобятся следующему блоку
+            self._suffix_min = numpy.minimum.accumulate(self._ring[::-1], axis=0)[::-1]
+            self._suffix_max = numpy.maximum.accumulate(self._ring[::-1], axis=0)[::-1]
+            self.mean = self._ring.mean(axis=0)
+            self._m2 = ((self._ring - self.mean) ** 2).sum(axis=0)
+
+    def realign(self, columns, fill) -> None:
+        """Перестроить столбцы под новый набор валют
+
+        columns[i] - прежний столбец i-й валюты или -1 для новой. Окно новой
+        валюты заполняется ее первым курсом, как будто он не менялся.
+        """
+        new = columns < 0
+        kept = numpy.where(new, 0, columns)
+
+        def take(state, value):
+            result = state[..., kept]
+            result[..., new] = value[new] if numpy.ndim(value) else value
+            return result
+
+        self._ring = take(self._ring, fill)
+        self.mean = take(self.mean, fill)
+        self._m2 = take(self._m2, 0.0)
+        self._prefix_min = take(self._prefix_min, fill)
+        self._prefix_max = take(self._prefix_max, fill)
+        self._suffix_min = take(self._suffix_min, fill if self.count >= self.size else numpy.inf)
+        self._suffix_max = take(self._suffix_max, fill if self.count >= self.size else -numpy.inf)
+
+
+class StreamingStats:
+    """Потоковая статистика курсов по выборкам без повторного просмотра истории
+
+    Выборка - курсы всех валют из ответа API с новым документом. Для каждой
+    валюты ведутся EWMA и экспоненциальная дисперсия и скользящие окна
+    ANALYTICS_WINDOWS (RollingWindow). Z-оценка нового курса считается
+    относительно окна до его добавления, чтобы выброс не размывал свою же
+    базу. Требуется numpy: все валюты обновляются одной векторной операцией.
+    """
+
+    def __init__(self, windows: Iterable[int] = ANALYTICS_WINDOWS, alpha: float = ANALYTICS_EWMA_ALPHA,
+                 min_samples: int = ANALYTICS_MIN_SAMPLES):
+        if numpy is None:
+            raise RuntimeError("Streaming statistics require numpy (pip install numpy)")
+        if not 0 < alpha <= 1:
+            raise ValueError("EWMA alpha must be in (0, 1]")
+        self.window_sizes = tuple(sorted(set(windows)))
+        if not self.window_sizes:
+            raise ValueError("At least one statistics window is required")
+        self.alpha = alpha
+        self.min_samples = max(min_samples, 2)
+        self.samples = 0
+        # Длительность последнего обновления, сек
+        self.last_update_seconds = 0.0
+        self._lock = Lock()
+        self._codes: Tuple[str, ...] = ()
+        self._index: Dict[str, int] = {}
+        self._last = numpy.zeros(0)
+        self._ewma = numpy.zeros(0)
+        self._ewm_var = numpy.zeros(0)
+        self._windows = {size: RollingWindow(size, 0) for size in self.window_sizes}
+        self._zscores = {size: numpy.zeros(0) for size in self.window_sizes}
+
+    def update(self, codes: Tuple[str, ...], values: array) -> int:
+        """Учесть выборку курсов в порядке codes, вернуть ее номер"""
+        started = time.perf_counter()
+        # frombuffer не копирует данные array
+        rates = numpy.frombuffer(values)
+        with self._lock:
+            if codes != self._codes:
+                self._realign(codes, rates)
+            delta = rates - self._ewma
+            self._ewma = self._ewma + self.alpha * delta
+            self._ewm_var = (1 - self.alpha) * (self._ewm_var + self.alpha * delta * delta)
+
+            for size, window in self._windows.items():
+                self._zscores[size] = self._zscore(window, rates)
+                window.push(rates)
+            self._last = rates.copy()
+            self.samples += 1
+            self.last_update_seconds = time.perf_counter() - started
+            return self.samples
+
+    def zscores(self, currency: str) -> Dict[int, float]:
+        """Z-оценки последнего курса валюты по окнам; nan - мало данных или курс не менялся"""
+        with self._lock:
+            i = self._index.get(currency)
+            if i is None:
+                return {}
+            return {size: float(zscores[i]) for size, zscores in self._zscores.items()}
+
+    def snapshot(self, currencies: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Статистика валют: {валюта: {rate, ewma, ewm_std, windows: {длина: {...}}}}"""
+        with self._lock:
+            codes = self._codes if currencies is None else [code for code in currencies if code in self._index]
+            windows = {
+                size: (window.samples, window.mean, numpy.sqrt(window.variance), window.minimum, window.maximum)
+                for size, window in self._windows.items()
+            }
+            ewm_std = numpy.sqrt(self._ewm_var)
+            result = {}
+            for code in codes:
+                i = self._index[code]
+                result[code] = {
+                    'rate': float(self._last[i]),
+                    'ewma': float(self._ewma[i]),
+                    'ewm_std': float(ewm_std[i]),
+                    'windows': {
+                        str(size): {
+                            'samples': samples,
+                            'mean': float(mean[i]),
+                            'std': float(std[i]),
+                            'min': float(minimum[i]),
+                            'max': float(maximum[i]),
+                            'zscore': finite_or_none(self._zscores[size][i]),
+                        }
+                        for size, (samples, mean, std, minimum, maximum) in windows.items()
+                    },
+                }
+            return result
+
+    def gauges(self) -> Dict[str, Any]:
+        """Размер статистики для /status и /metrics"""
+        return {
+            'samples': self.samples,
+            'currencies': len(self._codes),
+            'windows': list(self.window_sizes),
+            'last_update_ms': round(self.last_update_seconds * 1000, 3),
+        }
+
+    def _zscore(self, window: RollingWindow, rates):
+        if window.samples < self.min_samples:
+            return numpy.full(len(rates), numpy.nan)
+        std = numpy.sqrt(window.variance)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return numpy.where(std > 0, (rates - window.mean) / std, numpy.nan)
+
+    def _realign(self, codes: Tuple[str, ...], rates) -> None:
+        """Набор валют изменился: столбцы прежних валют сохраняются, новые начинаются с первого курса"""
+        if not self._codes:
+            self._ewma, self._ewm_var = rates.copy(), numpy.zeros(len(codes))
+            self._windows = {size: RollingWindow(size, len(codes)) for size in self.window_sizes}
+        else:
+            columns = numpy.array([self._index.get(code, -1) for code in codes], dtype=numpy.intp)
+            new = columns < 0
+            kept = numpy.where(new, 0, columns)
+            self._ewma = numpy.where(new, rates, self._ewma[kept])
+            self._ewm_var = numpy.where(new, 0.0, self._ewm_var[kept])
+            for window in self._windows.values():
+                window.realign(columns, rates)
+            logger.info(f"Набор валют статистики изменился: {len(self._codes)} -> {len(codes)}")
+        self._zscores = {size: numpy.full(len(codes), numpy.nan) for size in self.window_sizes}
+        self._codes = codes
+        self._index = {code: i for i, code in enumerate(codes)}
+
+
+def finite_or_none(value: float) -> Optional[float]:
+    """Число для JSON: nan и бесконечность - None"""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class AlertRule:
+    """Условие оповещения по курсу валюты
+
+    above/below - курс пересек уровень снизу вверх или сверху вниз;
+    zscore - |z-оценка| нового курса по окну window не меньше заданной.
+    """
+
+    def __init__(self, currency: str, above: Optional[float] = None, below: Optional[float] = None,
+                 zscore: Optional[float] = None, window: Optional[int] = None):
+        self.currency = currency
+        self.above = above
+        self.below = below
+        self.zscore = zscore
+        self.window = window
+
+    @classmethod
+    def from_request(cls, data: Dict[str, Any], windows: Tuple[int, ...] = ANALYTICS_WINDOWS) -> 'AlertRule':
+        """Разобрать условие {currency: USD, above: 95, below: 80, zscore: 3, window: 20}"""
+        code = str(data.get('currency', '')).upper()
+        if len(code) != 3 or not code.isalpha():
+            raise ValueError(f"Invalid currency code: {code}")
+        above, below, zscore = (None if data.get(key) is None else float(data[key])
+                                for key in ('above', 'below', 'zscore'))
+        if above is None and below is None and zscore is None:
+            raise ValueError(f"{code}: set above, below or zscore")
+        window = None
+        if zscore is not None:
+            if not windows:
+                raise ValueError("zscore alerts require streaming statistics (numpy)")
+            if zscore <= 0:
+                raise ValueError("zscore must be positive")
+            window = int(data.get('window') or windows[0])
+            if window not in windows:
+                raise ValueError(f"window must be one of {list(windows)}")
+        return cls(code, above, below, zscore, window)
+
+    def triggered(self, rate: float, previous: float, zscores: Dict[int, float]) -> List[Tuple]:
+        """Сработавшие условия: (валюта, вид, порог, значение, окно или None)"""
+        fired = []
+        if self.above is not None and previous <= self.above < rate:
+            fired.append((self.currency, 'above', self.above, rate, None))
+        if self.below is not None and previous >= self.below > rate:
+            fired.append((self.currency, 'below', self.below, rate, None))
+        if self.zscore is not None:
+            z = zscores.get(self.window, math.nan)
+            if abs(z) >= self.zscore:
+                fired.append((self.currency, 'zscore', self.zscore, round(z, 3), self.window))
+        return fired
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in vars(self).items() if value is not None}
+
+
+def parse_alert_rules(data: Dict[str, Any], windows: Tuple[int, ...] = ANALYTICS_WINDOWS) -> List[AlertRule]:
+    """Разобрать событие set_alerts: {rules: [{currency: USD, above: 95}, ...]}"""
+    rules = data.get('rules')
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("rules must be a non-empty list")
+    if len(rules) > ALERT_RULES_LIMIT:
+        raise ValueError(f"At most {ALERT_RULES_LIMIT} rules per client")
+    return [AlertRule.from_request(rule, windows) for rule in rules]
\ No newline at end of file
@@ -1,163 +1,33 @@
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit
-import requests
-import time
+from flask import Flask, Response, render_template, jsonify, request
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Optional
 from threading import Thread, Event
 import logging
 
+from analytics import parse_alert_rules
+from currency import (
+    CBR_ALL_CURRENCIES, COMPACT_ROOMS, CURRENCY_ROOM, FULL_FEED_ROOM, PROMETHEUS_CONTENT_TYPE, TRACKED_CURRENCIES,
+    AlertObserver, CompactObserver, CurrencySubject, RoomObserver, SendQueues, Subscription, SubscriptionObserver,
+    currency_metrics, filter_currency_data, history_response, msgpack, open_history, prometheus_text,
+    registry_gauges, stats_response
+)
+from history import HistoryStore
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-CBR_API_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
-
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 
-class CurrencySubject:
-    """Субъект (Subject) для отслеживания изменений курсов валют"""
-
-    def __init__(self):
-        self._observers: List[CurrencyObserver] = []
-        self._current_rates: Dict[str, float] = {}
-        self._previous_rates: Dict[str, float] = {}
-        self._clients: Dict[str, Any] = {}
-
-    def attach(self, observer: 'CurrencyObserver') -> None:
-        """Присоединить наблюдателя к субъекту"""
-        if observer not in self._observers:
-            self._observers.append(observer)
-            logger.info(f"Наблюдатель {observer.observer_id} присоединен")
-
-    def detach(self, observer: 'CurrencyObserver') -> None:
-        """Отсоединить наблюдателя от субъекта"""
-        if observer in self._observers:
-            self._observers.remove(observer)
-            logger.info(f"Наблюдатель {observer.observer_id} отсоединен")
-
-    def notify(self, currency_data: Dict[str, Any]) -> None:
-        """Уведомить всех наблюдателей об изменении курсов"""
-        for observer in self._observers:
-            observer.update(currency_data)
-
-    def register_client(self, client_id: str, socketio_handler):
-        """Зарегистрировать WebSocket клиента"""
-        observer = WebSocketObserver(client_id, socketio_handler)
-        self.attach(observer)
-        self._clients[client_id] = observer
-        return observer
-
-    def unregister_client(self, client_id: str):
-        """Удалить WebSocket клиента"""
-        if client_id in self._clients:
-            observer = self._clients[client_id]
-            self.detach(observer)
-            del self._clients[client_id]
-
-    def get_clients_count(self) -> int:
-        """Получить количество подключенных клиентов"""
-        return len(self._clients)
-
-    def fetch_currency_rates(self) -> Dict[str, Any]:
-        """Получить текущие курсы валют с API Центробанка"""
-        try:
-            response = requests.get(CBR_API_URL, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            currencies = {
-                'USD': data['Valute']['USD']['Value'],
-                'EUR': data['Valute']['EUR']['Value'],
-                'GBP': data['Valute']['GBP']['Value'],
-                'CNY': data['Valute']['CNY']['Value'],
-                'JPY': data['Valute']['JPY']['Value'] / 100,
-                'CHF': data['Valute']['CHF']['Value'],
-                'CAD': data['Valute']['CAD']['Value']
-            }
-
-            changes = self._check_changes(currencies)
-
-            result = {
-                'timestamp': datetime.now().isoformat(),
-                'rates': currencies,
-                'changes': changes,
-                'previous_rates': self._previous_rates.copy(),
-                'observers_count': self.get_clients_count()
-            }
-
-            self._previous_rates = currencies.copy()
-            self._current_rates = currencies.copy()
-
-            return result
-
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при получении данных: {e}")
-            return {
-                'timestamp': datetime.now().isoformat(),
-                'rates': self._current_rates,
-                'changes': {},
-                'error': str(e),
-                'observers_count': self.get_clients_count()
-            }
-
-    def _check_changes(self, new_rates: Dict[str, float]) -> Dict[str, Dict[str, float]]:
-        """Проверить изменения курсов валют"""
-        changes = {}
-
-        for currency, new_rate in new_rates.items():
-            if currency in self._previous_rates:
-                old_rate = self._previous_rates[currency]
-                if abs(old_rate - new_rate) > 0.0001:
-                    changes[currency] = {
-                        'old_rate': old_rate,
-                        'new_rate': new_rate,
-                        'change': new_rate - old_rate,
-                        'change_percent': ((new_rate - old_rate) / old_rate) * 100
-                    }
-
-        return changes
-
-
-class CurrencyObserver:
-    """Абстрактный класс наблюдателя"""
-
-    def __init__(self, observer_id: str):
-        self.observer_id = observer_id
-
-    def update(self, currency_data: Dict[str, Any]) -> None:
-        """Обновить данные наблюдателя"""
-        raise NotImplementedError
-
-
-class WebSocketObserver(CurrencyObserver):
-    """Наблюдатель, который отправляет данные через WebSocket"""
-
-    def __init__(self, observer_id: str, socketio_handler):
-        super().__init__(observer_id)
-        self.socketio_handler = socketio_handler
-
-    def update(self, currency_data: Dict[str, Any]) -> None:
-        """Отправить обновление через WebSocket"""
-        message = {
-            'type': 'currency_update',
-            'observer_id': self.observer_id,
-            'data': currency_data,
-            'timestamp': datetime.now().isoformat()
-        }
-
-        try:
-            self.socketio_handler.emit('currency_data', message)
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения наблюдателю {self.observer_id}: {e}")
-
-
 class CurrencyMonitor:
     """Монитор для периодической проверки курсов валют"""
 
-    def __init__(self, subject: CurrencySubject, interval: int = 30):
+    def __init__(self, subject: CurrencySubject, interval: int = 30, history: Optional[HistoryStore] = None):
         self.subject = subject
+        self.history = history
         self.interval = interval  # интервал в секундах
         self.thread = None
         self.stop_event = Event()
@@ -179,24 +49,22 @@ class CurrencyMonitor:
         if self.thread and self.thread.is_alive():
             self.stop_event.set()
             self.thread.join()
+            if self.history is not None:
+                self.history.flush()
             logger.info("Мониторинг курсов валют остановлен")
 
     def _monitoring_loop(self):
         """Цикл мониторинга"""
         while not self.stop_event.is_set():
             try:
-                currency_data = self.subject.fetch_currency_rates()
-
-                if currency_data.get('changes'):
-                    logger.info(f"Обнаружены изменения курсов: {list(currency_data['changes'].keys())}")
-                    self.subject.notify(currency_data)
-
-                    socketio.emit('currency_update', {
-                        'type': 'broadcast_update',
-                        'data': currency_data,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                else:
+                # Ответ не старше интервала; наблюдатели уведомляются самим субъектом
+                currency_data = self.subject.fetch_currency_rates(max_age=self.interval)
+                if self.history is not None:
+                    # Ответ из кэша уже записан: строки с тем же временем не добавляются
+                    self.history.record(currency_data)
+                    self.history.flush_if_due()
+
+                if not currency_data.get('changes'):
                     logger.info(f"Проверка курсов завершена. Изменений нет. ({currency_data['timestamp']})")
 
                 self.stop_event.wait(self.interval)
@@ -212,8 +80,17 @@ class CurrencyMonitor:
 
 
 # Глобальные экземпляры
-currency_subject = CurrencySubject()
-currency_monitor = CurrencyMonitor(currency_subject, interval=30)
+send_queues = SendQueues(socketio.server)
+currency_subject = CurrencySubject(currencies=None if CBR_ALL_CURRENCIES else TRACKED_CURRENCIES)
+currency_subscriptions = SubscriptionObserver(send_queues.emit)
+currency_compact = CompactObserver(send_queues.emit)
+currency_subject.attach(RoomObserver(FULL_FEED_ROOM, send_queues.emit))
+currency_subject.attach(currency_subscriptions)
+currency_subject.attach(currency_compact)
+currency_alerts = AlertObserver(send_queues.emit, currency_subject.analytics)
+currency_subject.attach(currency_alerts)
+currency_history = open_history()
+currency_monitor = CurrencyMonitor(currency_subject, interval=30, history=currency_history)
 
 
 @app.route('/')
@@ -230,10 +107,25 @@ def status():
         'observers_count': currency_subject.get_clients_count(),
         'monitoring_interval': currency_monitor.interval,
         'is_monitoring': currency_monitor.thread and currency_monitor.thread.is_alive(),
+        'rates_cache': currency_subject.get_cache_stats(),
+        'upstream': currency_subject.get_upstream_stats(),
+        'registry': registry_gauges(currency_subject, currency_subscriptions),
+        'history': currency_history.gauges(),
+        'send_queues': send_queues.gauges(),
+        'analytics': currency_subject.analytics.gauges() if currency_subject.analytics is not None else None,
+        'alerts': currency_alerts.gauges(),
         'timestamp': datetime.now().isoformat()
     })
 
 
+@app.route('/metrics')
+def metrics():
+    """Размеры реестров и счетчики кэша в текстовом формате Prometheus"""
+    gauges = currency_metrics(currency_subject, currency_subscriptions, currency_compact, currency_alerts,
+                              currency_history, send_queues)
+    return Response(prometheus_text(gauges), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.route('/api/rates')
 def get_rates():
     """API для получения текущих курсов валют"""
@@ -241,12 +133,34 @@ def get_rates():
     return jsonify(currency_data)
 
 
+@app.route('/api/history')
+def get_history():
+    """История курса валюты: /api/history?currency=USD&from=&to=&step=1h"""
+    body, status_code = history_response(currency_history, request.args)
+    return jsonify(body), status_code
+
+
+@app.route('/api/stats')
+def get_stats():
+    """Потоковая статистика курсов: /api/stats?currency=USD,EUR"""
+    body, status_code = stats_response(currency_subject.analytics, request.args)
+    return jsonify(body), status_code
+
+
+def current_observer_id() -> Optional[str]:
+    """Идентификатор наблюдателя клиента, вызвавшего обработчик"""
+    observer = currency_subject.get_client(request.sid)
+    return observer.observer_id if observer else None
+
+
 @socketio.on('connect')
 def handle_connect():
     """Обработчик подключения WebSocket клиента"""
-    client_id = f"observer_{int(time.time() * 1000)}"
-
-    observer = currency_subject.register_client(client_id, socketio)
+    observer = currency_subject.register_client(request.sid)
+    client_id = observer.observer_id
+    join_room(CURRENCY_ROOM)
+    # Пока клиент не подписался на отдельные валюты, он получает все
+    join_room(FULL_FEED_ROOM)
 
     logger.info(f"Клиент подключен: {client_id} (SID: {request.sid})")
 
@@ -269,30 +183,29 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Обработчик отключения WebSocket клиента"""
-    client_id = None
-    for cid, observer in currency_subject._clients.items():
-        client_id = cid
-        break
+    observer = currency_subject.unregister_client(request.sid)
+    currency_subscriptions.unsubscribe(request.sid)
+    currency_alerts.clear(request.sid)
 
-    if client_id:
-        currency_subject.unregister_client(client_id)
-        logger.info(f"Клиент отключен: {client_id}")
+    if observer:
+        logger.info(f"Клиент отключен: {observer.observer_id}")
 
-        socketio.emit('clients_update', {
+        send_queues.emit('clients_update', {
             'clients_count': currency_subject.get_clients_count(),
             'timestamp': datetime.now().isoformat()
-        })
+        }, CURRENCY_ROOM)
 
 
 @socketio.on('get_rates')
 def handle_get_rates():
     """Обработчик запроса текущих курсов"""
-    client_id = None
-    for cid, observer in currency_subject._clients.items():
-        client_id = cid
-        break
+    client_id = current_observer_id()
 
     currency_data = currency_subject.fetch_currency_rates()
+    subscription = currency_subscriptions.get(request.sid)
+    if subscription:
+        currency_data = filter_currency_data(currency_data, subscription.currencies)
+
     emit('currency_data', {
         'type': 'current_rates',
         'observer_id': client_id,
@@ -301,16 +214,89 @@ def handle_get_rates():
     })
 
 
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Обработчик подписки на выбранные валюты с порогами изменения"""
+    try:
+        subscription = Subscription.from_request(data or {})
+    except (AttributeError, TypeError, ValueError) as e:
+        emit('subscription_error', {
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        })
+        return
+
+    observer = currency_subject.get_client(request.sid)
+    if observer and observer.protocol == 'compact':
+        # Дельты компактного протокола общие для всех клиентов, выборки валют в них нет
+        emit('subscription_error', {
+            'error': "Subscriptions are not available with the compact protocol, set_protocol full first",
+            'timestamp': datetime.now().isoformat()
+        })
+        return
+    if currency_subscriptions.get(request.sid) is None and observer:
+        leave_room(observer.feed_room)
+    currency_subscriptions.subscribe(request.sid, subscription)
+
+    emit('subscribed', {
+        'observer_id': current_observer_id(),
+        **subscription.to_dict(),
+        'timestamp': datetime.now().isoformat()
+    })
+    handle_get_rates()
+
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe():
+    """Обработчик отмены подписки: снова все валюты"""
+    observer = currency_subject.get_client(request.sid)
+    if currency_subscriptions.unsubscribe(request.sid) and observer:
+        join_room(observer.feed_room)
+
+    emit('unsubscribed', {
+        'observer_id': current_observer_id(),
+        'timestamp': datetime.now().isoformat()
+    })
+    handle_get_rates()
+
+
+@socketio.on('set_alerts')
+def handle_set_alerts(data):
+    """Обработчик условий оповещения: {rules: [{currency, above, below, zscore, window}]}"""
+    try:
+        rules = parse_alert_rules(data or {}, currency_alerts.windows)
+    except (AttributeError, TypeError, ValueError) as e:
+        emit('alert_error', {
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        })
+        return
+
+    currency_alerts.set_rules(request.sid, rules)
+    emit('alerts_set', {
+        'observer_id': current_observer_id(),
+        'rules': [rule.to_dict() for rule in rules],
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@socketio.on('clear_alerts')
+def handle_clear_alerts():
+    """Обработчик отмены всех условий оповещения клиента"""
+    currency_alerts.clear(request.sid)
+    emit('alerts_cleared', {
+        'observer_id': current_observer_id(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+
 @socketio.on('set_interval')
 def handle_set_interval(data):
     """Обработчик изменения интервала мониторинга"""
     interval = data.get('interval', 30)
     currency_monitor.set_interval(interval)
 
-    client_id = None
-    for cid, observer in currency_subject._clients.items():
-        client_id = cid
-        break
+    client_id = current_observer_id()
 
     emit('interval_updated', {
         'observer_id': client_id,
@@ -319,6 +305,55 @@ def handle_set_interval(data):
     })
 
 
+@socketio.on('set_protocol')
+def handle_set_protocol(data):
+    """Обработчик выбора протокола: full или compact (rates_delta в msgpack/json)"""
+    data = data or {}
+    protocol = data.get('protocol', 'full')
+    encoding = data.get('encoding', 'msgpack') if protocol == 'compact' else None
+    observer = currency_subject.get_client(request.sid)
+
+    error = None
+    if protocol not in ('full', 'compact') or (encoding is not None and encoding not in COMPACT_ROOMS):
+        error = f"Unknown protocol {protocol}/{encoding}"
+    elif encoding == 'msgpack' and msgpack is None:
+        error = "msgpack is not installed on the server, use encoding json"
+    elif observer is None:
+        error = "Client is not registered"
+    elif protocol == 'compact' and currency_subscriptions.get(request.sid) is not None:
+        error = "Compact protocol is not available with a subscription, unsubscribe first"
+    if error:
+        emit('protocol_error', {'error': error, 'timestamp': datetime.now().isoformat()})
+        return
+
+    # Клиент с подпиской не состоит в комнате общей рассылки
+    subscribed = currency_subscriptions.get(request.sid) is not None
+    if not subscribed:
+        leave_room(observer.feed_room)
+    observer.protocol = protocol
+    observer.encoding = encoding
+    if not subscribed:
+        join_room(observer.feed_room)
+
+    emit('protocol', {
+        'observer_id': observer.observer_id,
+        'protocol': protocol,
+        'encoding': encoding,
+        'seq': currency_compact.seq
+    })
+    if protocol == 'compact':
+        handle_get_snapshot()
+
+
+@socketio.on('get_snapshot')
+def handle_get_snapshot():
+    """Обработчик запроса полного снимка курсов для компактного протокола"""
+    observer = currency_subject.get_client(request.sid)
+    encoding = observer.encoding if observer and observer.encoding else 'json'
+    currency_compact.load(currency_subject.fetch_currency_rates()['rates'])
+    emit('rates_snapshot', currency_compact.snapshot(encoding))
+
+
 @socketio.on('start_monitoring')
 def handle_start_monitoring():
     """Обработчик запуска мониторинга"""
@@ -340,11 +375,14 @@ def handle_stop_monitoring():
 
 if __name__ == '__main__':
     currency_monitor.start_monitoring()
+    send_queues.start()
     logger.info("Сервер запускается на http://localhost:5000")
     logger.info("Доступные endpoints:")
     logger.info("  /          - Главная страница с WebSocket подключением")
     logger.info("  /status    - Статус сервера")
     logger.info("  /api/rates - Текущие курсы валют (JSON API)")
+    logger.info("  /api/history?currency=USD&step=1h - История курса с агрегатами по интервалам")
+    logger.info("  /api/stats?currency=USD - Потоковая статистика курса: EWMA, окна, z-оценки")
     socketio.run(app,
                  host='0.0.0.0',
                  port=5000,
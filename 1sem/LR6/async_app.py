@@ -0,0 +1,681 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+import aiohttp
+import socketio
+from aiohttp import web
+
+from analytics import parse_alert_rules
+from cluster import CLUSTER_PREFIX, MESSAGE_QUEUE, ClusterNode
+from currency import (
+    CBR_ALL_CURRENCIES, CBR_API_URL, CBR_CACHE_TTL, COMPACT_ROOMS, CURRENCY_ROOM, DEFER_REPLACE, FULL_FEED_ROOM,
+    PROMETHEUS_CONTENT_TYPE, TRACKED_CURRENCIES, AlertObserver, CompactObserver, CurrencySubject, RatesCache,
+    RoomObserver, SendQueues, Subscription, SubscriptionObserver, currency_metrics, filter_currency_data,
+    history_response, msgpack, open_history, prometheus_text, registry_gauges, stats_response
+)
+from history import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+
+# Один цикл событий обслуживает HTTP, WebSocket клиентов, опрос API и рассылку:
+# неактивное соединение стоит памяти его сокета, а не отдельного потока.
+# С MESSAGE_QUEUE процессы кластера делят очередь сообщений Socket.IO: emit в
+# комнату или по sid из любого процесса доходит до клиента, где бы тот ни был подключен
+sio = socketio.AsyncServer(
+    async_mode='aiohttp', cors_allowed_origins="*",
+    client_manager=socketio.AsyncRedisManager(MESSAGE_QUEUE, channel=f"{CLUSTER_PREFIX}:socketio")
+    if MESSAGE_QUEUE else None
+)
+web_app = web.Application()
+sio.attach(web_app)
+routes = web.RouteTableDef()
+
+
+class AsyncRatesCache(RatesCache):
+    """RatesCache для asyncio: вызовы, пришедшие во время запроса к API, ждут его результат
+
+    Все вызовы выполняются в одном цикле событий, поэтому блокировка не нужна.
+    """
+
+    async def get(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Получить результат из кэша или дождаться общего запроса к API"""
+        if self._is_fresh(max_age):
+            self.stats['hits'] += 1
+            return self._value
+        if self._inflight is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self._inflight)
+
+        self.stats['upstream_requests'] += 1
+        inflight = self._inflight = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._loader()
+        except BaseException as e:
+            self._inflight = None
+            inflight.set_exception(e)
+            # Ошибка передана ожидающим; без них future не должна попасть в журнал asyncio
+            inflight.exception()
+            raise
+
+        self._value = value
+        self._loaded_at = time.monotonic()
+        self._inflight = None
+        inflight.set_result(value)
+        return value
+
+
+class AsyncCurrencySubject(CurrencySubject):
+    """CurrencySubject с запросами к API через aiohttp и асинхронными наблюдателями"""
+
+    def __init__(self, cache_ttl: float = CBR_CACHE_TTL,
+                 currencies: Optional[Iterable[str]] = TRACKED_CURRENCIES):
+        super().__init__(cache_ttl, currencies)
+        self._rates_cache = AsyncRatesCache(self._load_currency_rates_async, cache_ttl)
+        # Сессия создается в цикле событий при первом запросе
+        self._session: Optional[aiohttp.ClientSession] = None
+        # В кластере: публикация ответов API опрашивающим процессом
+        self.on_fetched: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        # Последний ответ, полученный от опрашивающего процесса, и до какого момента он актуален
+        self._remote: Optional[Dict[str, Any]] = None
+        self._remote_until = 0.0
+
+    async def notify(self, currency_data: Dict[str, Any]) -> None:
+        """Уведомить всех наблюдателей об изменении курсов"""
+        with self._observers_lock:
+            observers = list(self._observers.values())
+        for observer in observers:
+            await observer.update_async(currency_data)
+
+    async def fetch_currency_rates(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Получить текущие курсы валют (из кэша, если ответ API моложе max_age/TTL)
+
+        Процесс кластера отдает ответ, полученный от опрашивающего процесса;
+        к API он обращается сам, только если ответы перестали приходить.
+        """
+        if self._remote is not None and time.monotonic() < self._remote_until:
+            currency_data = self._remote
+        else:
+            currency_data = await self._rates_cache.get(max_age)
+        return dict(currency_data, observers_count=self.get_clients_count())
+
+    async def apply_remote(self, currency_data: Dict[str, Any], max_age: float) -> None:
+        """Принять ответ API, полученный опрашивающим процессом кластера
+
+        Курсы запоминаются так же, как после своего запроса: если этот процесс
+        станет опрашивающим, изменения найдутся относительно них. Новый
+        документ (с номером выборки) учитывается и в потоковой статистике.
+        """
+        rates = currency_data['rates']
+        self._codes, self._values = tuple(rates), array('d', rates.values())
+        if self.analytics is not None and currency_data.get('sample') is not None:
+            self.analytics.update(self._codes, self._values)
+        self._current_rates = rates
+        self._remote = currency_data
+        self._remote_until = time.monotonic() + max_age
+        if currency_data['changes']:
+            await self.notify(currency_data)
+
+    def drop_remote(self) -> None:
+        """Забыть ответ опрашивающего процесса: этот процесс опрашивает API сам"""
+        self._remote = None
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _load_currency_rates_async(self) -> Dict[str, Any]:
+        """Условный запрос курсов с API Центробанка, не блокирующий цикл событий"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        try:
+            async with self._session.get(CBR_API_URL, headers=self._conditional_headers()) as response:
+                if response.status == 304 and self._current_rates:
+                    result = self._not_modified_result()
+                else:
+                    response.raise_for_status()
+                    # Сервер ЦБ отдает JSON с Content-Type application/javascript
+                    data = await response.json(content_type=None)
+                    result = self._apply_feed(data, response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as e:
+            return self._error_result(e)
+
+        if self.on_fetched is not None:
+            await self.on_fetched(result)
+        if result['changes']:
+            logger.info(f"Обнаружены изменения курсов: {list(result['changes'].keys())}")
+            await self.notify(result)
+
+        return result
+
+
+class AsyncSendQueues(SendQueues):
+    """SendQueues для AsyncServer: досылка задачей asyncio в цикле событий сервера"""
+
+    def __init__(self, server: socketio.AsyncServer, **kwargs):
+        super().__init__(server, **kwargs)
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._drain_loop())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def emit(self, event: str, data: Any, room: Union[str, List[str]], namespace: str = '/',
+                   policy: str = DEFER_REPLACE) -> int:
+        """Отправить событие всем участникам комнаты, вернуть число получателей"""
+        encoded, recipients, ready = self.prepare(event, data, room, namespace, policy)
+        for eio_sid in ready:
+            for encoded_packet in encoded:
+                await self.server.eio.send(eio_sid, encoded_packet)
+        return recipients
+
+    async def drain(self) -> None:
+        """Дослать отложенное клиентам, которые догнали рассылку, и отключить безнадежно отставших"""
+        ready, lagging = self.collect()
+        for eio_sid, packets in ready:
+            for encoded_packet in packets:
+                await self.server.eio.send(eio_sid, encoded_packet)
+        for eio_sid in lagging:
+            logger.warning(f"Клиент {eio_sid} не принимает обновления дольше {self.max_lag} сек, отключение")
+            socket = self.server.eio.sockets.get(eio_sid)
+            if socket is not None:
+                await socket.close(wait=False, abort=True)
+                self.server.eio.sockets.pop(eio_sid, None)
+
+    async def _drain_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.drain_interval)
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.error(f"Ошибка досылки отложенных обновлений: {e}")
+
+
+class AsyncCurrencyMonitor:
+    """Периодическая проверка курсов задачей asyncio в цикле событий сервера
+
+    В кластере мониторинг включается и выключается во всех процессах, но
+    задача опроса выполняется только в опрашивающем; остальные в резерве (standby).
+    """
+
+    def __init__(self, subject: AsyncCurrencySubject, interval: int = 30, history: Optional[HistoryStore] = None,
+                 standby: bool = False):
+        self.subject = subject
+        self.interval = interval  # интервал в секундах
+        self.history = history
+        self.enabled = False
+        self.standby = standby
+        self.task: Optional[asyncio.Task] = None
+        self.stop_event = asyncio.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start_monitoring(self) -> None:
+        """Запустить мониторинг курсов валют задачей asyncio"""
+        self.enabled = True
+        if self.standby:
+            logger.info("Мониторинг включен, API опрашивает другой процесс кластера")
+            return
+        if self.is_running:
+            logger.info("Мониторинг уже запущен")
+            return
+
+        self.stop_event.clear()
+        self.task = asyncio.get_running_loop().create_task(self._monitoring_loop())
+        logger.info(f"Мониторинг курсов валют запущен (интервал: {self.interval} сек)")
+
+    async def stop_monitoring(self) -> None:
+        """Остановить мониторинг"""
+        self.enabled = False
+        await self._stop_task()
+
+    async def set_standby(self, standby: bool) -> None:
+        """Перевести в резерв или вернуть из него; включенный мониторинг продолжается"""
+        self.standby = standby
+        if standby:
+            await self._stop_task()
+        elif self.enabled:
+            self.start_monitoring()
+
+    async def _stop_task(self) -> None:
+        if self.is_running:
+            self.stop_event.set()
+            await self.task
+            if self.history is not None:
+                await asyncio.to_thread(self.history.flush)
+            logger.info("Мониторинг курсов валют остановлен")
+
+    async def _monitoring_loop(self) -> None:
+        """Цикл мониторинга"""
+        while not self.stop_event.is_set():
+            try:
+                currency_data = await self.subject.fetch_currency_rates(max_age=self.interval)
+                if self.history is not None:
+                    self.history.record(currency_data)
+                    # Запись в файлы выполняется в потоке, чтобы не задерживать рассылку
+                    await asyncio.to_thread(self.history.flush_if_due)
+
+                if not currency_data.get('changes'):
+                    logger.info(f"Проверка курсов завершена. Изменений нет. ({currency_data['timestamp']})")
+            except Exception as e:
+                logger.error(f"Ошибка в мониторинге: {e}")
+
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def set_interval(self, interval: int) -> None:
+        """Установить новый интервал мониторинга"""
+        self.interval = interval
+        logger.info(f"Интервал мониторинга изменен на {interval} сек")
+
+
+# Глобальные экземпляры: те же наблюдатели, что в app.py, рассылают через AsyncSendQueues.emit
+send_queues = AsyncSendQueues(sio)
+currency_subject = AsyncCurrencySubject(currencies=None if CBR_ALL_CURRENCIES else TRACKED_CURRENCIES)
+currency_subscriptions = SubscriptionObserver(send_queues.emit)
+currency_compact = CompactObserver(send_queues.emit)
+currency_subject.attach(RoomObserver(FULL_FEED_ROOM, send_queues.emit))
+currency_subject.attach(currency_subscriptions)
+currency_subject.attach(currency_compact)
+currency_alerts = AlertObserver(send_queues.emit, currency_subject.analytics)
+currency_subject.attach(currency_alerts)
+currency_history = open_history()
+currency_monitor = AsyncCurrencyMonitor(currency_subject, interval=30, history=currency_history,
+                                        standby=bool(MESSAGE_QUEUE))
+
+
+async def on_cluster_message(kind: str, data: Dict[str, Any]) -> None:
+    """Сообщение другого процесса кластера: ответ API или команда мониторинга"""
+    if kind == 'rates':
+        currency_monitor.interval = data['interval']
+        currency_history.record(data['currency_data'])
+        # Ответ актуален два интервала опроса; дольше - опрашивающий процесс недоступен
+        await currency_subject.apply_remote(data['currency_data'], max_age=2 * data['interval'])
+    elif kind == 'set_interval':
+        currency_monitor.set_interval(data['interval'])
+    elif kind == 'start_monitoring':
+        currency_monitor.start_monitoring()
+    elif kind == 'stop_monitoring':
+        await currency_monitor.stop_monitoring()
+
+
+async def on_cluster_role(leader: bool) -> None:
+    """Процесс стал опрашивающим или перестал им быть"""
+    if leader:
+        currency_subject.drop_remote()
+        # Файлы истории до этого дописывал другой процесс
+        restored = await asyncio.to_thread(currency_history.reload)
+        currency_history.read_only = False
+        if restored:
+            logger.info(f"В историю возвращено строк, не записанных прежним опрашивающим процессом: {restored}")
+    else:
+        currency_history.read_only = True
+    await currency_monitor.set_standby(not leader)
+
+
+async def publish_rates(currency_data: Dict[str, Any]) -> None:
+    """Опубликовать ответ API для остальных процессов, если опрашивает этот"""
+    if cluster_node.is_leader:
+        await cluster_node.publish('rates', {'currency_data': currency_data, 'interval': currency_monitor.interval})
+
+
+async def publish_command(command: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """Повторить команду мониторинга в остальных процессах кластера"""
+    if cluster_node is not None:
+        await cluster_node.publish(command, data or {})
+
+
+# Процесс кластера, если задан MESSAGE_QUEUE; без него сервер работает одним процессом
+cluster_node: Optional[ClusterNode] = None
+if MESSAGE_QUEUE:
+    cluster_node = ClusterNode(MESSAGE_QUEUE, on_cluster_message, on_cluster_role)
+    currency_subject.on_fetched = publish_rates
+    currency_history.read_only = True
+
+
+@routes.get('/')
+async def index(request: web.Request) -> web.StreamResponse:
+    """Главная страница"""
+    return web.FileResponse(TEMPLATE_PATH)
+
+
+@routes.get('/status')
+async def status(request: web.Request) -> web.Response:
+    """Статус сервера"""
+    return web.json_response({
+        'status': 'running',
+        'mode': 'asyncio',
+        'observers_count': currency_subject.get_clients_count(),
+        'monitoring_interval': currency_monitor.interval,
+        'is_monitoring': currency_monitor.is_running,
+        'rates_cache': currency_subject.get_cache_stats(),
+        'upstream': currency_subject.get_upstream_stats(),
+        'registry': registry_gauges(currency_subject, currency_subscriptions),
+        'history': currency_history.gauges(),
+        'send_queues': send_queues.gauges(),
+        'analytics': currency_subject.analytics.gauges() if currency_subject.analytics is not None else None,
+        'alerts': currency_alerts.gauges(),
+        'cluster': cluster_node.gauges() if cluster_node is not None else None,
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@routes.get('/metrics')
+async def metrics(request: web.Request) -> web.Response:
+    """Размеры реестров и счетчики кэша в текстовом формате Prometheus"""
+    gauges = currency_metrics(currency_subject, currency_subscriptions, currency_compact, currency_alerts,
+                              currency_history, send_queues)
+    gauges['currency_event_loop_tasks'] = ('gauge', 'Tasks of the asyncio event loop', len(asyncio.all_tasks()))
+    if cluster_node is not None:
+        gauges['currency_cluster_poller'] = ('gauge', 'Whether this process polls the CBR API',
+                                             int(cluster_node.is_leader))
+        for name in ('published', 'received'):
+            gauges[f'currency_cluster_{name}_total'] = ('counter', f'Cluster messages {name}',
+                                                        cluster_node.stats[name])
+    return web.Response(body=prometheus_text(gauges), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+
+@routes.get('/api/rates')
+async def get_rates(request: web.Request) -> web.Response:
+    """API для получения текущих курсов валют"""
+    return web.json_response(await currency_subject.fetch_currency_rates())
+
+
+@routes.get('/api/history')
+async def get_history(request: web.Request) -> web.Response:
+    """История курса валюты: /api/history?currency=USD&from=&to=&step=1h"""
+    body, status_code = history_response(currency_history, request.query)
+    return web.json_response(body, status=status_code)
+
+
+@routes.get('/api/stats')
+async def get_stats(request: web.Request) -> web.Response:
+    """Потоковая статистика курсов: /api/stats?currency=USD,EUR"""
+    body, status_code = stats_response(currency_subject.analytics, request.query)
+    return web.json_response(body, status=status_code)
+
+
+async def reply(event: str, data: Any, sid: str) -> None:
+    """Ответ клиенту, событие которого обрабатывается
+
+    Клиент подключен к этому процессу, поэтому пакет не идет через очередь сообщений кластера.
+    """
+    await sio.emit(event, data, to=sid, ignore_queue=True)
+
+
+def current_observer_id(sid: str) -> Optional[str]:
+    """Идентификатор наблюдателя клиента sid"""
+    observer = currency_subject.get_client(sid)
+    return observer.observer_id if observer else None
+
+
+@sio.on('connect')
+async def handle_connect(sid, environ):
+    """Обработчик подключения WebSocket клиента"""
+    observer = currency_subject.register_client(sid)
+    client_id = observer.observer_id
+    sio.enter_room(sid, CURRENCY_ROOM)
+    # Пока клиент не подписался на отдельные валюты, он получает все
+    sio.enter_room(sid, FULL_FEED_ROOM)
+
+    logger.debug(f"Клиент подключен: {client_id} (SID: {sid})")
+
+    await reply('connection_established', {
+        'observer_id': client_id,
+        'message': 'Вы успешно подключились к мониторингу курсов валют',
+        'timestamp': datetime.now().isoformat(),
+        'clients_count': currency_subject.get_clients_count()
+    }, sid)
+
+    currency_data = await currency_subject.fetch_currency_rates()
+    await reply('currency_data', {
+        'type': 'initial_data',
+        'observer_id': client_id,
+        'data': currency_data,
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+@sio.on('disconnect')
+async def handle_disconnect(sid):
+    """Обработчик отключения WebSocket клиента"""
+    observer = currency_subject.unregister_client(sid)
+    currency_subscriptions.unsubscribe(sid)
+    currency_alerts.clear(sid)
+
+    if observer:
+        logger.debug(f"Клиент отключен: {observer.observer_id}")
+
+        await send_queues.emit('clients_update', {
+            'clients_count': currency_subject.get_clients_count(),
+            'timestamp': datetime.now().isoformat()
+        }, CURRENCY_ROOM)
+
+
+@sio.on('get_rates')
+async def handle_get_rates(sid, data=None):
+    """Обработчик запроса текущих курсов"""
+    currency_data = await currency_subject.fetch_currency_rates()
+    subscription = currency_subscriptions.get(sid)
+    if subscription:
+        currency_data = filter_currency_data(currency_data, subscription.currencies)
+
+    await reply('currency_data', {
+        'type': 'current_rates',
+        'observer_id': current_observer_id(sid),
+        'data': currency_data,
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+@sio.on('subscribe')
+async def handle_subscribe(sid, data=None):
+    """Обработчик подписки на выбранные валюты с порогами изменения"""
+    try:
+        subscription = Subscription.from_request(data or {})
+    except (AttributeError, TypeError, ValueError) as e:
+        await reply('subscription_error', {
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }, sid)
+        return
+
+    observer = currency_subject.get_client(sid)
+    if observer and observer.protocol == 'compact':
+        # Дельты компактного протокола общие для всех клиентов, выборки валют в них нет
+        await reply('subscription_error', {
+            'error': "Subscriptions are not available with the compact protocol, set_protocol full first",
+            'timestamp': datetime.now().isoformat()
+        }, sid)
+        return
+    if currency_subscriptions.get(sid) is None and observer:
+        sio.leave_room(sid, observer.feed_room)
+    currency_subscriptions.subscribe(sid, subscription)
+
+    await reply('subscribed', {
+        'observer_id': current_observer_id(sid),
+        **subscription.to_dict(),
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+    await handle_get_rates(sid)
+
+
+@sio.on('unsubscribe')
+async def handle_unsubscribe(sid, data=None):
+    """Обработчик отмены подписки: снова все валюты"""
+    observer = currency_subject.get_client(sid)
+    if currency_subscriptions.unsubscribe(sid) and observer:
+        sio.enter_room(sid, observer.feed_room)
+
+    await reply('unsubscribed', {
+        'observer_id': current_observer_id(sid),
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+    await handle_get_rates(sid)
+
+
+@sio.on('set_alerts')
+async def handle_set_alerts(sid, data=None):
+    """Обработчик условий оповещения: {rules: [{currency, above, below, zscore, window}]}"""
+    try:
+        rules = parse_alert_rules(data or {}, currency_alerts.windows)
+    except (AttributeError, TypeError, ValueError) as e:
+        await reply('alert_error', {
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }, sid)
+        return
+
+    currency_alerts.set_rules(sid, rules)
+    await reply('alerts_set', {
+        'observer_id': current_observer_id(sid),
+        'rules': [rule.to_dict() for rule in rules],
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+@sio.on('clear_alerts')
+async def handle_clear_alerts(sid, data=None):
+    """Обработчик отмены всех условий оповещения клиента"""
+    currency_alerts.clear(sid)
+    await reply('alerts_cleared', {
+        'observer_id': current_observer_id(sid),
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+@sio.on('set_interval')
+async def handle_set_interval(sid, data):
+    """Обработчик изменения интервала мониторинга"""
+    interval = data.get('interval', 30)
+    currency_monitor.set_interval(interval)
+    await publish_command('set_interval', {'interval': interval})
+
+    await reply('interval_updated', {
+        'observer_id': current_observer_id(sid),
+        'interval': interval,
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+@sio.on('set_protocol')
+async def handle_set_protocol(sid, data=None):
+    """Обработчик выбора протокола: full или compact (rates_delta в msgpack/json)"""
+    data = data or {}
+    protocol = data.get('protocol', 'full')
+    encoding = data.get('encoding', 'msgpack') if protocol == 'compact' else None
+    observer = currency_subject.get_client(sid)
+
+    error = None
+    if protocol not in ('full', 'compact') or (encoding is not None and encoding not in COMPACT_ROOMS):
+        error = f"Unknown protocol {protocol}/{encoding}"
+    elif encoding == 'msgpack' and msgpack is None:
+        error = "msgpack is not installed on the server, use encoding json"
+    elif observer is None:
+        error = "Client is not registered"
+    elif protocol == 'compact' and currency_subscriptions.get(sid) is not None:
+        error = "Compact protocol is not available with a subscription, unsubscribe first"
+    if error:
+        await reply('protocol_error', {'error': error, 'timestamp': datetime.now().isoformat()}, sid)
+        return
+
+    # Клиент с подпиской не состоит в комнате общей рассылки
+    subscribed = currency_subscriptions.get(sid) is not None
+    if not subscribed:
+        sio.leave_room(sid, observer.feed_room)
+    observer.protocol = protocol
+    observer.encoding = encoding
+    if not subscribed:
+        sio.enter_room(sid, observer.feed_room)
+
+    await reply('protocol', {
+        'observer_id': observer.observer_id,
+        'protocol': protocol,
+        'encoding': encoding,
+        'seq': currency_compact.seq
+    }, sid)
+    if protocol == 'compact':
+        await handle_get_snapshot(sid)
+
+
+@sio.on('get_snapshot')
+async def handle_get_snapshot(sid, data=None):
+    """Обработчик запроса полного снимка курсов для компактного протокола"""
+    observer = currency_subject.get_client(sid)
+    encoding = observer.encoding if observer and observer.encoding else 'json'
+    currency_compact.load((await currency_subject.fetch_currency_rates())['rates'])
+    await reply('rates_snapshot', currency_compact.snapshot(encoding), sid)
+
+
+@sio.on('start_monitoring')
+async def handle_start_monitoring(sid, data=None):
+    """Обработчик запуска мониторинга"""
+    currency_monitor.start_monitoring()
+    await publish_command('start_monitoring')
+    await reply('monitoring_started', {
+        'interval': currency_monitor.interval,
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+@sio.on('stop_monitoring')
+async def handle_stop_monitoring(sid, data=None):
+    """Обработчик остановки мониторинга"""
+    await currency_monitor.stop_monitoring()
+    await publish_command('stop_monitoring')
+    await reply('monitoring_stopped', {
+        'timestamp': datetime.now().isoformat()
+    }, sid)
+
+
+async def on_startup(application: web.Application) -> None:
+    currency_monitor.start_monitoring()
+    send_queues.start()
+    if cluster_node is not None:
+        cluster_node.start()
+
+
+async def on_cleanup(application: web.Application) -> None:
+    await currency_monitor.stop_monitoring()
+    await send_queues.stop()
+    if cluster_node is not None:
+        await cluster_node.stop()
+    await currency_subject.close()
+
+
+web_app.add_routes(routes)
+web_app.on_startup.append(on_startup)
+web_app.on_cleanup.append(on_cleanup)
+
+
+def main():
+    """Сервер курсов валют на asyncio: aiohttp + python-socketio AsyncServer"""
+    parser = argparse.ArgumentParser(description="Currency observer server running on a single asyncio event loop")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    logger.info(f"Сервер (asyncio) запускается на http://localhost:{args.port}")
+    web.run_app(web_app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
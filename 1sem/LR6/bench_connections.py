@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import aiohttp
+
+NAMESPACE_CONNECT = "40"
+PING = "2"
+PONG = "3"
+
+
+class IdleClient:
+    """Неактивный Socket.IO клиент на сыром WebSocket engine.io
+
+    Отвечает на ping сервера и запоминает время получения обновлений курсов;
+    python-socketio клиент на каждое соединение был бы в разы тяжелее.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.updates: List[float] = []
+
+    async def run(self, session: aiohttp.ClientSession, url: str, ready: asyncio.Event) -> None:
+        try:
+            async with session.ws_connect(url, heartbeat=None, autoping=True) as ws:
+                await ws.receive()  # пакет open engine.io
+                await ws.send_str(NAMESPACE_CONNECT)
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    data = message.data
+                    if data == PING:
+                        await ws.send_str(PONG)
+                    elif data.startswith(NAMESPACE_CONNECT):
+                        self.connected = True
+                        ready.set()
+                    elif '"currency_update"' in data:
+                        self.updates.append(time.perf_counter())
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            ready.set()
+
+
+def process_stats(pids: List[int]) -> Dict[str, Any]:
+    """Память и число потоков процессов сервера из /proc, в сумме по процессам"""
+    if not pids:
+        return {}
+    stats = {"rss_mb": 0.0, "threads": 0}
+    for pid in pids:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name == "VmRSS":
+                    stats["rss_mb"] += int(value.split()[0]) / 1024
+                elif name == "Threads":
+                    stats["threads"] += int(value)
+    stats["rss_mb"] = round(stats["rss_mb"], 1)
+    return stats
+
+
+async def run(urls: List[str], clients: int, batch: int, hold: float, pids: List[int]) -> Dict[str, Any]:
+    # Клиенты распределяются по адресам по кругу, как балансировщиком перед процессами кластера
+    ws_urls = [url.replace("http", "ws", 1).rstrip("/") + "/socket.io/?EIO=4&transport=websocket" for url in urls]
+    before = process_stats(pids)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        idle = [IdleClient() for _ in range(clients)]
+        tasks = []
+        start = time.perf_counter()
+        # Подключение пачками, чтобы не переполнить очередь accept сервера
+        for offset in range(0, clients, batch):
+            events = []
+            for client in idle[offset:offset + batch]:
+                ready = asyncio.Event()
+                events.append(ready)
+                ws_url = ws_urls[len(tasks) % len(ws_urls)]
+                tasks.append(asyncio.create_task(client.run(session, ws_url, ready)))
+            await asyncio.gather(*(event.wait() for event in events))
+        connect_time = time.perf_counter() - start
+        connected = sum(client.connected for client in idle)
+        after = process_stats(pids)
+
+        hold_start = time.perf_counter()
+        await asyncio.sleep(hold)
+        still_connected = sum(not task.done() for task in tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    first_updates = sorted(client.updates[0] for client in idle if client.updates and client.updates[0] >= hold_start)
+    result = {
+        "clients": clients,
+        "servers": len(urls),
+        "connected": connected,
+        "still_connected_after_hold": still_connected,
+        "connect_seconds": round(connect_time, 2),
+        "clients_with_updates": sum(bool(client.updates) for client in idle),
+        "server_before": before,
+        "server_after": after,
+    }
+    if first_updates:
+        # Разброс времени получения одного и того же обновления всеми клиентами
+        result["update_spread_ms"] = round((first_updates[-1] - first_updates[0]) * 1000, 1)
+    if before.get("rss_mb") is not None and connected:
+        result["server_kb_per_connection"] = round((after["rss_mb"] - before["rss_mb"]) * 1024 / connected, 1)
+    return result
+
+
+def main():
+    """Сколько неактивных WebSocket соединений держит сервер и во что они обходятся"""
+    parser = argparse.ArgumentParser(description="Open many idle websocket clients against the currency server")
+    parser.add_argument("--url", default="http://localhost:5000",
+                        help="comma separated server URLs, e.g. the workers of cluster.py")
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=500, help="connections opened concurrently")
+    parser.add_argument("--hold", type=float, default=30.0, help="seconds to keep the connections open")
+    parser.add_argument("--server-pid", default="",
+                        help="comma separated server pids to read memory and threads from /proc")
+    args = parser.parse_args()
+
+    pids = [int(pid) for pid in args.server_pid.split(",") if pid]
+    print(json.dumps(asyncio.run(run(args.url.split(","), args.clients, args.batch, args.hold, pids))))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
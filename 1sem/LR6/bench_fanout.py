@@ -0,0 +1,153 @@
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+import app
+import currency
+from currency import COMPACT_ROOMS, CURRENCY_ROOM, CompactObserver, RoomObserver, Subscription, SubscriptionObserver
+
+NAMESPACE = '/'
+CURRENCIES = ['USD', 'EUR', 'GBP', 'CNY', 'JPY', 'CHF', 'CAD']
+
+
+class SendCounter:
+    """Подмена engineio send: считает отправленные пакеты и байты вместо сети"""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+
+    def __call__(self, eio_sid: str, data: Any) -> None:
+        self.packets += 1
+        self.bytes += len(data)
+
+
+def add_fake_clients(count: int, room: str = CURRENCY_ROOM) -> List[str]:
+    """Зарегистрировать count клиентов без соединений и добавить их в комнату room"""
+    manager = app.socketio.server.manager
+    sids = []
+    for i in range(count):
+        sid = manager.connect(f"fake-eio-{i}", NAMESPACE)
+        manager.enter_room(sid, NAMESPACE, room)
+        sids.append(sid)
+    return sids
+
+
+def remove_fake_clients(sids: List[str]) -> None:
+    manager = app.socketio.server.manager
+    for sid in sids:
+        manager.disconnect(sid, NAMESPACE)
+
+
+def sample_data() -> Dict[str, Any]:
+    """Сообщение того же размера, что и ответ fetch_currency_rates"""
+    rates = {code: 90.0 + i for i, code in enumerate(CURRENCIES)}
+    return {
+        'timestamp': '2025-01-01T00:00:00',
+        'rates': rates,
+        'changes': {code: {'old_rate': rate - 1, 'new_rate': rate, 'change': 1.0, 'change_percent': 1.1}
+                    for code, rate in rates.items()},
+        'previous_rates': {code: rate - 1 for code, rate in rates.items()},
+        'observers_count': 0
+    }
+
+
+def fanout_room(sids: List[str], data: Dict[str, Any]) -> None:
+    """Текущая рассылка: RoomObserver, один пакет на всех"""
+    RoomObserver(CURRENCY_ROOM, app.send_queues.emit).update(data)
+
+
+def subscribe_clients(sids: List[str], size: int, seed: int = 1) -> SubscriptionObserver:
+    """Подписать каждого клиента на size случайных валют"""
+    rng = random.Random(seed)
+    observer = SubscriptionObserver(app.send_queues.emit)
+    for sid in sids:
+        observer.subscribe(sid, Subscription({code: 0.0 for code in rng.sample(CURRENCIES, size)}))
+    return observer
+
+
+def fanout_per_sid(sids: List[str], data: Dict[str, Any]) -> None:
+    """Отдельный emit каждому клиенту: пакет кодируется для каждого"""
+    for sid in sids:
+        app.socketio.emit('currency_data', {'type': 'currency_update', 'data': data}, to=sid)
+
+
+def fanout_legacy(sids: List[str], data: Dict[str, Any]) -> None:
+    """Прежняя рассылка: каждый наблюдатель делал emit всем клиентам, затем еще broadcast"""
+    for sid in sids:
+        app.socketio.emit('currency_data', {'type': 'currency_update', 'observer_id': sid, 'data': data})
+    app.socketio.emit('currency_update', {'type': 'broadcast_update', 'data': data})
+
+
+MODES: Dict[str, Callable[[List[str], Dict[str, Any]], None]] = {
+    'room': fanout_room,
+    'per_sid': fanout_per_sid,
+    'legacy': fanout_legacy,
+    'subscribed': None,
+    'compact': None,
+}
+
+
+def measure(mode: str, clients: int, rounds: int, subscription_size: int = 2) -> Dict[str, Any]:
+    """Время одной рассылки и число пакетов на клиента"""
+    server = app.socketio.server
+    counter = SendCounter()
+    original_send = server.eio.send
+    server.eio.send = counter
+    sids = add_fake_clients(clients, COMPACT_ROOMS['msgpack'] if mode == 'compact' else CURRENCY_ROOM)
+    data = sample_data()
+    fanout = MODES[mode]
+    if mode == 'compact':
+        # rates_delta в MessagePack; seq растет на каждой рассылке
+        fanout = lambda sids, data: CompactObserver(app.send_queues.emit).update(data)
+    if mode == 'subscribed':
+        # Клиенты с подписками на subscription_size валют, меняются все валюты
+        observer = subscribe_clients(sids, subscription_size)
+        fanout = lambda sids, data: observer.update(data)
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fanout(sids, data)
+        elapsed = (time.perf_counter() - start) / rounds
+    finally:
+        server.eio.send = original_send
+        remove_fake_clients(sids)
+
+    result = {
+        'mode': mode,
+        'clients': clients,
+        'ms_per_update': round(elapsed * 1000, 3),
+        'us_per_client': round(elapsed / clients * 1e6, 3),
+        'packets_per_client': round(counter.packets / rounds / clients, 2),
+        'bytes_per_update': counter.bytes // rounds,
+    }
+    if mode == 'subscribed':
+        result['subscription_size'] = subscription_size
+    return result
+
+
+def main():
+    """Сравнение стоимости рассылки обновления курсов при росте числа клиентов"""
+    parser = argparse.ArgumentParser(description="Fan-out benchmark with simulated websocket clients")
+    parser.add_argument("--clients", default="1000,2000,4000,8000", help="comma separated client counts")
+    parser.add_argument("--modes", default="room,per_sid,legacy,subscribed,compact")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--legacy-max-clients", type=int, default=1000,
+                        help="legacy mode is quadratic, larger counts are skipped")
+    parser.add_argument("--subscription-size", type=int, default=2,
+                        help="currencies per client in subscribed mode")
+    args = parser.parse_args()
+
+    app.logger.setLevel("WARNING")
+    currency.logger.setLevel("WARNING")
+    for clients in (int(value) for value in args.clients.split(",")):
+        for mode in args.modes.split(","):
+            if mode == 'legacy' and clients > args.legacy_max_clients:
+                continue
+            print(json.dumps(measure(mode, clients, args.rounds, args.subscription_size)))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,156 @@
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Код валюты: (номинал, курс, название) - начальные значения заглушки
+BASE_CURRENCIES: Dict[str, Tuple[int, float, str]] = {
+    'USD': (1, 81.5, "Доллар США"),
+    'EUR': (1, 94.7, "Евро"),
+    'GBP': (1, 108.9, "Фунт стерлингов"),
+    'CNY': (1, 11.4, "Юань"),
+    'JPY': (100, 54.8, "Иен"),
+    'CHF': (1, 101.2, "Швейцарский франк"),
+    'CAD': (1, 58.9, "Канадский доллар"),
+    'AUD': (1, 53.6, "Австралийский доллар"),
+    'BYN': (1, 27.4, "Белорусский рубль"),
+    'KZT': (100, 15.2, "Тенге"),
+    'TRY': (10, 19.6, "Турецких лир"),
+    'INR': (100, 92.8, "Индийских рупий"),
+}
+
+
+class StubFeed:
+    """Документ daily_json.js, курсы которого меняются раз в change_interval секунд
+
+    Версия документа меняется только вместе с курсами, поэтому условные
+    запросы между изменениями получают 304.
+    """
+
+    def __init__(self, change_interval: float = 300.0, extra_currencies: int = 0,
+                 change_share: float = 0.3, seed: int = 1):
+        self.change_interval = change_interval
+        self.change_share = change_share
+        self._rng = random.Random(seed)
+        self._lock = Lock()
+        self.currencies = {code: [nominal, value, name] for code, (nominal, value, name) in BASE_CURRENCIES.items()}
+        for i in range(extra_currencies):
+            self.currencies[f"X{i:03d}"] = [1, round(self._rng.uniform(1, 200), 4), f"Валюта {i}"]
+        self.previous = {code: value for code, (_, value, _) in self.currencies.items()}
+        self.version = 0
+        self._publish()
+
+    def _publish(self) -> None:
+        self.version += 1
+        self.changed_at = time.time()
+        self.etag = f'"cbr-stub-{self.version}"'
+        self.last_modified = format_datetime(datetime.fromtimestamp(int(self.changed_at), timezone.utc), usegmt=True)
+        self.body = json.dumps(self.document(), ensure_ascii=False).encode('utf-8')
+
+    def document(self) -> Dict[str, Any]:
+        """Документ в формате https://www.cbr-xml-daily.ru/daily_json.js"""
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            'Date': now,
+            'PreviousDate': now,
+            'Timestamp': now,
+            'Valute': {
+                code: {
+                    'ID': f"R{i:05d}",
+                    'CharCode': code,
+                    'Nominal': nominal,
+                    'Name': name,
+                    'Value': value,
+                    'Previous': self.previous[code],
+                }
+                for i, (code, (nominal, value, name)) in enumerate(self.currencies.items())
+            },
+        }
+
+    def refresh(self) -> None:
+        """Изменить часть курсов, если с прошлого изменения прошло change_interval секунд"""
+        with self._lock:
+            if time.time() - self.changed_at < self.change_interval:
+                return
+            self.previous = {code: value for code, (_, value, _) in self.currencies.items()}
+            for code in self.currencies:
+                if self._rng.random() < self.change_share:
+                    value = self.currencies[code][1]
+                    self.currencies[code][1] = round(value * (1 + self._rng.uniform(-0.01, 0.01)), 4)
+            self._publish()
+            logger.info(f"Курсы изменены, версия {self.version}")
+
+    def not_modified(self, etag: Optional[str], since: Optional[str]) -> bool:
+        """Есть ли у клиента текущая версия документа"""
+        if etag is not None:
+            return etag == self.etag
+        if since is not None:
+            try:
+                return parsedate_to_datetime(since).timestamp() >= int(self.changed_at)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def make_handler(feed: StubFeed):
+    class StubHandler(BaseHTTPRequestHandler):
+        """Отдает feed.body по /daily_json.js, на условный запрос без изменений - 304"""
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/daily_json.js':
+                self.send_error(404)
+                return
+            feed.refresh()
+            if feed.not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+                self.send_response(304)
+                self.send_header('ETag', feed.etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/javascript; charset=utf-8')
+            self.send_header('Content-Length', str(len(feed.body)))
+            self.send_header('ETag', feed.etag)
+            self.send_header('Last-Modified', feed.last_modified)
+            self.end_headers()
+            self.wfile.write(feed.body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return StubHandler
+
+
+def main():
+    """Локальная заглушка API ЦБ для запуска без сети: CBR_API_URL=http://localhost:8090/daily_json.js"""
+    parser = argparse.ArgumentParser(description="Offline stub of the CBR daily_json.js feed")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--change-interval", type=float, default=300.0,
+                        help="seconds between rate changes")
+    parser.add_argument("--change-share", type=float, default=0.3,
+                        help="share of currencies changed each time")
+    parser.add_argument("--extra-currencies", type=int, default=0,
+                        help="synthetic currencies X000... added to the feed")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    feed = StubFeed(args.change_interval, args.extra_currencies, args.change_share, args.seed)
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(feed))
+    logger.info(f"Заглушка API ЦБ: http://localhost:{args.port}/daily_json.js "
+                f"({len(feed.currencies)} валют, изменения раз в {args.change_interval} сек)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
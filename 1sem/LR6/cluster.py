@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:
+    aioredis = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Адрес Redis (redis://host:port/db); пустой - сервер работает одним процессом
+MESSAGE_QUEUE = os.environ.get("MESSAGE_QUEUE", "")
+# Префикс каналов и ключей Redis: несколько кластеров могут делить один Redis
+CLUSTER_PREFIX = os.environ.get("CLUSTER_PREFIX", "currency")
+# Срок аренды роли опрашивающего, сек; аренда продлевается каждую треть срока
+LEADER_TTL = float(os.environ.get("LEADER_TTL", "10"))
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+RoleHandler = Callable[[bool], Awaitable[None]]
+
+
+class PollerElection:
+    """Аренда роли опрашивающего процесса: ключ Redis со своим node_id и сроком жизни
+
+    Ключ захватывается SET NX PX и продлевается SET XX PX, пока в нем свой
+    node_id. Проверка и продление - две команды, поэтому аренда продлевается
+    задолго до истечения: иначе между ними ключ мог бы перейти к другому процессу.
+    """
+
+    def __init__(self, redis, key: str, node_id: str, ttl: float = LEADER_TTL):
+        self.redis = redis
+        self.key = key
+        self.node_id = node_id
+        self.ttl = ttl
+
+    async def campaign(self) -> bool:
+        """Захватить или продлить аренду; True, если опрашивает этот процесс"""
+        ttl_ms = int(self.ttl * 1000)
+        if await self.redis.set(self.key, self.node_id, nx=True, px=ttl_ms):
+            return True
+        if await self.redis.get(self.key) != self.node_id.encode():
+            return False
+        return bool(await self.redis.set(self.key, self.node_id, xx=True, px=ttl_ms))
+
+    async def resign(self) -> None:
+        """Освободить аренду, чтобы другой процесс не ждал истечения срока"""
+        if await self.redis.get(self.key) == self.node_id.encode():
+            await self.redis.delete(self.key)
+
+
+class ClusterNode:
+    """Процесс кластера серверов курсов, связанный с остальными через Redis
+
+    Процесс, выигравший выборы, опрашивает API и публикует каждый ответ в
+    канал <prefix>:events; остальные получают ответы из канала и рассылают
+    изменения своим клиентам, не обращаясь к API. Команды клиентов, меняющие
+    мониторинг, публикуются туда же и применяются всеми процессами, чтобы
+    следующий опрашивающий продолжил с теми же настройками. Свои сообщения
+    процессу не доставляются.
+    """
+
+    def __init__(self, url: str, on_message: MessageHandler, on_role_change: RoleHandler,
+                 prefix: str = CLUSTER_PREFIX, ttl: float = LEADER_TTL):
+        if aioredis is None:
+            raise RuntimeError("MESSAGE_QUEUE requires the redis package (pip install redis)")
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.redis = aioredis.Redis.from_url(url)
+        self.channel = f"{prefix}:events"
+        self.election = PollerElection(self.redis, f"{prefix}:poller", self.node_id, ttl)
+        self.on_message = on_message
+        self.on_role_change = on_role_change
+        self.is_leader = False
+        self.stats: Dict[str, int] = {'published': 0, 'received': 0, 'elections_won': 0}
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Подписаться на канал и начать выборы задачами asyncio"""
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._listen()), loop.create_task(self._campaign())]
+
+    async def stop(self) -> None:
+        """Остановить задачи и освободить роль опрашивающего"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.is_leader:
+            await self._set_role(False)
+            try:
+                await self.election.resign()
+            except RedisError as e:
+                logger.error(f"Не удалось освободить роль опрашивающего: {e}")
+        await self.redis.aclose()
+
+    async def publish(self, kind: str, data: Dict[str, Any]) -> None:
+        """Опубликовать сообщение для остальных процессов кластера"""
+        message = json.dumps({'node': self.node_id, 'kind': kind, 'data': data}, ensure_ascii=False)
+        try:
+            await self.redis.publish(self.channel, message)
+            self.stats['published'] += 1
+        except RedisError as e:
+            logger.error(f"Ошибка публикации в {self.channel}: {e}")
+
+    def gauges(self) -> Dict[str, Any]:
+        """Роль процесса и счетчики сообщений для /status и /metrics"""
+        return {'node': self.node_id, 'role': 'poller' if self.is_leader else 'worker', **self.stats}
+
+    async def _set_role(self, leader: bool) -> None:
+        self.is_leader = leader
+        if leader:
+            self.stats['elections_won'] += 1
+        logger.info(f"Процесс {self.node_id}: {'опрашивает API' if leader else 'получает курсы из очереди'}")
+        await self.on_role_change(leader)
+
+    async def _campaign(self) -> None:
+        """Каждую треть срока аренды захватывать или продлевать роль опрашивающего"""
+        while True:
+            try:
+                leader = await self.election.campaign()
+            except RedisError as e:
+                # Без Redis аренду не продлить: после истечения срока опрашивать начнет другой процесс
+                logger.error(f"Ошибка выборов опрашивающего: {e}")
+                leader = False
+            if leader != self.is_leader:
+                await self._set_role(leader)
+            await asyncio.sleep(self.election.ttl / 3)
+
+    async def _listen(self) -> None:
+        """Получать сообщения других процессов; после обрыва соединения подписаться снова"""
+        retry = 1
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                retry = 1
+                async for message in pubsub.listen():
+                    await self._dispatch(message['data'])
+            except RedisError as e:
+                logger.error(f"Подписка на {self.channel} потеряна: {e}, повтор через {retry} сек")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, 30)
+
+    async def _dispatch(self, raw: bytes) -> None:
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Сообщение в {self.channel} не в формате JSON")
+            return
+        if message.get('node') == self.node_id:
+            return
+        self.stats['received'] += 1
+        try:
+            await self.on_message(message['kind'], message['data'])
+        except Exception as e:
+            logger.error(f"Ошибка обработки сообщения {message.get('kind')} от {message.get('node')}: {e}")
+
+
+def wait_for_port(host: str, port: int, timeout: float = 5.0) -> bool:
+    """Дождаться, пока порт начнет принимать соединения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main():
+    """Несколько процессов async_app.py на соседних портах с общим Redis
+
+    Каждый процесс держит своих клиентов; балансировщик перед ними должен
+    закреплять клиента за процессом (sticky sessions), как требует Socket.IO
+    при транспорте polling.
+    """
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run several asyncio currency servers sharing one Redis")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--base-port", type=int, default=5001, help="worker i listens on base-port + i")
+    parser.add_argument("--message-queue", default=MESSAGE_QUEUE or None,
+                        help="redis://host:port/db shared by the workers")
+    parser.add_argument("--local-redis", type=int, default=None, metavar="PORT",
+                        help="start redis_stub.py on PORT instead of using a Redis server")
+    args = parser.parse_args()
+
+    processes: List[subprocess.Popen] = []
+    url: Optional[str] = args.message_queue
+    if args.local_redis is not None:
+        processes.append(subprocess.Popen([sys.executable, 'redis_stub.py', '--port', str(args.local_redis)],
+                                          cwd=APP_DIR))
+        url = f"redis://localhost:{args.local_redis}/0"
+        if not wait_for_port('127.0.0.1', args.local_redis):
+            processes[0].terminate()
+            sys.exit("redis_stub.py did not start")
+    if not url:
+        sys.exit("Set --message-queue, MESSAGE_QUEUE or --local-redis")
+
+    env = dict(os.environ, MESSAGE_QUEUE=url)
+    for i in range(args.workers):
+        port = args.base_port + i
+        processes.append(subprocess.Popen([sys.executable, 'async_app.py', '--host', args.host, '--port', str(port)],
+                                          cwd=APP_DIR, env=env))
+    logger.info(f"Запущено процессов: {args.workers}, порты {args.base_port}-{args.base_port + args.workers - 1}, "
+                f"очередь сообщений {url}")
+    # docker stop и systemd останавливают SIGTERM: процессы кластера завершаются, как по Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    running = list(processes)
+    try:
+        # Остальные процессы продолжают работу: роль опрашивающего перейдет к одному из них
+        while running:
+            time.sleep(1)
+            for process in [process for process in running if process.poll() is not None]:
+                running.remove(process)
+                logger.warning(f"Процесс {process.pid} ({' '.join(process.args[1:])}) "
+                               f"завершился с кодом {process.returncode}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Сначала процессы сервера, затем заглушка Redis: при остановке они освобождают роль опрашивающего
+        for group in (processes[-args.workers:], processes[:-args.workers]):
+            for process in group:
+                process.terminate()
+            for process in group:
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
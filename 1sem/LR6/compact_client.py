@@ -0,0 +1,111 @@
+import argparse
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import socketio
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CompactRatesClient:
+    """Клиент компактного протокола: применяет rates_delta и восстанавливается по снимку
+
+    Изменения приходят с номером seq. Если номер идет не подряд (клиент
+    пропустил сообщение), клиент запрашивает get_snapshot и до его получения
+    не применяет изменения.
+    """
+
+    def __init__(self, url: str, encoding: str = 'msgpack',
+                 on_update: Optional[Callable[[Dict[str, float], Dict[str, float]], None]] = None):
+        self.url = url
+        self.encoding = encoding
+        self.on_update = on_update
+        self.rates: Dict[str, float] = {}
+        self.seq: Optional[int] = None
+        self.resyncs = 0
+        self.received_bytes = 0
+
+        self.sio = socketio.Client()
+        self.sio.on('connect', self._on_connect)
+        self.sio.on('protocol_error', self._on_protocol_error)
+        self.sio.on('rates_snapshot', self._on_snapshot)
+        self.sio.on('rates_delta', self._on_delta)
+
+    def connect(self) -> None:
+        self.sio.connect(self.url)
+
+    def disconnect(self) -> None:
+        self.sio.disconnect()
+
+    def wait(self) -> None:
+        self.sio.wait()
+
+    def _decode(self, payload: Any) -> List[Any]:
+        if isinstance(payload, (bytes, bytearray)):
+            self.received_bytes += len(payload)
+            return msgpack.unpackb(payload)
+        self.received_bytes += len(json.dumps(payload, separators=(',', ':')))
+        return payload
+
+    def _on_connect(self) -> None:
+        self.seq = None
+        self.sio.emit('set_protocol', {'protocol': 'compact', 'encoding': self.encoding})
+
+    def _on_protocol_error(self, data: Dict[str, Any]) -> None:
+        logger.error(f"Сервер отклонил протокол: {data['error']}")
+
+    def _on_snapshot(self, payload: Any) -> None:
+        seq, _, rates = self._decode(payload)
+        self.seq = seq
+        self.rates = dict(rates)
+        logger.info(f"Снимок курсов seq={seq}: {self.rates}")
+
+    def _on_delta(self, payload: Any) -> None:
+        seq, _, changed = self._decode(payload)
+        if self.seq is None or seq <= self.seq:
+            # Ждем снимок или это изменение уже вошло в полученный снимок
+            return
+        if seq != self.seq + 1:
+            logger.warning(f"Пропущены изменения {self.seq + 1}..{seq - 1}, запрашивается снимок")
+            self.resync()
+            return
+
+        self.seq = seq
+        self.rates.update(changed)
+        if self.on_update:
+            self.on_update(self.rates, changed)
+
+    def resync(self) -> None:
+        """Запросить полный снимок курсов"""
+        self.resyncs += 1
+        self.seq = None
+        self.sio.emit('get_snapshot')
+
+
+def main():
+    """Вывод изменений курсов, полученных по компактному протоколу"""
+    parser = argparse.ArgumentParser(description="Currency client of the compact rates_delta protocol")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--encoding", choices=["msgpack", "json"], default="msgpack" if msgpack else "json")
+    args = parser.parse_args()
+
+    def print_update(rates: Dict[str, float], changed: Dict[str, float]) -> None:
+        logger.info(f"Изменились курсы: {changed}")
+
+    client = CompactRatesClient(args.url, args.encoding, on_update=print_update)
+    client.connect()
+    try:
+        client.wait()
+    except KeyboardInterrupt:
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
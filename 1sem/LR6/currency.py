@@ -0,0 +1,1199 @@
+import atexit
+import itertools
+import logging
+import os
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+from socketio import packet
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from analytics import AlertRule, StreamingStats
+from history import HistoryStore, parse_duration, parse_time
+
+logger = logging.getLogger(__name__)
+
+
+CBR_API_URL = os.environ.get("CBR_API_URL", "https://www.cbr-xml-daily.ru/daily_json.js")
+
+# Валюты, курсы которых отслеживаются по умолчанию
+TRACKED_CURRENCIES = ('USD', 'EUR', 'GBP', 'CNY', 'JPY', 'CHF', 'CAD')
+# CBR_ALL_CURRENCIES=1 - отслеживать все валюты раздела Valute ответа API
+CBR_ALL_CURRENCIES = os.environ.get("CBR_ALL_CURRENCIES", "") == "1"
+# Наименьшее изменение курса, о котором уведомляются наблюдатели
+CHANGE_THRESHOLD = 0.0001
+
+# Сколько секунд ответ API ЦБ считается свежим: все клиенты в течение этого
+# времени получают один и тот же результат без новых запросов к API
+CBR_CACHE_TTL = float(os.environ.get("CBR_CACHE_TTL", "10"))
+# Ошибка запроса кэшируется короче, чтобы быстрее повторить попытку
+CBR_ERROR_TTL = float(os.environ.get("CBR_ERROR_TTL", "2"))
+
+# Комната Socket.IO, в которую входят все WebSocket клиенты
+CURRENCY_ROOM = "currency_observers"
+# Клиенты без подписки получают все курсы через эту комнату
+FULL_FEED_ROOM = "currency_full_feed"
+# Комнаты клиентов компактного протокола, по одной на кодировку
+COMPACT_ROOMS = {
+    'msgpack': "currency_compact_msgpack",
+    'json': "currency_compact_json",
+}
+
+# Сколько пакетов может ждать в очереди сокета engine.io клиента; сверх этого
+# обновления клиенту откладываются по правилу события (DEFER_*)
+SEND_QUEUE_LIMIT = int(os.environ.get("SEND_QUEUE_LIMIT", "8"))
+# Клиент, отстающий дольше стольких секунд, отключается
+SEND_QUEUE_MAX_LAG = float(os.environ.get("SEND_QUEUE_MAX_LAG", "30"))
+# Как часто досылаются отложенные обновления, сек
+SEND_QUEUE_DRAIN_INTERVAL = float(os.environ.get("SEND_QUEUE_DRAIN_INTERVAL", "0.5"))
+
+# Что делать с обновлением отстающего клиента, если то же событие уже отложено:
+# полное состояние заменяет отложенное, currency_data с частью валют
+# объединяется с ним по валютам, оповещения и дельты копятся в очередь
+DEFER_REPLACE = 'replace'
+DEFER_MERGE = 'merge'
+DEFER_QUEUE = 'queue'
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RatesCache:
+    """Кэш результата запроса курсов с временем жизни и объединением запросов
+
+    Если кэш устарел, первый вызов выполняет запрос к API, а вызовы, пришедшие
+    во время запроса, ждут его результат (single-flight). Поэтому к API уходит
+    не больше одного запроса за ttl секунд при любом числе клиентов.
+    """
+
+    def __init__(self, loader: Callable[[], Dict[str, Any]], ttl: float = CBR_CACHE_TTL,
+                 error_ttl: float = CBR_ERROR_TTL):
+        self._loader = loader
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._value: Optional[Dict[str, Any]] = None
+        self._loaded_at = 0.0
+        self._inflight: Optional[Future] = None
+        self._lock = Lock()
+        self.stats: Dict[str, int] = {'hits': 0, 'coalesced': 0, 'upstream_requests': 0}
+
+    def _is_fresh(self, max_age: Optional[float]) -> bool:
+        if self._value is None:
+            return False
+        ttl = self.error_ttl if 'error' in self._value else self.ttl
+        if max_age is not None:
+            ttl = min(ttl, max_age)
+        return time.monotonic() - self._loaded_at < ttl
+
+    def get(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Получить результат из кэша или дождаться общего запроса к API"""
+        with self._lock:
+            if self._is_fresh(max_age):
+                self.stats['hits'] += 1
+                return self._value
+            inflight = self._inflight
+            if inflight is None:
+                inflight = self._inflight = Future()
+                self.stats['upstream_requests'] += 1
+                leader = True
+            else:
+                self.stats['coalesced'] += 1
+                leader = False
+
+        if not leader:
+            return inflight.result()
+
+        try:
+            value = self._loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight = None
+            inflight.set_exception(e)
+            raise
+
+        with self._lock:
+            self._value = value
+            self._loaded_at = time.monotonic()
+            self._inflight = None
+        inflight.set_result(value)
+        return value
+
+    def invalidate(self) -> None:
+        """Сбросить кэш: следующий вызов get выполнит запрос к API"""
+        with self._lock:
+            self._value = None
+
+
+class ObserverRegistry:
+    """Потокобезопасный реестр WebSocket клиентов по sid Socket.IO
+
+    Добавление, удаление и поиск клиента - O(1); размер реестра совпадает
+    с числом реальных подключений, отключенные клиенты в нем не остаются.
+    """
+
+    def __init__(self):
+        self._by_sid: Dict[str, 'WebSocketClient'] = {}
+        self._lock = Lock()
+        self._ids = itertools.count(1)
+        self.peak = 0
+        self.registered_total = 0
+        self.unregistered_total = 0
+
+    def __len__(self) -> int:
+        return len(self._by_sid)
+
+    def next_id(self) -> str:
+        """Уникальный идентификатор клиента для показа на странице"""
+        return f"observer_{next(self._ids)}"
+
+    def add(self, client: 'WebSocketClient') -> None:
+        """Добавить клиента; повторное подключение с тем же sid заменяет запись"""
+        with self._lock:
+            self._by_sid[client.sid] = client
+            self.registered_total += 1
+            self.peak = max(self.peak, len(self._by_sid))
+
+    def remove(self, sid: str) -> Optional['WebSocketClient']:
+        """Удалить клиента по sid, None если его нет"""
+        with self._lock:
+            client = self._by_sid.pop(sid, None)
+            if client is not None:
+                self.unregistered_total += 1
+            return client
+
+    def get(self, sid: str) -> Optional['WebSocketClient']:
+        """Найти клиента по sid"""
+        return self._by_sid.get(sid)
+
+    def gauges(self) -> Dict[str, int]:
+        """Размер реестра и счетчики подключений"""
+        with self._lock:
+            return {
+                'clients': len(self._by_sid),
+                'clients_peak': self.peak,
+                'registered_total': self.registered_total,
+                'unregistered_total': self.unregistered_total
+            }
+
+
+def parse_valute(valute: Dict[str, Dict[str, Any]],
+                 currencies: Optional[Iterable[str]] = None) -> Tuple[Tuple[str, ...], array]:
+    """Коды валют и курсы за одну единицу (Value / Nominal) из раздела Valute ответа ЦБ
+
+    currencies=None - все валюты ответа; валюты списка, которых нет в ответе, пропускаются.
+    """
+    if currencies is None:
+        codes = tuple(valute)
+    else:
+        codes = tuple(code for code in currencies if code in valute)
+    return codes, array('d', [valute[code]['Value'] / valute[code]['Nominal'] for code in codes])
+
+
+def changed_indexes(old_values: array, new_values: array, threshold: float = CHANGE_THRESHOLD) -> List[int]:
+    """Номера курсов, изменившихся больше чем на threshold
+
+    С numpy разности считаются одной операцией над массивами (frombuffer
+    не копирует данные array); без numpy - циклом по парам значений.
+    """
+    if numpy is not None:
+        differences = numpy.abs(numpy.frombuffer(new_values) - numpy.frombuffer(old_values))
+        return numpy.flatnonzero(differences > threshold).tolist()
+    return [i for i, (old, new) in enumerate(zip(old_values, new_values)) if abs(new - old) > threshold]
+
+
+class CurrencySubject:
+    """Субъект (Subject) для отслеживания изменений курсов валют"""
+
+    def __init__(self, cache_ttl: float = CBR_CACHE_TTL,
+                 currencies: Optional[Iterable[str]] = TRACKED_CURRENCIES):
+        # Наблюдатели по observer_id: O(1) присоединение и отсоединение
+        self._observers: Dict[str, CurrencyObserver] = {}
+        self._observers_lock = Lock()
+        # None - все валюты ответа API
+        self.currencies = tuple(currencies) if currencies is not None else None
+        self._current_rates: Dict[str, float] = {}
+        # Последние курсы в порядке кодов: сравниваются с новыми без словарей
+        self._codes: Tuple[str, ...] = ()
+        self._values = array('d')
+        self._clients = ObserverRegistry()
+        self._rates_cache = RatesCache(self._load_currency_rates, cache_ttl)
+        # Условные запросы: ответ API не скачивается и не разбирается, пока он не изменился
+        self._http = requests.Session()
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._upstream_stats: Dict[str, int] = {'modified': 0, 'not_modified': 0}
+        # Потоковая статистика курсов для /api/stats и оповещений; без numpy не ведется
+        self.analytics: Optional[StreamingStats] = StreamingStats() if numpy is not None else None
+
+    def attach(self, observer: 'CurrencyObserver') -> None:
+        """Присоединить наблюдателя к субъекту"""
+        with self._observers_lock:
+            if observer.observer_id in self._observers:
+                return
+            self._observers[observer.observer_id] = observer
+        logger.info(f"Наблюдатель {observer.observer_id} присоединен")
+
+    def detach(self, observer: 'CurrencyObserver') -> None:
+        """Отсоединить наблюдателя от субъекта"""
+        with self._observers_lock:
+            if self._observers.pop(observer.observer_id, None) is None:
+                return
+        logger.info(f"Наблюдатель {observer.observer_id} отсоединен")
+
+    def notify(self, currency_data: Dict[str, Any]) -> None:
+        """Уведомить всех наблюдателей об изменении курсов"""
+        with self._observers_lock:
+            observers = list(self._observers.values())
+        for observer in observers:
+            observer.update(currency_data)
+
+    def register_client(self, sid: str) -> 'WebSocketClient':
+        """Зарегистрировать WebSocket клиента с sid Socket.IO
+
+        Уведомления клиенту рассылает наблюдатель его комнаты, а объект
+        WebSocketClient нужен для ответов этому клиенту.
+        """
+        client = WebSocketClient(self._clients.next_id(), sid)
+        self._clients.add(client)
+        return client
+
+    def unregister_client(self, sid: str) -> Optional['WebSocketClient']:
+        """Удалить WebSocket клиента, вернуть его запись или None"""
+        return self._clients.remove(sid)
+
+    def get_client(self, sid: str) -> Optional['WebSocketClient']:
+        """Найти клиента по sid"""
+        return self._clients.get(sid)
+
+    def get_clients_count(self) -> int:
+        """Получить количество подключенных клиентов"""
+        return len(self._clients)
+
+    def get_registry_gauges(self) -> Dict[str, int]:
+        """Размеры реестров наблюдателей и клиентов"""
+        gauges = self._clients.gauges()
+        gauges['observers'] = len(self._observers)
+        return gauges
+
+    def fetch_currency_rates(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Получить текущие курсы валют (из кэша, если ответ API моложе max_age/TTL)"""
+        currency_data = self._rates_cache.get(max_age)
+        return dict(currency_data, observers_count=self.get_clients_count())
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Статистика кэша: попадания, объединенные вызовы и запросы к API"""
+        return dict(self._rates_cache.stats)
+
+    def get_upstream_stats(self) -> Dict[str, int]:
+        """Ответы API: с новыми данными (200) и без изменений (304)"""
+        return dict(self._upstream_stats)
+
+    def _load_currency_rates(self) -> Dict[str, Any]:
+        """Запросить курсы валют с API Центробанка
+
+        Запрос условный (If-None-Match / If-Modified-Since): пока данные не
+        изменились, API отвечает 304 без тела, и курсы не разбираются заново.
+        Изменения считаются один раз на каждый ответ API, и наблюдатели
+        уведомляются здесь же: кто бы ни вызвал запрос, изменение не потеряется.
+        """
+        try:
+            response = self._http.get(CBR_API_URL, headers=self._conditional_headers(), timeout=10)
+            if response.status_code == 304 and self._current_rates:
+                return self._not_modified_result()
+            response.raise_for_status()
+            result = self._apply_feed(response.json(), response.headers)
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            return self._error_result(e)
+
+        if result['changes']:
+            logger.info(f"Обнаружены изменения курсов: {list(result['changes'].keys())}")
+            self.notify(result)
+
+        return result
+
+    def _conditional_headers(self) -> Dict[str, str]:
+        """Заголовки условного запроса по ETag и Last-Modified прошлого ответа"""
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+        return headers
+
+    def _not_modified_result(self) -> Dict[str, Any]:
+        """Результат ответа 304: курсы прежние, изменений нет"""
+        self._upstream_stats['not_modified'] += 1
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'rates': self._current_rates,
+            'changes': {},
+            'previous_rates': self._current_rates,
+            'observers_count': self.get_clients_count()
+        }
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Результат неудачного запроса: последние известные курсы и текст ошибки"""
+        logger.error(f"Ошибка при получении данных: {error}")
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'rates': self._current_rates,
+            'changes': {},
+            'error': str(error),
+            'observers_count': self.get_clients_count()
+        }
+
+    def _apply_feed(self, data: Dict[str, Any], headers) -> Dict[str, Any]:
+        """Разобрать новый ответ API, найти изменения, обновить статистику и запомнить курсы
+
+        Общая часть синхронного и асинхронного (async_app.py) запросов;
+        наблюдатели уведомляются вызывающим.
+        """
+        codes, values = parse_valute(data['Valute'], self.currencies)
+        self._upstream_stats['modified'] += 1
+        self._etag = headers.get('ETag')
+        self._last_modified = headers.get('Last-Modified')
+
+        changes = self._check_changes(codes, values)
+        currencies = dict(zip(codes, values))
+
+        result = {
+            'timestamp': datetime.now().isoformat(),
+            'rates': currencies,
+            'changes': changes,
+            'previous_rates': self._current_rates,
+            'observers_count': self.get_clients_count()
+        }
+        if self.analytics is not None:
+            # Номер выборки: по нему процессы кластера учитывают в статистике только новые документы
+            result['sample'] = self.analytics.update(codes, values)
+
+        self._codes, self._values = codes, values
+        self._current_rates = currencies
+        return result
+
+    def _check_changes(self, codes: Tuple[str, ...], values: array) -> Dict[str, Dict[str, float]]:
+        """Проверить изменения курсов валют
+
+        Валюты, которых не было в прошлом ответе, не считаются изменившимися.
+        """
+        if codes == self._codes:
+            old_values = self._values
+        else:
+            # Набор валют изменился: прошлые курсы выравниваются по новым кодам
+            previous = dict(zip(self._codes, self._values))
+            old_values = array('d', [previous.get(code, value) for code, value in zip(codes, values)])
+
+        changes = {}
+        for i in changed_indexes(old_values, values):
+            old_rate, new_rate = old_values[i], values[i]
+            changes[codes[i]] = {
+                'old_rate': old_rate,
+                'new_rate': new_rate,
+                'change': new_rate - old_rate,
+                'change_percent': ((new_rate - old_rate) / old_rate) * 100
+            }
+
+        return changes
+
+
+class CurrencyObserver:
+    """Абстрактный класс наблюдателя"""
+
+    def __init__(self, observer_id: str):
+        self.observer_id = observer_id
+
+    def update(self, currency_data: Dict[str, Any]) -> None:
+        """Обновить данные наблюдателя"""
+        raise NotImplementedError
+
+    async def update_async(self, currency_data: Dict[str, Any]) -> None:
+        """Обновить данные наблюдателя в цикле событий (async_app.py)"""
+        raise NotImplementedError
+
+
+class WebSocketClient:
+    """Подключенный WebSocket клиент
+
+    Клиент не присоединяется к субъекту: обновления курсов ему рассылает
+    наблюдатель комнаты feed_room через SendQueues, а observer_id
+    показывается на странице.
+    """
+
+    def __init__(self, observer_id: str, sid: str):
+        self.observer_id = observer_id
+        self.sid = sid
+        # Протокол рассылки: full - полные сообщения currency_data,
+        # compact - rates_delta в кодировке encoding
+        self.protocol = 'full'
+        self.encoding: Optional[str] = None
+
+    @property
+    def feed_room(self) -> str:
+        """Комната общей рассылки для выбранного протокола"""
+        if self.protocol == 'compact':
+            return COMPACT_ROOMS[self.encoding]
+        return FULL_FEED_ROOM
+
+
+class DeferredEvent:
+    """Отложенные сообщения одного события отстающего клиента
+
+    replace хранит последнее сообщение, merge - объединенные данные
+    currency_data (кодируются при досылке), queue - до limit сообщений, при
+    переполнении отбрасывается самое старое.
+    """
+
+    def __init__(self, event: str, policy: str, data: Any, packets: List[Any], namespace: str, limit: int):
+        self.event = event
+        self.namespace = namespace
+        self.limit = limit
+        self._set(policy, data, packets)
+
+    def _set(self, policy: str, data: Any, packets: List[Any]) -> None:
+        self.policy = policy
+        self.data = data if policy != DEFER_QUEUE else None
+        if policy == DEFER_QUEUE:
+            self.packets: Any = deque([packets], maxlen=self.limit)
+        else:
+            self.packets = packets if policy == DEFER_REPLACE else None
+
+    def add(self, policy: str, data: Any, packets: List[Any]) -> str:
+        """Добавить более новое сообщение, вернуть, что с ним сделано: queued, dropped, merged или replaced"""
+        if policy == DEFER_QUEUE and self.policy == DEFER_QUEUE:
+            dropped = len(self.packets) == self.limit
+            self.packets.append(packets)
+            return 'dropped' if dropped else 'queued'
+        if policy == DEFER_MERGE and self.data is not None:
+            # Часть валют поверх отложенного (в том числе полного) currency_data
+            self.policy = DEFER_MERGE
+            self.data = merge_currency_message(self.data, data)
+            self.packets = None
+            return 'merged'
+        self._set(policy, data, packets)
+        return 'replaced'
+
+    def encoded(self, server) -> List[Any]:
+        """Пакеты engine.io для досылки в порядке поступления сообщений"""
+        if self.policy == DEFER_QUEUE:
+            return [item for packets in self.packets for item in packets]
+        if self.packets is None:
+            self.packets = encode_event(server, self.event, self.data, self.namespace)
+        return self.packets
+
+    def size(self) -> int:
+        """Число отложенных пакетов (объединенное сообщение считается одним)"""
+        if self.policy == DEFER_QUEUE:
+            return sum(len(packets) for packets in self.packets)
+        return len(self.packets) if self.packets is not None else 1
+
+
+class SendQueues:
+    """Ограниченные исходящие очереди клиентов для рассылки обновлений
+
+    engine.io кладет каждый пакет в неограниченную очередь сокета клиента,
+    которую разбирает отдельный писатель. Если клиент не успевает читать, в
+    ней копятся устаревшие обновления. Рассылка передает пакет в сокет, только
+    пока в его очереди не больше limit пакетов; иначе сообщение откладывается
+    в слот клиента по имени события (DeferredEvent). Следующее сообщение того
+    же события заменяет отложенное, объединяется с ним или встает в очередь -
+    по правилу, с которым его разослали (DEFER_*). drain досылает отложенное,
+    когда очередь сокета опустела, и отключает клиентов, отстающих дольше
+    max_lag.
+
+    emit рассылает событие из потоков app.py; AsyncSendQueues в async_app.py
+    делает то же в цикле событий.
+    """
+
+    def __init__(self, server, limit: int = SEND_QUEUE_LIMIT, max_lag: float = SEND_QUEUE_MAX_LAG,
+                 drain_interval: float = SEND_QUEUE_DRAIN_INTERVAL):
+        self.server = server
+        self.limit = limit
+        self.max_lag = max_lag
+        self.drain_interval = drain_interval
+        # eio_sid отстающего клиента: [с какого момента отстает, {событие: DeferredEvent}]
+        self._pending: Dict[str, List[Any]] = {}
+        self._lock = Lock()
+        self.stats: Dict[str, int] = {'sent': 0, 'deferred': 0, 'replaced': 0, 'merged': 0, 'queued': 0,
+                                      'dropped': 0, 'resent': 0, 'disconnected': 0}
+        self.thread = None
+        self.stop_event = Event()
+
+    def route(self, eio_sids: Iterable[str], event: str, packets: List[Any], data: Any = None,
+              policy: str = DEFER_REPLACE, namespace: str = '/') -> List[str]:
+        """Клиенты, которым пакеты события можно отправить сразу; отстающим сообщение откладывается"""
+        ready = []
+        sockets = self.server.eio.sockets
+        limit = self.limit - len(packets)
+        with self._lock:
+            for eio_sid in eio_sids:
+                pending = self._pending.get(eio_sid)
+                if pending is None:
+                    socket = sockets.get(eio_sid)
+                    if socket is None or socket.queue.qsize() <= limit:
+                        ready.append(eio_sid)
+                        continue
+                    pending = self._pending[eio_sid] = [time.monotonic(), {}]
+                slots = pending[1]
+                slot = slots.get(event)
+                if slot is None:
+                    slots[event] = DeferredEvent(event, policy, data, packets, namespace, self.limit)
+                    self.stats['deferred'] += 1
+                else:
+                    self.stats[slot.add(policy, data, packets)] += 1
+            self.stats['sent'] += len(ready)
+        return ready
+
+    def prepare(self, event: str, data: Any, room: Union[str, List[str]], namespace: str = '/',
+                policy: str = DEFER_REPLACE) -> Tuple[List[Any], int, List[str]]:
+        """Пакеты события, закодированные один раз, число получателей и клиенты, которым их можно отправить сразу
+
+        room - комната или список комнат (sid клиента - тоже комната).
+        socketio.emit(..., to=room) кодирует пакет заново для каждого получателя.
+        """
+        if not room or namespace not in self.server.manager.rooms:
+            return [], 0, []
+        encoded = encode_event(self.server, event, data, namespace)
+        # Список получателей фиксируется до отправки: обработчики disconnect меняют комнаты
+        participants = [eio_sid for _, eio_sid in self.server.manager.get_participants(namespace, room)]
+        return encoded, len(participants), self.route(participants, event, encoded, data, policy, namespace)
+
+    def emit(self, event: str, data: Any, room: Union[str, List[str]], namespace: str = '/',
+             policy: str = DEFER_REPLACE) -> int:
+        """Отправить событие всем участникам комнаты, вернуть число получателей"""
+        encoded, recipients, ready = self.prepare(event, data, room, namespace, policy)
+        for eio_sid in ready:
+            for encoded_packet in encoded:
+                self.server.eio.send(eio_sid, encoded_packet)
+        return recipients
+
+    def collect(self) -> Tuple[List[Tuple[str, List[Any]]], List[str]]:
+        """Отложенные пакеты клиентов, чья очередь опустела, и клиенты, отстающие дольше max_lag"""
+        caught_up, lagging = [], []
+        sockets = self.server.eio.sockets
+        now = time.monotonic()
+        with self._lock:
+            for eio_sid, (since, slots) in list(self._pending.items()):
+                socket = sockets.get(eio_sid)
+                if socket is None or socket.closed:
+                    del self._pending[eio_sid]
+                elif socket.queue.qsize() == 0:
+                    del self._pending[eio_sid]
+                    caught_up.append((eio_sid, list(slots.values())))
+                elif now - since > self.max_lag:
+                    del self._pending[eio_sid]
+                    lagging.append(eio_sid)
+            self.stats['resent'] += len(caught_up)
+            self.stats['disconnected'] += len(lagging)
+        # Объединенные сообщения кодируются здесь, вне блокировки
+        ready = [(eio_sid, [item for slot in slots for item in slot.encoded(self.server)])
+                 for eio_sid, slots in caught_up]
+        return ready, lagging
+
+    def gauges(self) -> Dict[str, Any]:
+        """Глубина очередей: отстающие клиенты, отложенные пакеты и пакеты в сокетах engine.io"""
+        now = time.monotonic()
+        with self._lock:
+            pending = [(since, list(slots.values())) for since, slots in self._pending.values()]
+        depths = [socket.queue.qsize() for socket in list(self.server.eio.sockets.values())]
+        return {
+            'clients_behind': len(pending),
+            'deferred_packets': sum(slot.size() for _, slots in pending for slot in slots),
+            'max_lag_seconds': round(max((now - since for since, _ in pending), default=0.0), 3),
+            'socket_queue_packets': sum(depths),
+            'socket_queue_max': max(depths, default=0),
+            **self.stats,
+        }
+
+    def start(self) -> None:
+        """Досылать отложенное в отдельном потоке"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._drain_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread and self.thread.is_alive():
+            self.stop_event.set()
+            self.thread.join()
+
+    def drain(self) -> None:
+        """Дослать отложенное клиентам, которые догнали рассылку, и отключить безнадежно отставших"""
+        ready, lagging = self.collect()
+        for eio_sid, packets in ready:
+            for encoded_packet in packets:
+                self.server.eio.send(eio_sid, encoded_packet)
+        for eio_sid in lagging:
+            logger.warning(f"Клиент {eio_sid} не принимает обновления дольше {self.max_lag} сек, отключение")
+            socket = self.server.eio.sockets.get(eio_sid)
+            if socket is not None:
+                # Без ожидания очереди: писатель сокета может висеть на записи клиенту
+                socket.close(wait=False, abort=True)
+                self.server.eio.sockets.pop(eio_sid, None)
+
+    def _drain_loop(self) -> None:
+        while not self.stop_event.wait(self.drain_interval):
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Ошибка досылки отложенных обновлений: {e}")
+
+
+def encode_event(server, event: str, data: Any, namespace: str = '/') -> List[Any]:
+    """Пакеты engine.io события Socket.IO: один текстовый или заголовок и бинарные вложения"""
+    encoded = server.packet_class(packet.EVENT, namespace=namespace, data=[event, data]).encode()
+    return encoded if isinstance(encoded, list) else [encoded]
+
+
+def filter_currency_data(currency_data: Dict[str, Any], currencies: Iterable[str]) -> Dict[str, Any]:
+    """Данные о курсах только по перечисленным валютам"""
+    currencies = list(currencies)
+    filtered = dict(currency_data)
+    for key in ('rates', 'changes', 'previous_rates'):
+        if key in currency_data:
+            values = currency_data[key]
+            filtered[key] = {currency: values[currency] for currency in currencies if currency in values}
+    return filtered
+
+
+def merge_currency_data(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Объединить два обновления курсов по валютам
+
+    Курсы берутся из более нового обновления, прошлые курсы - из более
+    старого, изменение валюты считается от курса до первого из них.
+    Валюты, изменившиеся только в одном обновлении, сохраняются.
+    """
+    merged = dict(newer)
+    merged['rates'] = {**older.get('rates', {}), **newer.get('rates', {})}
+    merged['previous_rates'] = {**newer.get('previous_rates', {}), **older.get('previous_rates', {})}
+    changes = dict(older.get('changes') or {})
+    for currency, change in (newer.get('changes') or {}).items():
+        old_rate = changes[currency]['old_rate'] if currency in changes else change['old_rate']
+        new_rate = change['new_rate']
+        changes[currency] = {
+            'old_rate': old_rate,
+            'new_rate': new_rate,
+            'change': new_rate - old_rate,
+            'change_percent': ((new_rate - old_rate) / old_rate) * 100
+        }
+    merged['changes'] = changes
+    return merged
+
+
+def merge_currency_message(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Объединить два сообщения currency_data: данные по валютам, остальное из более нового"""
+    return dict(newer, data=merge_currency_data(older['data'], newer['data']))
+
+
+class Subscription:
+    """Подписка клиента: валюты и порог изменения курса в процентах для каждой"""
+
+    def __init__(self, thresholds: Dict[str, float]):
+        self.thresholds = thresholds
+
+    @classmethod
+    def from_request(cls, data: Dict[str, Any]) -> 'Subscription':
+        """Разобрать событие subscribe: {currencies: [...], threshold: 0.1, thresholds: {USD: 0.5}}"""
+        currencies = data.get('currencies') or []
+        if not isinstance(currencies, list) or not currencies:
+            raise ValueError("currencies must be a non-empty list")
+        default = float(data.get('threshold', 0))
+        overrides = data.get('thresholds') or {}
+
+        thresholds = {}
+        for code in currencies:
+            code = str(code).upper()
+            if len(code) != 3 or not code.isalpha():
+                raise ValueError(f"Invalid currency code: {code}")
+            thresholds[code] = float(overrides.get(code, default))
+        if any(value < 0 for value in thresholds.values()):
+            raise ValueError("threshold must not be negative")
+        return cls(thresholds)
+
+    @property
+    def currencies(self) -> List[str]:
+        return list(self.thresholds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'currencies': self.currencies, 'thresholds': self.thresholds}
+
+
+# Сообщение рассылки: событие, данные и комната или список sid получателей
+Message = Tuple[str, Any, Union[str, List[str]]]
+
+
+class BroadcastObserver(CurrencyObserver):
+    """Наблюдатель, рассылающий сообщения клиентам функцией send
+
+    Сообщения строит messages, одинаково для обоих серверов. update отправляет
+    их через SendQueues.emit из потоков app.py, update_async - через
+    AsyncSendQueues.emit в цикле событий async_app.py.
+    """
+
+    # Правило откладывания сообщений для отстающих клиентов (DEFER_*)
+    policy = DEFER_REPLACE
+
+    def __init__(self, observer_id: str, send: Callable[..., Union[int, Awaitable[int]]]):
+        super().__init__(observer_id)
+        self.send = send
+
+    def messages(self, currency_data: Dict[str, Any]) -> List[Message]:
+        """Сообщения для рассылки по уведомлению"""
+        raise NotImplementedError
+
+    def sent(self, messages: List[Message], recipients: int) -> None:
+        """Учесть разосланные сообщения и число получателей"""
+
+    def update(self, currency_data: Dict[str, Any]) -> None:
+        """Разослать сообщения уведомления"""
+        messages = self.messages(currency_data)
+        recipients = 0
+        for event, data, room in messages:
+            try:
+                recipients += self.send(event, data, room, policy=self.policy)
+            except Exception as e:
+                logger.error(f"Ошибка рассылки {event} ({self.observer_id}): {e}")
+        if messages:
+            self.sent(messages, recipients)
+
+    async def update_async(self, currency_data: Dict[str, Any]) -> None:
+        """Разослать сообщения уведомления в цикле событий"""
+        messages = self.messages(currency_data)
+        recipients = 0
+        for event, data, room in messages:
+            try:
+                recipients += await self.send(event, data, room, policy=self.policy)
+            except Exception as e:
+                logger.error(f"Ошибка рассылки {event} ({self.observer_id}): {e}")
+        if messages:
+            self.sent(messages, recipients)
+
+
+class RoomObserver(BroadcastObserver):
+    """Наблюдатель-группа: одно сообщение для всех WebSocket клиентов комнаты
+
+    Сообщение сериализуется один раз за уведомление и отправляется каждому
+    клиенту ровно один раз, стоимость рассылки линейна по числу клиентов.
+    """
+
+    def __init__(self, room: str, send: Callable[..., Union[int, Awaitable[int]]]):
+        super().__init__(f"room:{room}", send)
+        self.room = room
+
+    @staticmethod
+    def message(currency_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Сообщение currency_data с обновлением для всей комнаты"""
+        return {
+            'type': 'currency_update',
+            'data': currency_data,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def messages(self, currency_data: Dict[str, Any]) -> List[Message]:
+        """Одно обновление всем клиентам комнаты"""
+        return [('currency_data', self.message(currency_data), self.room)]
+
+    def sent(self, messages: List[Message], recipients: int) -> None:
+        logger.info(f"Обновление курсов отправлено {recipients} клиентам")
+
+
+class CompactObserver(BroadcastObserver):
+    """Рассылка изменений в компактном протоколе
+
+    Каждое уведомление получает следующий номер seq. Клиентам уходит
+    rates_delta [seq, время в секундах Unix, {валюта: новый курс}] только по
+    изменившимся валютам, в MessagePack (бинарное вложение Socket.IO) или
+    JSON. Сообщение кодируется один раз на кодировку. Клиент, у которого
+    seq идет не подряд, запрашивает rates_snapshot с полным набором курсов.
+    """
+
+    # Отстающий клиент получит дельты подряд; лишние отбрасываются, и по пропуску seq он запросит снимок
+    policy = DEFER_QUEUE
+
+    def __init__(self, send: Callable[..., Union[int, Awaitable[int]]]):
+        super().__init__("compact", send)
+        self.seq = 0
+        self._rates: Dict[str, float] = {}
+        self._updated_at = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def encode(message: List[Any], encoding: str) -> Any:
+        """MessagePack передается как bytes, JSON - как список"""
+        if encoding == 'msgpack':
+            return msgpack.packb(message)
+        return message
+
+    def load(self, rates: Dict[str, float]) -> None:
+        """Заполнить курсы для снимка, если уведомлений еще не было"""
+        with self._lock:
+            if not self._rates:
+                self._rates = dict(rates)
+                self._updated_at = int(time.time())
+
+    def snapshot(self, encoding: str) -> Any:
+        """Полный набор курсов с текущим seq"""
+        with self._lock:
+            message = [self.seq, self._updated_at, dict(self._rates)]
+        return self.encode(message, encoding)
+
+    def next_delta(self, currency_data: Dict[str, Any]) -> Optional[List[Any]]:
+        """Запомнить курсы и вернуть rates_delta со следующим seq (None без изменений)"""
+        changes = currency_data.get('changes') or {}
+        if not changes:
+            return None
+        with self._lock:
+            self._rates.update(currency_data['rates'])
+            self.seq += 1
+            self._updated_at = int(time.time())
+            return [self.seq, self._updated_at, {currency: change['new_rate'] for currency, change in changes.items()}]
+
+    @staticmethod
+    def rooms() -> Iterable[Tuple[str, str]]:
+        """Кодировки, доступные на сервере, и их комнаты"""
+        return ((encoding, room) for encoding, room in COMPACT_ROOMS.items()
+                if encoding != 'msgpack' or msgpack is not None)
+
+    def messages(self, currency_data: Dict[str, Any]) -> List[Message]:
+        """rates_delta со следующим seq в комнату каждой кодировки"""
+        message = self.next_delta(currency_data)
+        if message is None:
+            return []
+        return [('rates_delta', self.encode(message, encoding), room) for encoding, room in self.rooms()]
+
+
+class SubscriptionObserver(BroadcastObserver):
+    """Рассылка клиентам с подписками через индекс валюта -> подписчики
+
+    При изменении курсов просматриваются только подписчики изменившихся валют.
+    Клиенты с одинаковым набором сработавших валют получают одно общее
+    сообщение, оно кодируется один раз на группу.
+    """
+
+    # В сообщении только часть валют: отложенные сообщения объединяются по валютам
+    policy = DEFER_MERGE
+
+    def __init__(self, send: Callable[..., Union[int, Awaitable[int]]]):
+        super().__init__("subscriptions", send)
+        # валюта -> {sid: порог в процентах}
+        self._subscribers: Dict[str, Dict[str, float]] = {}
+        self._subscriptions: Dict[str, Subscription] = {}
+        self._lock = Lock()
+
+    def subscribe(self, sid: str, subscription: Subscription) -> None:
+        """Задать или заменить подписку клиента"""
+        with self._lock:
+            self._remove(sid)
+            self._subscriptions[sid] = subscription
+            for currency, threshold in subscription.thresholds.items():
+                self._subscribers.setdefault(currency, {})[sid] = threshold
+
+    def unsubscribe(self, sid: str) -> Optional[Subscription]:
+        """Удалить подписку клиента, вернуть ее или None"""
+        with self._lock:
+            return self._remove(sid)
+
+    def _remove(self, sid: str) -> Optional[Subscription]:
+        subscription = self._subscriptions.pop(sid, None)
+        if subscription is not None:
+            for currency in subscription.thresholds:
+                subscribers = self._subscribers.get(currency)
+                if subscribers is not None:
+                    subscribers.pop(sid, None)
+                    if not subscribers:
+                        del self._subscribers[currency]
+        return subscription
+
+    def get(self, sid: str) -> Optional[Subscription]:
+        """Подписка клиента или None"""
+        return self._subscriptions.get(sid)
+
+    def gauges(self) -> Dict[str, int]:
+        """Число подписок и записей индекса"""
+        with self._lock:
+            return {
+                'subscriptions': len(self._subscriptions),
+                'subscription_index_entries': sum(len(sids) for sids in self._subscribers.values())
+            }
+
+    def match(self, changes: Dict[str, Dict[str, float]]) -> Dict[Tuple[str, ...], List[str]]:
+        """Сгруппировать затронутых клиентов по набору сработавших валют"""
+        affected: Dict[str, List[str]] = {}
+        with self._lock:
+            for currency in sorted(changes):
+                subscribers = self._subscribers.get(currency)
+                if not subscribers:
+                    continue
+                percent = abs(changes[currency]['change_percent'])
+                for sid, threshold in subscribers.items():
+                    if percent >= threshold:
+                        affected.setdefault(sid, []).append(currency)
+
+        groups: Dict[Tuple[str, ...], List[str]] = {}
+        for sid, currencies in affected.items():
+            groups.setdefault(tuple(currencies), []).append(sid)
+        return groups
+
+    def messages(self, currency_data: Dict[str, Any]) -> List[Message]:
+        """Сообщение currency_data для каждой группы затронутых клиентов с sid группы"""
+        groups = self.match(currency_data.get('changes') or {})
+        timestamp = datetime.now().isoformat()
+        return [('currency_data', {
+            'type': 'currency_update',
+            'data': filter_currency_data(currency_data, currencies),
+            'timestamp': timestamp
+        }, sids) for currencies, sids in groups.items()]
+
+    def sent(self, messages: List[Message], recipients: int) -> None:
+        logger.info(f"Обновление курсов отправлено {recipients} подписчикам ({len(messages)} групп)")
+
+
+class AlertObserver(BroadcastObserver):
+    """Оповещения клиентов по их условиям через индекс валюта -> {sid: условия}
+
+    Условия проверяются только у изменившихся валют; z-оценки берутся из
+    потоковой статистики субъекта, посчитанной при разборе ответа API.
+    Клиенты с одинаковым набором сработавших условий получают одно общее
+    сообщение currency_alert.
+    """
+
+    # Каждое оповещение - отдельное событие, новое не заменяет предыдущее
+    policy = DEFER_QUEUE
+
+    def __init__(self, send: Callable[..., Union[int, Awaitable[int]]], analytics: Optional[StreamingStats]):
+        super().__init__("alerts", send)
+        self.analytics = analytics
+        # валюта -> {sid: условия по этой валюте}
+        self._rules: Dict[str, Dict[str, List[AlertRule]]] = {}
+        self._by_sid: Dict[str, List[AlertRule]] = {}
+        self._lock = Lock()
+        self.sent_total = 0
+
+    @property
+    def windows(self) -> Tuple[int, ...]:
+        """Окна, по которым можно задать условие zscore"""
+        return self.analytics.window_sizes if self.analytics is not None else ()
+
+    def set_rules(self, sid: str, rules: List[AlertRule]) -> None:
+        """Задать или заменить условия клиента"""
+        with self._lock:
+            self._remove(sid)
+            self._by_sid[sid] = rules
+            for rule in rules:
+                self._rules.setdefault(rule.currency, {}).setdefault(sid, []).append(rule)
+
+    def clear(self, sid: str) -> Optional[List[AlertRule]]:
+        """Удалить условия клиента, вернуть их или None"""
+        with self._lock:
+            return self._remove(sid)
+
+    def _remove(self, sid: str) -> Optional[List[AlertRule]]:
+        rules = self._by_sid.pop(sid, None)
+        for rule in rules or ():
+            subscribers = self._rules.get(rule.currency)
+            if subscribers is not None:
+                subscribers.pop(sid, None)
+                if not subscribers:
+                    del self._rules[rule.currency]
+        return rules
+
+    def gauges(self) -> Dict[str, int]:
+        """Число клиентов с условиями, условий и отправленных оповещений"""
+        with self._lock:
+            return {
+                'alert_clients': len(self._by_sid),
+                'alert_rules': sum(len(rules) for rules in self._by_sid.values()),
+                'alerts_sent_total': self.sent_total
+            }
+
+    def match(self, changes: Dict[str, Dict[str, float]]) -> Dict[Tuple[Tuple, ...], List[str]]:
+        """Сгруппировать клиентов по набору сработавших условий"""
+        affected: Dict[str, List[Tuple]] = {}
+        with self._lock:
+            for currency in sorted(changes):
+                subscribers = self._rules.get(currency)
+                if not subscribers:
+                    continue
+                change = changes[currency]
+                zscores = self.analytics.zscores(currency) if self.analytics is not None else {}
+                for sid, rules in subscribers.items():
+                    for rule in rules:
+                        fired = rule.triggered(change['new_rate'], change['old_rate'], zscores)
+                        if fired:
+                            affected.setdefault(sid, []).extend(fired)
+
+        groups: Dict[Tuple[Tuple, ...], List[str]] = {}
+        for sid, fired in affected.items():
+            groups.setdefault(tuple(fired), []).append(sid)
+        return groups
+
+    def messages(self, currency_data: Dict[str, Any]) -> List[Message]:
+        """Сообщение currency_alert для каждой группы клиентов с sid группы"""
+        changes = currency_data.get('changes') or {}
+        groups = self.match(changes)
+        timestamp = datetime.now().isoformat()
+        messages = []
+        for fired, sids in groups.items():
+            alerts = []
+            for currency, kind, threshold, value, window in fired:
+                alert = {'currency': currency, 'kind': kind, 'threshold': threshold, 'value': value,
+                         'rate': changes[currency]['new_rate']}
+                if window is not None:
+                    alert['window'] = window
+                alerts.append(alert)
+            messages.append(('currency_alert', {'type': 'currency_alert', 'alerts': alerts, 'timestamp': timestamp},
+                             sids))
+        return messages
+
+    def sent(self, messages: List[Message], recipients: int) -> None:
+        self.sent_total += recipients
+        logger.info(f"Оповещения отправлены {recipients} клиентам")
+
+
+def open_history() -> HistoryStore:
+    """История курсов процесса; строки, не записанные в файлы, дописываются при выходе"""
+    history = HistoryStore()
+    atexit.register(history.flush)
+    return history
+
+
+def room_size(server, room: str, namespace: str = '/') -> int:
+    """Число участников комнаты Socket.IO"""
+    return len(server.manager.rooms.get(namespace, {}).get(room, {}))
+
+
+def registry_gauges(subject: CurrencySubject, subscriptions: SubscriptionObserver) -> Dict[str, int]:
+    """Размеры реестра клиентов и индекса подписок"""
+    return {**subject.get_registry_gauges(), **subscriptions.gauges()}
+
+
+def currency_metrics(subject: CurrencySubject, subscriptions: SubscriptionObserver, compact: CompactObserver,
+                     alerts: AlertObserver, history: HistoryStore,
+                     queues: SendQueues) -> Dict[str, Tuple[str, str, Any]]:
+    """Метрики сервиса для /metrics: реестры, комнаты, кэш, история, очереди и статистика"""
+    registry = registry_gauges(subject, subscriptions)
+    server = queues.server
+    gauges = {
+        'currency_clients': ('gauge', 'Connected websocket clients', registry['clients']),
+        'currency_clients_peak': ('gauge', 'Largest number of connected clients', registry['clients_peak']),
+        'currency_observers': ('gauge', 'Observers attached to the subject', registry['observers']),
+        'currency_room_members': ('gauge', 'Socket.IO participants of the observers room',
+                                  room_size(server, CURRENCY_ROOM)),
+        'currency_full_feed_members': ('gauge', 'Clients receiving all currencies', room_size(server, FULL_FEED_ROOM)),
+        'currency_subscriptions': ('gauge', 'Clients with a currency subscription', registry['subscriptions']),
+        'currency_compact_members': ('gauge', 'Clients of the compact protocol',
+                                     sum(room_size(server, room) for room in COMPACT_ROOMS.values())),
+        'currency_compact_seq': ('gauge', 'Sequence number of the last rates_delta', compact.seq),
+        'currency_subscription_index_entries': ('gauge', 'Currency to subscriber index entries',
+                                                registry['subscription_index_entries']),
+        'currency_clients_registered_total': ('counter', 'Clients registered', registry['registered_total']),
+        'currency_clients_unregistered_total': ('counter', 'Clients unregistered', registry['unregistered_total']),
+    }
+    history_gauges = history.gauges()
+    gauges['currency_history_rows'] = ('gauge', 'Rows of the rates history', history_gauges['rows'])
+    gauges['currency_history_unflushed_rows'] = ('gauge', 'History rows not yet written to disk',
+                                                 history_gauges['unflushed_rows'])
+    for name, value in subject.get_cache_stats().items():
+        gauges[f'currency_rates_cache_{name}_total'] = ('counter', f'Rates cache {name}', value)
+    for name, value in subject.get_upstream_stats().items():
+        gauges[f'currency_upstream_{name}_total'] = ('counter', f'CBR API responses {name}', value)
+    gauges.update(send_queue_metrics(queues.gauges()))
+    gauges.update(analytics_metrics(subject.analytics, alerts))
+    return gauges
+
+
+def prometheus_text(gauges: Dict[str, Tuple[str, str, Any]]) -> str:
+    """Метрики {имя: (тип, описание, значение)} в текстовом формате Prometheus"""
+    lines = []
+    for name, (metric_type, help_text, value) in gauges.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def send_queue_metrics(queues: Dict[str, Any]) -> Dict[str, Tuple[str, str, Any]]:
+    """Метрики исходящих очередей клиентов для /metrics"""
+    metrics = {
+        'currency_send_clients_behind': ('gauge', 'Clients whose updates are deferred', queues['clients_behind']),
+        'currency_send_deferred_packets': ('gauge', 'Packets deferred for slow clients', queues['deferred_packets']),
+        'currency_send_max_lag_seconds': ('gauge', 'Longest time a client has been behind', queues['max_lag_seconds']),
+        'currency_send_socket_queue_packets': ('gauge', 'Packets queued in engine.io sockets',
+                                               queues['socket_queue_packets']),
+        'currency_send_socket_queue_max': ('gauge', 'Deepest engine.io socket queue', queues['socket_queue_max']),
+    }
+    counters = {
+        'sent': 'Updates handed to client sockets right away',
+        'deferred': 'Updates deferred for slow clients',
+        'replaced': 'Deferred updates replaced by a newer one',
+        'merged': 'Partial currency updates merged into a deferred one',
+        'queued': 'Alerts and deltas queued behind a deferred one',
+        'dropped': 'Oldest queued updates dropped over the limit',
+        'resent': 'Slow clients that caught up and got their deferred updates',
+        'disconnected': 'Clients disconnected for staying behind',
+    }
+    for name, help_text in counters.items():
+        metrics[f'currency_send_{name}_total'] = ('counter', help_text, queues[name])
+    return metrics
+
+
+def analytics_metrics(analytics: Optional[StreamingStats], alerts: AlertObserver) -> Dict[str, Tuple[str, str, Any]]:
+    """Метрики потоковой статистики и оповещений для /metrics"""
+    gauges = alerts.gauges()
+    metrics = {
+        'currency_alert_clients': ('gauge', 'Clients with alert rules', gauges['alert_clients']),
+        'currency_alert_rules': ('gauge', 'Alert rules of all clients', gauges['alert_rules']),
+        'currency_alerts_sent_total': ('counter', 'Alerts sent to clients', gauges['alerts_sent_total']),
+    }
+    if analytics is not None:
+        stats = analytics.gauges()
+        metrics['currency_analytics_samples'] = ('gauge', 'Samples in the streaming statistics', stats['samples'])
+        metrics['currency_analytics_update_seconds'] = ('gauge', 'Duration of the last statistics update',
+                                                        analytics.last_update_seconds)
+    return metrics
+
+
+def history_response(history: HistoryStore, args) -> Tuple[Dict[str, Any], int]:
+    """Ответ запроса истории по параметрам строки запроса и код HTTP
+
+    from и to - Unix время или дата ISO 8601 (по умолчанию от первой до
+    последней записи), step - длина интервала (секунды или 30m, 1h, 1d).
+    Со step возвращаются min/max/avg курса по интервалам, без step - все значения.
+    """
+    currency = args.get('currency', '').upper()
+    if not currency:
+        return {'error': "Parameter 'currency' is required", 'currencies': history.currencies()}, 400
+    try:
+        start = parse_time(args['from']) if args.get('from') else None
+        end = parse_time(args['to']) if args.get('to') else None
+        step = parse_duration(args['step']) if args.get('step') else None
+        return history.query(currency, start, end, step), 200
+    except KeyError:
+        return {'error': f"No history for currency '{currency}'", 'currencies': history.currencies()}, 404
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+
+def stats_response(analytics: Optional[StreamingStats], args) -> Tuple[Dict[str, Any], int]:
+    """Ответ запроса статистики и код HTTP; без currency - все валюты"""
+    if analytics is None:
+        return {'error': "Streaming statistics require numpy"}, 503
+    currencies = None
+    if args.get('currency'):
+        currencies = [code.strip().upper() for code in args['currency'].split(',') if code.strip()]
+    return {
+        **analytics.gauges(),
+        'statistics': analytics.snapshot(currencies),
+        'timestamp': datetime.now().isoformat()
+    }, 200
\ No newline at end of file
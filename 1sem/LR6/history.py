@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Каталог файлов истории курсов; пустая строка - история только в памяти
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "history")
+# Как часто новые строки дописываются в файлы, секунд
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("HISTORY_FLUSH_INTERVAL", "60"))
+# Наибольшее число точек в ответе запроса истории
+HISTORY_MAX_POINTS = int(os.environ.get("HISTORY_MAX_POINTS", "10000"))
+
+TIMESTAMP_FILE = "timestamp.f64"
+COLUMNS_FILE = "columns.json"
+ITEM_SIZE = array('d').itemsize
+
+# Строк в блоке, для которого хранятся min/max/сумма столбца
+ROLLUP_BLOCK = 64
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+CURRENCY_CODE = re.compile(r'^[A-Z0-9]{1,10}$')
+
+
+def parse_time(value: str) -> float:
+    """Время запроса истории: Unix время в секундах или дата ISO 8601"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}', expected Unix seconds or ISO 8601")
+
+
+def parse_duration(value: str) -> float:
+    """Длительность в секундах: число или число с единицей s, m, h, d, w (например, 1h)"""
+    number, unit = (value[:-1], value[-1]) if value and value[-1] in DURATION_UNITS else (value, 's')
+    try:
+        seconds = float(number) * DURATION_UNITS[unit]
+    except ValueError:
+        raise ValueError(f"Invalid duration '{value}', expected seconds or a number with s, m, h, d, w")
+    if seconds <= 0:
+        raise ValueError("Duration must be positive")
+    return seconds
+
+
+class Rollup:
+    """Агрегаты столбца по блокам из ROLLUP_BLOCK строк
+
+    Агрегат диапазона строк собирается из агрегатов целых блоков и значений
+    неполных блоков по краям: не больше 2 * ROLLUP_BLOCK значений и n / ROLLUP_BLOCK
+    блоков вместо n значений.
+    """
+
+    def __init__(self, column: array):
+        self.min = array('d')
+        self.max = array('d')
+        self.sum = array('d')
+        for begin in range(0, len(column), ROLLUP_BLOCK):
+            block = column[begin:begin + ROLLUP_BLOCK]
+            self.min.append(min(block))
+            self.max.append(max(block))
+            self.sum.append(sum(block))
+
+    def append(self, index: int, value: float) -> None:
+        """Учесть значение строки index столбца"""
+        if index % ROLLUP_BLOCK == 0:
+            self.min.append(value)
+            self.max.append(value)
+            self.sum.append(value)
+        else:
+            self.min[-1] = min(self.min[-1], value)
+            self.max[-1] = max(self.max[-1], value)
+            self.sum[-1] += value
+
+    def aggregate(self, column: array, lo: int, hi: int) -> Tuple[float, float, float]:
+        """min, max и сумма значений column[lo:hi]"""
+        first = -(-lo // ROLLUP_BLOCK)
+        last = hi // ROLLUP_BLOCK
+        if first >= last:
+            values = column[lo:hi]
+            return min(values), max(values), sum(values)
+
+        parts = [column[lo:first * ROLLUP_BLOCK], column[last * ROLLUP_BLOCK:hi]]
+        parts = [values for values in parts if values]
+        return (
+            min([min(self.min[first:last])] + [min(values) for values in parts]),
+            max([max(self.max[first:last])] + [max(values) for values in parts]),
+            sum(self.sum[first:last]) + sum(sum(values) for values in parts),
+        )
+
+
+class HistoryStore:
+    """Хранилище истории курсов по столбцам с добавлением строк в конец
+
+    Строка - момент опроса API (Unix время) и курсы всех валют на этот момент.
+    Каждый столбец - array('d') в памяти и файл <валюта>.f64 на диске, в который
+    flush дописывает только новые значения. Столбец валюты, появившейся позже
+    остальных, начинается со строки offset; если валюта пропала из ответа API,
+    повторяется ее последний курс, поэтому пропусков внутри столбца нет.
+    """
+
+    def __init__(self, path: Optional[str] = HISTORY_DIR, flush_interval: float = HISTORY_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        # Процесс кластера, не ведущий опрос API, держит историю только в памяти:
+        # файлы дописывает один процесс
+        self.read_only = False
+        self._lock = Lock()
+        self._last_flush = time.monotonic()
+        self._reset()
+        if path:
+            self._load()
+
+    def _reset(self) -> None:
+        self._timestamps = array('d')
+        self._columns: Dict[str, array] = {}
+        self._offsets: Dict[str, int] = {}
+        self._rollups: Dict[str, Rollup] = {}
+        # Сколько значений каждого столбца уже записано в файлы
+        self._persisted_rows = 0
+        self._persisted: Dict[str, int] = {}
+        self._persisted_offsets: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def append(self, timestamp: float, rates: Dict[str, float]) -> bool:
+        """Добавить строку курсов; строки не новее последней не добавляются"""
+        with self._lock:
+            if self._timestamps and timestamp <= self._timestamps[-1]:
+                return False
+
+            row = len(self._timestamps)
+            for currency, column in self._columns.items():
+                value = rates.get(currency)
+                column.append(column[-1] if value is None else value)
+                self._rollups[currency].append(len(column) - 1, column[-1])
+            for currency, value in rates.items():
+                if currency in self._columns:
+                    continue
+                if not CURRENCY_CODE.match(currency):
+                    logger.warning(f"Курс '{currency}' не сохраняется в историю: недопустимый код валюты")
+                    continue
+                self._columns[currency] = array('d', [value])
+                self._offsets[currency] = row
+                self._rollups[currency] = Rollup(self._columns[currency])
+            self._timestamps.append(timestamp)
+            return True
+
+    def record(self, currency_data: Dict[str, Any]) -> bool:
+        """Добавить ответ fetch_currency_rates; ответы с ошибкой и из кэша не добавляются"""
+        if currency_data.get('error') or not currency_data.get('rates'):
+            return False
+        timestamp = datetime.fromisoformat(currency_data['timestamp']).timestamp()
+        return self.append(timestamp, currency_data['rates'])
+
+    def currencies(self) -> List[str]:
+        """Валюты, для которых есть история"""
+        with self._lock:
+            return sorted(self._columns)
+
+    def query(self, currency: str, start: Optional[float] = None, end: Optional[float] = None,
+              step: Optional[float] = None) -> Dict[str, Any]:
+        """Курсы валюты за [start, end]: все значения или min/max/avg по интервалам step
+
+        Границы периода и интервалов находятся двоичным поиском по столбцу
+        времени, а агрегаты интервала собираются из агрегатов блоков (Rollup),
+        поэтому время ответа почти не зависит от числа строк в истории.
+        """
+        with self._lock:
+            column = self._columns.get(currency)
+            if column is None:
+                raise KeyError(currency)
+            timestamps = self._timestamps
+            offset = self._offsets[currency]
+            rollup = self._rollups[currency]
+            start = timestamps[offset] if start is None else start
+            end = timestamps[-1] if end is None else end
+            if start > end:
+                raise ValueError("'from' must not be later than 'to'")
+
+            lo = max(bisect_left(timestamps, start), offset)
+            hi = bisect_right(timestamps, end)
+            result = {'currency': currency, 'from': start, 'to': end, 'step': step}
+
+            if step is None:
+                if hi - lo > HISTORY_MAX_POINTS:
+                    raise ValueError(f"{hi - lo} points exceed the limit of {HISTORY_MAX_POINTS}, set 'step'")
+                result['points'] = [{'t': timestamps[i], 'value': column[i - offset]} for i in range(lo, hi)]
+                return result
+
+            buckets = int((end - start) // step) + 1
+            if buckets > HISTORY_MAX_POINTS:
+                raise ValueError(f"{buckets} intervals exceed the limit of {HISTORY_MAX_POINTS}, increase 'step'")
+
+            points = []
+            begin = lo
+            # Пустые интервалы пропускаются: от начала следующей строки сразу к ее интервалу
+            while begin < hi:
+                bucket = int((timestamps[begin] - start) // step)
+                # Не меньше одной строки, даже если граница интервала округлилась до ее времени
+                stop = max(bisect_left(timestamps, start + (bucket + 1) * step, begin, hi), begin + 1)
+                low, high, total = rollup.aggregate(column, begin - offset, stop - offset)
+                points.append({
+                    't': start + bucket * step,
+                    'min': low,
+                    'max': high,
+                    'avg': total / (stop - begin),
+                    'count': stop - begin,
+                })
+                begin = stop
+            result['points'] = points
+            return result
+
+    def gauges(self) -> Dict[str, int]:
+        """Число строк и столбцов истории и строк, еще не записанных в файлы"""
+        with self._lock:
+            return {
+                'rows': len(self._timestamps),
+                'currencies': len(self._columns),
+                'unflushed_rows': len(self._timestamps) - self._persisted_rows,
+            }
+
+    def flush_if_due(self) -> None:
+        """Записать новые строки, если с прошлой записи прошло flush_interval секунд"""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Дописать в файлы строки, добавленные после прошлой записи
+
+        Сначала пишутся столбцы курсов, затем столбец времени и список столбцов:
+        при сбое посередине _load отбросит строки, записанные не во все файлы.
+        """
+        if not self.path or self.read_only:
+            return
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if self._persisted_rows == len(self._timestamps) and self._offsets == self._persisted_offsets:
+                return
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                for currency, column in self._columns.items():
+                    written = self._persisted.get(currency, 0)
+                    if written < len(column):
+                        self._write(f"{currency}.f64", column[written:], written)
+                        self._persisted[currency] = len(column)
+                if self._persisted_rows < len(self._timestamps):
+                    self._write(TIMESTAMP_FILE, self._timestamps[self._persisted_rows:], self._persisted_rows)
+                    self._persisted_rows = len(self._timestamps)
+                if self._offsets != self._persisted_offsets:
+                    self._write_columns()
+            except OSError as e:
+                logger.error(f"Ошибка записи истории курсов: {e}")
+
+    def reload(self) -> int:
+        """Перечитать файлы и вернуть в память свои строки новее последней записанной
+
+        Нужно процессу кластера, ставшему опрашивающим: до него файлы дописывал
+        другой процесс, а строки, полученные от того через очередь сообщений,
+        но не записанные им, есть только в памяти. Возвращает число таких строк.
+        """
+        if not self.path:
+            return 0
+        with self._lock:
+            timestamps, columns, offsets = self._timestamps, self._columns, self._offsets
+            self._reset()
+            self._load()
+            last = self._timestamps[-1] if self._timestamps else float('-inf')
+        start = bisect_right(timestamps, last)
+        for row in range(start, len(timestamps)):
+            self.append(timestamps[row], {currency: column[row - offsets[currency]]
+                                          for currency, column in columns.items() if row >= offsets[currency]})
+        return len(timestamps) - start
+
+    def _write(self, name: str, values: array, written: int) -> None:
+        # Значения в машинном порядке байтов: файлы читает только этот же сервер
+        with open(os.path.join(self.path, name), 'ab' if written else 'wb') as f:
+            values.tofile(f)
+
+    def _write_columns(self) -> None:
+        path = os.path.join(self.path, COLUMNS_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'columns': self._offsets}, f)
+        os.replace(path + '.tmp', path)
+        self._persisted_offsets = dict(self._offsets)
+
+    def _read(self, name: str) -> array:
+        values = array('d')
+        path = os.path.join(self.path, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            values.frombytes(data[:len(data) // ITEM_SIZE * ITEM_SIZE])
+        return values
+
+    def _truncate(self, name: str, length: int) -> None:
+        path = os.path.join(self.path, name)
+        if os.path.exists(path):
+            os.truncate(path, length * ITEM_SIZE)
+
+    def _load(self) -> None:
+        """Загрузить историю из файлов, отбросив незаконченную запись"""
+        try:
+            with open(os.path.join(self.path, COLUMNS_FILE), encoding='utf-8') as f:
+                offsets = json.load(f)['columns']
+        except FileNotFoundError:
+            return
+
+        timestamps = self._read(TIMESTAMP_FILE)
+        columns = {currency: self._read(f"{currency}.f64") for currency in offsets}
+        rows = min([len(timestamps)] + [offsets[c] + len(column) for c, column in columns.items()])
+
+        del timestamps[rows:]
+        for currency, column in list(columns.items()):
+            del column[max(0, rows - offsets[currency]):]
+            if not column:
+                del columns[currency]
+
+        self._timestamps = timestamps
+        self._columns = columns
+        self._offsets = {currency: offsets[currency] for currency in columns}
+        self._rollups = {currency: Rollup(column) for currency, column in columns.items()}
+        self._persisted_rows = rows
+        self._persisted = {currency: len(column) for currency, column in columns.items()}
+        self._persisted_offsets = dict(offsets)
+
+        # Файлы укорачиваются до загруженных строк, чтобы flush дописывал после них
+        self._truncate(TIMESTAMP_FILE, rows)
+        for currency, column in columns.items():
+            self._truncate(f"{currency}.f64", len(column))
+        logger.info(f"История курсов загружена: {rows} строк, {len(columns)} валют")
\ No newline at end of file
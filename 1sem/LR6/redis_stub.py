@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def encode(value, resp3: bool = False) -> bytes:
+    """Ответ в протоколе RESP: None - пустое значение, int - число, list - массив"""
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item, resp3) for item in value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def push(items: list, resp3: bool) -> bytes:
+    """Сообщение подписчику: в RESP3 - тип push, в RESP2 - обычный массив"""
+    return (b">" if resp3 else b"*") + encode(items, resp3)[1:]
+
+
+OK = b"+OK\r\n"
+PONG = b"+PONG\r\n"
+
+
+def error(message: str) -> bytes:
+    return f"-ERR {message}\r\n".encode('utf-8')
+
+
+class RedisStub:
+    """Подмножество Redis, которое нужно кластеру серверов курсов
+
+    Pub/sub (SUBSCRIBE, UNSUBSCRIBE, PUBLISH) для python-socketio
+    AsyncRedisManager и обмена курсами, а также строковые ключи со сроком
+    жизни (SET NX/XX PX, GET, DEL) для выбора опрашивающего процесса.
+    HELLO переключает соединение на RESP3, как ожидает redis-py 8.
+    Данные хранятся только в памяти одного процесса.
+    """
+
+    def __init__(self):
+        # Канал: {соединение подписчика: использует ли оно RESP3}
+        self.channels: Dict[bytes, Dict[asyncio.StreamWriter, bool]] = {}
+        # Ключ: (значение, момент истечения по time.monotonic() или None)
+        self.keys: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriptions: Set[bytes] = set()
+        resp3 = False
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                name = command[0].upper()
+                if name == b'QUIT':
+                    writer.write(OK)
+                    break
+                if name == b'HELLO':
+                    if command[1:2] not in ([], [b'2'], [b'3']):
+                        writer.write(b"-NOPROTO unsupported protocol version\r\n")
+                        continue
+                    resp3 = command[1:2] == [b'3']
+                    writer.write(self.hello(resp3))
+                    continue
+                writer.write(self.execute(name, command[1:], writer, subscriptions, resp3))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._leave(channel, writer)
+            writer.close()
+
+    def execute(self, name: bytes, args: List[bytes], writer: asyncio.StreamWriter,
+                subscriptions: Set[bytes], resp3: bool = False) -> bytes:
+        """Выполнить команду и вернуть ответ"""
+        if name == b'PING':
+            if subscriptions and not resp3:
+                return encode([b'pong', args[0] if args else b''])
+            return encode(args[0]) if args else PONG
+        if name == b'SUBSCRIBE':
+            replies = []
+            for channel in args:
+                subscriptions.add(channel)
+                self.channels.setdefault(channel, {})[writer] = resp3
+                replies.append(push([b'subscribe', channel, len(subscriptions)], resp3))
+            return b"".join(replies)
+        if name == b'UNSUBSCRIBE':
+            replies = []
+            for channel in args or list(subscriptions) or [None]:
+                if channel is not None:
+                    subscriptions.discard(channel)
+                    self._leave(channel, writer)
+                replies.append(push([b'unsubscribe', channel, len(subscriptions)], resp3))
+            return b"".join(replies)
+        if subscriptions and not resp3:
+            return error(f"Command {name.decode()} is not allowed in subscribe mode")
+        if name == b'PUBLISH' and len(args) == 2:
+            return encode(self.publish(*args))
+        if name == b'SET' and len(args) >= 2:
+            return self.set(args[0], args[1], [option.upper() for option in args[2:]], resp3)
+        if name == b'GET' and len(args) == 1:
+            return encode(self.get(args[0]), resp3)
+        if name == b'DEL':
+            return encode(sum(self.keys.pop(key, None) is not None for key in args))
+        if name == b'ECHO' and len(args) == 1:
+            return encode(args[0])
+        if name in (b'SELECT', b'CLIENT'):
+            return OK
+        return error(f"unknown command '{name.decode(errors='replace')}'")
+
+    def publish(self, channel: bytes, message: bytes) -> int:
+        """Отправить сообщение всем подписчикам канала"""
+        subscribers = self.channels.get(channel, {})
+        packets = {resp3: push([b'message', channel, message], resp3) for resp3 in (False, True)}
+        for subscriber, resp3 in subscribers.items():
+            subscriber.write(packets[resp3])
+        return len(subscribers)
+
+    @staticmethod
+    def hello(resp3: bool) -> bytes:
+        """Ответ на HELLO: в RESP3 - словарь, в RESP2 - плоский массив"""
+        fields = [b'server', b'redis', b'version', b'7.0.0', b'proto', 3 if resp3 else 2]
+        if resp3:
+            return b"%%%d\r\n" % (len(fields) // 2) + b"".join(encode(field) for field in fields)
+        return encode(fields)
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        item = self.keys.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.keys[key]
+            return None
+        return value
+
+    def set(self, key: bytes, value: bytes, options: List[bytes], resp3: bool = False) -> bytes:
+        """SET key value [NX|XX] [PX ms|EX s]"""
+        ttl = None
+        for i, option in enumerate(options):
+            if option in (b'PX', b'EX'):
+                try:
+                    ttl = float(options[i + 1]) / (1000 if option == b'PX' else 1)
+                except (IndexError, ValueError):
+                    return error("syntax error")
+        exists = self.get(key) is not None
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return encode(None, resp3)
+        self.keys[key] = (value, None if ttl is None else time.monotonic() + ttl)
+        return OK
+
+    def _leave(self, channel: bytes, writer: asyncio.StreamWriter) -> None:
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.pop(writer, None)
+            if not subscribers:
+                del self.channels[channel]
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        """Команда RESP (*N $len ...) или строкой через пробелы, как из telnet"""
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        command = []
+        for _ in range(int(line[1:])):
+            header = await reader.readline()
+            if not header.startswith(b'$'):
+                raise ValueError("bulk string expected")
+            command.append((await reader.readexactly(int(header[1:]) + 2))[:-2])
+        return command
+
+
+async def serve(host: str, port: int) -> None:
+    stub = RedisStub()
+    server = await asyncio.start_server(stub.handle, host, port)
+    logger.info(f"Заглушка Redis: redis://localhost:{port}/0")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """Локальная заглушка Redis для кластера без redis-server: MESSAGE_QUEUE=redis://localhost:6380/0"""
+    parser = argparse.ArgumentParser(description="In-memory stand-in for the Redis commands used by the cluster")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
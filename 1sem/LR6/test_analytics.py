@@ -0,0 +1,110 @@
+import math
+import random
+from array import array
+
+import pytest
+from analytics import AlertRule, RollingWindow, StreamingStats, parse_alert_rules
+
+numpy = pytest.importorskip("numpy")
+
+
+def naive(window):
+    """Среднее, выборочное стандартное отклонение, min и max, посчитанные заново"""
+    mean = sum(window) / len(window)
+    std = math.sqrt(sum((x - mean) ** 2 for x in window) / (len(window) - 1)) if len(window) > 1 else 0.0
+    return mean, std, min(window), max(window)
+
+
+def random_walk(rng, start, steps):
+    values = [start]
+    for _ in range(steps - 1):
+        values.append(values[-1] * (1 + rng.uniform(-0.01, 0.01)))
+    return values
+
+
+@pytest.mark.parametrize("size", [2, 5, 16])
+def test_rolling_window_matches_naive(size):
+    """Окно после каждой выборки совпадает с пересчетом по последним size значениям"""
+    rng = random.Random(size)
+    series = [random_walk(rng, start, 120) for start in (90.0, 100.0, 0.5)]
+    window = RollingWindow(size, len(series))
+
+    for t in range(120):
+        window.push(numpy.array([values[t] for values in series]))
+        assert window.samples == min(t + 1, size)
+        std = numpy.sqrt(window.variance)
+        for i, values in enumerate(series):
+            mean, expected_std, low, high = naive(values[max(0, t + 1 - size):t + 1])
+            assert window.mean[i] == pytest.approx(mean, rel=1e-12), f"Среднее, выборка {t}"
+            assert std[i] == pytest.approx(expected_std, rel=1e-6, abs=1e-12), f"Отклонение, выборка {t}"
+            assert window.minimum[i] == low and window.maximum[i] == high, f"Min и max, выборка {t}"
+
+
+def test_rolling_window_constant_values():
+    """Неизменный курс не дает отрицательной дисперсии из-за округления"""
+    window = RollingWindow(4, 1)
+    for _ in range(20):
+        window.push(numpy.array([0.1]))
+    assert window.variance[0] >= 0
+    assert window.mean[0] == pytest.approx(0.1)
+
+
+def test_zscores_match_naive():
+    """z-оценка нового курса считается по окну до него, в том числе после смены набора валют"""
+    rng = random.Random(3)
+    stats = StreamingStats(windows=(5, 13), alpha=0.2, min_samples=3)
+    rates = {'USD': 80.0, 'EUR': 95.0, 'GBP': 110.0, 'CNY': 11.0}
+    history = {code: [] for code in rates}
+    codes = ('USD', 'EUR', 'GBP')
+
+    for t in range(150):
+        if t == 60:
+            # GBP пропадает из ответа, CNY появляется
+            codes = ('EUR', 'CNY', 'USD')
+        for code in rates:
+            rates[code] *= 1 + rng.uniform(-0.01, 0.01)
+        if 'CNY' in codes and not history['CNY']:
+            # Окно новой валюты заполняется ее первым курсом
+            history['CNY'] = [rates['CNY']] * t
+
+        expected = {}
+        for size in (5, 13):
+            for code in codes:
+                window = history[code][-size:]
+                if len(window) >= 3:
+                    mean, std, _, _ = naive(window)
+                    expected[code, size] = (rates[code] - mean) / std if std > 0 else math.nan
+
+        stats.update(codes, array('d', [rates[code] for code in codes]))
+        for code in codes:
+            history[code].append(rates[code])
+            for size, z in stats.zscores(code).items():
+                want = expected.get((code, size), math.nan)
+                assert (math.isnan(z) and math.isnan(want)) or z == pytest.approx(want, rel=1e-6), \
+                    f"z-оценка {code} по окну {size}, выборка {t}"
+
+    snapshot = stats.snapshot(['USD'])
+    mean, std, low, high = naive(history['USD'][-13:])
+    window = snapshot['USD']['windows']['13']
+    assert window['mean'] == pytest.approx(mean) and window['std'] == pytest.approx(std)
+    assert (window['min'], window['max']) == (low, high)
+    assert stats.zscores('GBP') == {}, "Пропавшая валюта больше не считается"
+
+
+def test_alert_rule_triggered():
+    rule = AlertRule.from_request({'currency': 'usd', 'above': 81, 'zscore': 2, 'window': 13}, (5, 13))
+    assert rule.to_dict() == {'currency': 'USD', 'above': 81.0, 'zscore': 2.0, 'window': 13}
+    assert rule.triggered(81.5, 80.9, {13: -2.5}) == [('USD', 'above', 81.0, 81.5, None),
+                                                       ('USD', 'zscore', 2.0, -2.5, 13)]
+    assert rule.triggered(81.6, 81.5, {13: math.nan}) == [], "Уровень уже пересечен, z-оценки еще нет"
+
+
+@pytest.mark.parametrize("data", [
+    {'currency': 'US', 'above': 1},
+    {'currency': 'USD'},
+    {'currency': 'USD', 'zscore': 1, 'window': 7},
+    {'currency': 'USD', 'zscore': -1},
+])
+def test_alert_rule_invalid(data):
+    with pytest.raises(ValueError):
+        parse_alert_rules({'rules': [data]}, (5, 13))
\ No newline at end of file
@@ -0,0 +1,148 @@
+import json
+from types import SimpleNamespace
+
+from socketio import packet
+
+from currency import DEFER_MERGE, DEFER_QUEUE, DEFER_REPLACE, SendQueues, encode_event, merge_currency_data
+
+
+class FakeSocket:
+    """Сокет engine.io с заданной длиной очереди"""
+
+    def __init__(self, depth=0):
+        self.depth = depth
+        self.closed = False
+        self.queue = SimpleNamespace(qsize=lambda: self.depth)
+
+
+def make_queues(limit=4, **sockets):
+    server = SimpleNamespace(eio=SimpleNamespace(sockets=sockets), packet_class=packet.Packet)
+    return SendQueues(server, limit=limit)
+
+
+def send(queues, sid, event, data, policy):
+    return queues.route([sid], event, encode_event(queues.server, event, data), data, policy)
+
+
+def decode(packets):
+    """События из текстовых пакетов Socket.IO"""
+    return [json.loads(item[item.index('['):]) for item in packets]
+
+
+def update(rates, old_rates):
+    """Сообщение currency_data об изменении курсов"""
+    return {
+        'type': 'currency_update',
+        'data': {
+            'rates': rates,
+            'previous_rates': old_rates,
+            'changes': {currency: {
+                'old_rate': old_rates[currency],
+                'new_rate': rate,
+                'change': rate - old_rates[currency],
+                'change_percent': (rate - old_rates[currency]) / old_rates[currency] * 100
+            } for currency, rate in rates.items()}
+        }
+    }
+
+
+def test_ready_client_gets_packets_now():
+    queues = make_queues(fast=FakeSocket(0), slow=FakeSocket(10))
+    ready = queues.route(["fast", "slow", "gone"], "clients_update", ["packet"])
+    assert ready == ["fast", "gone"], "Отправка сразу, если очередь сокета короткая или сокета уже нет"
+    assert queues.gauges()['clients_behind'] == 1
+
+
+def test_replace_keeps_latest():
+    """Полное состояние: отстающий получает только последнее сообщение"""
+    socket = FakeSocket(10)
+    queues = make_queues(slow=socket)
+    for count in range(3):
+        assert send(queues, "slow", "clients_update", {'clients_count': count}, DEFER_REPLACE) == []
+
+    socket.depth = 0
+    ready, lagging = queues.collect()
+    assert [(sid, decode(packets)) for sid, packets in ready] == \
+        [("slow", [["clients_update", {'clients_count': 2}]])]
+    assert lagging == []
+    assert queues.stats['replaced'] == 2
+
+
+def test_merge_keeps_every_currency():
+    """Подписка: валюты отложенных сообщений не теряются, изменение считается от первого курса"""
+    socket = FakeSocket(10)
+    queues = make_queues(slow=socket)
+    send(queues, "slow", "currency_data", update({'USD': 91.0}, {'USD': 90.0}), DEFER_MERGE)
+    send(queues, "slow", "currency_data", update({'EUR': 101.0}, {'EUR': 100.0}), DEFER_MERGE)
+    send(queues, "slow", "currency_data", update({'USD': 92.0}, {'USD': 91.0}), DEFER_MERGE)
+    assert queues.stats['merged'] == 2
+
+    socket.depth = 0
+    ready, _ = queues.collect()
+    [(sid, packets)] = ready
+    [[event, message]] = decode(packets)
+    data = message['data']
+    assert event == "currency_data"
+    assert data['rates'] == {'USD': 92.0, 'EUR': 101.0}, "Курсы всех отложенных валют, самые новые"
+    assert data['previous_rates'] == {'USD': 90.0, 'EUR': 100.0}, "Прошлые курсы - до первого сообщения"
+    assert data['changes']['USD']['old_rate'] == 90.0
+    assert data['changes']['USD']['change'] == 2.0
+    assert round(data['changes']['EUR']['change_percent'], 6) == 1.0
+
+
+def test_partial_update_merges_into_full_state():
+    """Сообщение подписки после отложенного полного состояния дополняет его, а не заменяет"""
+    queues = make_queues(slow=FakeSocket(10))
+    send(queues, "slow", "currency_data", update({'USD': 91.0, 'EUR': 101.0}, {'USD': 90.0, 'EUR': 100.0}),
+         DEFER_REPLACE)
+    send(queues, "slow", "currency_data", update({'USD': 92.0}, {'USD': 91.0}), DEFER_MERGE)
+    queues.server.eio.sockets["slow"].depth = 0
+
+    [(_, packets)] = queues.collect()[0]
+    [[_, message]] = decode(packets)
+    assert message['data']['rates'] == {'USD': 92.0, 'EUR': 101.0}
+
+
+def test_queue_keeps_order_and_drops_oldest():
+    """Оповещения и дельты копятся по порядку, сверх limit отбрасываются самые старые"""
+    socket = FakeSocket(10)
+    queues = make_queues(limit=3, slow=socket)
+    for seq in range(1, 6):
+        send(queues, "slow", "rates_delta", [seq, 0, {'USD': 90.0 + seq}], DEFER_QUEUE)
+    assert queues.stats['queued'] == 2
+    assert queues.stats['dropped'] == 2
+    assert queues.gauges()['deferred_packets'] == 3
+
+    socket.depth = 0
+    [(_, packets)] = queues.collect()[0]
+    assert [args[1][0] for args in decode(packets)] == [3, 4, 5], "Остаются последние limit сообщений по порядку"
+
+
+def test_events_deferred_separately():
+    queues = make_queues(slow=FakeSocket(10))
+    send(queues, "slow", "currency_alert", {'alerts': ["USD"]}, DEFER_QUEUE)
+    send(queues, "slow", "clients_update", {'clients_count': 1}, DEFER_REPLACE)
+    send(queues, "slow", "currency_alert", {'alerts': ["EUR"]}, DEFER_QUEUE)
+    queues.server.eio.sockets["slow"].depth = 0
+
+    [(_, packets)] = queues.collect()[0]
+    assert decode(packets) == [["currency_alert", {'alerts': ["USD"]}], ["currency_alert", {'alerts': ["EUR"]}],
+                               ["clients_update", {'clients_count': 1}]]
+
+
+def test_lagging_client_disconnected():
+    queues = make_queues(slow=FakeSocket(10))
+    queues.max_lag = 0
+    send(queues, "slow", "clients_update", {'clients_count': 1}, DEFER_REPLACE)
+    ready, lagging = queues.collect()
+    assert ready == [] and lagging == ["slow"], "Клиент, отстающий дольше max_lag, отключается"
+    assert queues.gauges()['clients_behind'] == 0
+
+
+def test_merge_currency_data_keeps_other_fields():
+    older = update({'USD': 91.0}, {'USD': 90.0})['data']
+    newer = dict(update({'USD': 90.5}, {'USD': 91.0})['data'], timestamp="new", sample=2)
+    merged = merge_currency_data(older, newer)
+    assert merged['timestamp'] == "new" and merged['sample'] == 2, "Остальные поля из более нового обновления"
+    assert merged['changes']['USD']['change'] == 0.5
+    assert older['rates'] == {'USD': 91.0}, "Исходные обновления не меняются"
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from history import ITEM_SIZE, TIMESTAMP_FILE, HistoryStore
+
+T0 = 1_600_000_000.0
+
+
+def fill(store, rows, start=0):
+    for i in range(start, start + rows):
+        rates = {'USD': 90 + i, 'EUR': 100.0 - i}
+        if i >= 3:
+            rates['GBP'] = 110.0 + i
+        assert store.append(T0 + i * 30, rates)
+
+
+def values(store, currency):
+    return [point['value'] for point in store.query(currency)['points']]
+
+
+def file_rows(path, name):
+    return os.path.getsize(os.path.join(path, name)) // ITEM_SIZE
+
+
+def assert_aligned(path, store):
+    """Каждый файл столбца содержит ровно свои строки, столбец времени - все"""
+    assert file_rows(path, TIMESTAMP_FILE) == len(store)
+    for currency in store.currencies():
+        assert file_rows(path, f"{currency}.f64") == len(store.query(currency)['points']), currency
+
+
+def test_flush_and_load(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    fill(store, 6)
+    assert not store.append(T0, {'USD': 1.0}), "Строка не новее последней не добавляется"
+    store.flush()
+
+    loaded = HistoryStore(str(tmp_path))
+    assert len(loaded) == 6
+    assert loaded.currencies() == ['EUR', 'GBP', 'USD']
+    assert values(loaded, 'GBP') == [113.0, 114.0, 115.0], "Валюта, появившаяся позже, начинается со своей строки"
+    assert loaded.gauges()['unflushed_rows'] == 0
+
+
+def test_missing_currency_repeats_last_rate(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append(T0, {'USD': 90.0, 'EUR': 100.0})
+    store.append(T0 + 30, {'USD': 91.0})
+    assert values(store, 'EUR') == [100.0, 100.0]
+
+
+def test_partial_value_dropped(tmp_path):
+    """Недописанное значение в конце файла столбца отбрасывается при загрузке"""
+    store = HistoryStore(str(tmp_path))
+    fill(store, 6)
+    store.flush()
+    with open(tmp_path / "USD.f64", 'ab') as f:
+        f.write(b'\0' * (ITEM_SIZE // 2))
+
+    loaded = HistoryStore(str(tmp_path))
+    assert len(loaded) == 6
+    assert values(loaded, 'USD') == values(store, 'USD')
+    assert_aligned(str(tmp_path), loaded)
+
+
+def test_crash_before_timestamps_written(tmp_path):
+    """Столбцы курсов записаны, столбец времени - нет: лишние значения отбрасываются"""
+    store = HistoryStore(str(tmp_path))
+    fill(store, 6)
+    store.flush()
+    for currency in ('USD', 'EUR', 'GBP'):
+        with open(tmp_path / f"{currency}.f64", 'ab') as f:
+            f.write(b'\1' * ITEM_SIZE * 2)
+
+    loaded = HistoryStore(str(tmp_path))
+    assert len(loaded) == 6
+    assert values(loaded, 'EUR') == values(store, 'EUR')
+    assert_aligned(str(tmp_path), loaded)
+
+    fill(loaded, 2, start=6)
+    loaded.flush()
+    reloaded = HistoryStore(str(tmp_path))
+    assert values(reloaded, 'USD') == [90.0 + i for i in range(8)], "Новые строки дописываются сразу после целых"
+    assert_aligned(str(tmp_path), reloaded)
+
+
+def test_short_column_limits_rows(tmp_path):
+    """Если столбец валюты короче столбца времени, загружаются только строки, записанные во все файлы"""
+    store = HistoryStore(str(tmp_path))
+    fill(store, 6)
+    store.flush()
+    os.truncate(tmp_path / "EUR.f64", 4 * ITEM_SIZE)
+
+    loaded = HistoryStore(str(tmp_path))
+    assert len(loaded) == 4
+    assert values(loaded, 'GBP') == [113.0]
+    assert_aligned(str(tmp_path), loaded)
+
+
+def test_new_currency_without_columns_file(tmp_path):
+    """Файл новой валюты без записи в columns.json не загружается и при следующем flush пишется заново"""
+    store = HistoryStore(str(tmp_path))
+    fill(store, 2)
+    store.flush()
+    with open(tmp_path / "GBP.f64", 'wb') as f:
+        f.write(b'\1' * ITEM_SIZE * 3)
+
+    loaded = HistoryStore(str(tmp_path))
+    assert loaded.currencies() == ['EUR', 'USD']
+    fill(loaded, 2, start=2)
+    loaded.flush()
+    assert values(HistoryStore(str(tmp_path)), 'GBP') == [113.0]
+
+
+def test_query_step_aggregates():
+    store = HistoryStore(None)
+    fill(store, 100)
+    points = store.query('USD', step=300)['points']
+    assert [point['count'] for point in points] == [10] * 10
+    assert points[1] == {'t': T0 + 300, 'min': 100.0, 'max': 109.0, 'avg': 104.5, 'count': 10}
+    with pytest.raises(KeyError):
+        store.query('CHF')
\ No newline at end of file